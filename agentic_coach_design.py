@@ -4,13 +4,22 @@ Agentic Barbershop Business Coach - Single Intelligent Agent
 Replaces 7 separate agents with one context-aware, learning system
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple, FrozenSet
 from datetime import datetime, timedelta
+from collections import OrderedDict, deque
 import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
 import asyncio
-from dataclasses import dataclass
+from dataclasses import dataclass, field, asdict
 from enum import Enum
 
+logger = logging.getLogger(__name__)
+
 class BusinessDomain(Enum):
     FINANCIAL = "financial"
     OPERATIONS = "operations"
@@ -26,6 +35,147 @@ class BusinessStage(Enum):
     ESTABLISHED = "established"  # 3-7 years
     ENTERPRISE = "enterprise"    # 7+ years or multi-location
 
+# Keyword vocabulary for message classification. Intents and urgency levels
+# are checked in the order listed; COACH_VOCABULARY_PATH can point at a JSON
+# file with the same shape to override any of the three sections.
+DEFAULT_COACH_VOCABULARY = {
+    "intents": {
+        "revenue_optimization": ["revenue", "money", "profit", "income", "sales", "pricing"],
+        "customer_management": ["customer", "client", "retention", "acquisition", "marketing"],
+        "operations_optimization": ["schedule", "efficiency", "operations", "workflow", "booking"],
+        "growth_planning": ["grow", "expand", "scale", "new location", "franchise"],
+        "staff_management": ["staff", "employee", "barber", "hiring", "training"],
+        "problem_solving": ["problem", "issue", "struggling", "help", "stuck"],
+        "strategic_planning": ["strategy", "plan", "future", "goals", "vision"]
+    },
+    "domains": {
+        "revenue_optimization": ["financial"],
+        "customer_management": ["marketing", "customer_experience"],
+        "operations_optimization": ["operations"],
+        "growth_planning": ["growth", "strategic"],
+        "staff_management": ["staff"],
+        "problem_solving": ["operations", "financial"],
+        "strategic_planning": ["strategic", "growth"]
+    },
+    "urgency": {
+        "high": ["urgent", "emergency", "asap", "immediately", "crisis", "failing", "desperate"],
+        "medium": ["soon", "quickly", "problem", "issue", "struggling"]
+    }
+}
+
+DEFAULT_INTENT = "general_business_advice"
+DEFAULT_URGENCY = "low"
+
+@dataclass(frozen=True)
+class MessageClassification:
+    """Everything the keyword scan extracts from one message"""
+    intents: List[str]
+    domains: List[BusinessDomain]
+    urgency: str
+
+class KeywordClassifier:
+    """
+    Precompiled keyword table for intent, domain and urgency classification
+
+    The message is tokenised once and each token is looked up in a table built
+    at construction time, so the cost of a turn depends on the message length
+    rather than on how many keyword lists there are. A keyword matches any word
+    it starts ("customer" matches "customers", "plan" matches "planning");
+    multi-word keywords such as "new location" match consecutive words.
+    """
+
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+    def __init__(self, vocabulary: Optional[Dict[str, Any]] = None, token_cache_size: int = 10000):
+        vocabulary = {**DEFAULT_COACH_VOCABULARY, **(vocabulary or {})}
+        self.intent_order = list(vocabulary["intents"])
+        self.urgency_order = list(vocabulary["urgency"])
+        self.token_cache_size = token_cache_size
+
+        # keyword -> labels, where a label is ("intent", name) or ("urgency", level)
+        labels_by_keyword: Dict[Tuple[str, ...], set] = {}
+        for kind, groups in (("intent", vocabulary["intents"]), ("urgency", vocabulary["urgency"])):
+            for name, keywords in groups.items():
+                for keyword in keywords:
+                    words = tuple(self.TOKEN_PATTERN.findall(keyword.lower()))
+                    if words:
+                        labels_by_keyword.setdefault(words, set()).add((kind, name))
+
+        self._word_keywords = {words[0]: frozenset(labels)
+                               for words, labels in labels_by_keyword.items() if len(words) == 1}
+        self._word_lengths = sorted({len(word) for word in self._word_keywords})
+        # Phrases are indexed by their first word so only candidate starts are checked
+        self._phrases: Dict[str, List[Tuple[Tuple[str, ...], FrozenSet]]] = {}
+        for words, labels in labels_by_keyword.items():
+            if len(words) > 1:
+                self._phrases.setdefault(words[0], []).append((words, frozenset(labels)))
+
+        self._domains_by_intent = {
+            intent: [BusinessDomain(value) for value in values]
+            for intent, values in vocabulary["domains"].items()
+        }
+        self._token_cache: Dict[str, FrozenSet] = {}
+
+    @classmethod
+    def from_config(cls, path: Optional[str] = None) -> 'KeywordClassifier':
+        """Build from a JSON vocabulary file (COACH_VOCABULARY_PATH), or the defaults"""
+        path = path or os.getenv("COACH_VOCABULARY_PATH")
+        if not path:
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def _token_labels(self, token: str) -> FrozenSet:
+        """Labels of every single-word keyword the token starts with (memoised)"""
+        matched = set()
+        for length in self._word_lengths:
+            if length > len(token):
+                break
+            matched.update(self._word_keywords.get(token[:length], ()))
+        labels = frozenset(matched)
+        if len(self._token_cache) >= self.token_cache_size:
+            self._token_cache.clear()
+        self._token_cache[token] = labels
+        return labels
+
+    def classify(self, message: str) -> MessageClassification:
+        """Intents, domains and urgency from a single pass over the message"""
+        tokens = self.TOKEN_PATTERN.findall(message.lower())
+        token_cache = self._token_cache
+        phrases = self._phrases
+        matched = set()
+        for i, token in enumerate(tokens):
+            labels = token_cache.get(token)
+            if labels is None:
+                labels = self._token_labels(token)
+            if labels:
+                matched |= labels
+            if token in phrases:
+                for words, labels in phrases[token]:
+                    # Last word of a phrase may be inflected like any other keyword
+                    end = i + len(words) - 1
+                    if (end < len(tokens) and tuple(tokens[i:end]) == words[:-1]
+                            and tokens[end].startswith(words[-1])):
+                        matched |= labels
+
+        intents = [intent for intent in self.intent_order if ("intent", intent) in matched]
+        if not intents:
+            intents = [DEFAULT_INTENT]
+
+        urgency = next((level for level in self.urgency_order if ("urgency", level) in matched),
+                       DEFAULT_URGENCY)
+
+        return MessageClassification(intents=intents, domains=self.domains_for(intents), urgency=urgency)
+
+    def domains_for(self, intents: List[str]) -> List[BusinessDomain]:
+        """Map intents to business domains, without duplicates"""
+        domains = []
+        for intent in intents:
+            for domain in self._domains_by_intent.get(intent, [BusinessDomain.STRATEGIC]):
+                if domain not in domains:
+                    domains.append(domain)
+        return domains
+
 @dataclass
 class ShopContext:
     """Real barbershop data for personalized recommendations"""
@@ -45,18 +195,240 @@ class ShopContext:
     review_rating: Optional[float] = None
     years_in_business: Optional[int] = None
 
+# High priority recommendations kept as ongoing projects per session
+MAX_ONGOING_PROJECTS = 10
+
+# Conversation patterns kept per shop profile in learning_data
+MAX_CONVERSATION_PATTERNS = 500
+
+@dataclass(slots=True)
+class ConversationTurn:
+    """One user message and the coach's reply"""
+    timestamp: str
+    user_message: str
+    agent_response: str
+    recommendations: List[Dict[str, Any]]
+    domains: List[str]
+
+@dataclass(slots=True)
+class HistorySummary:
+    """Compact stats for turns that have fallen out of the history window"""
+    turns: int = 0
+    first_timestamp: Optional[str] = None
+    last_timestamp: Optional[str] = None
+    recommendation_count: int = 0
+    domain_counts: Dict[str, int] = field(default_factory=dict)
+
+    def absorb(self, turn: ConversationTurn):
+        self.turns += 1
+        if self.first_timestamp is None:
+            self.first_timestamp = turn.timestamp
+        self.last_timestamp = turn.timestamp
+        self.recommendation_count += len(turn.recommendations)
+        for domain in turn.domains:
+            self.domain_counts[domain] = self.domain_counts.get(domain, 0) + 1
+
 @dataclass
 class ConversationContext:
     """Maintains conversation history and context"""
     session_id: str
     user_id: str
     shop_context: ShopContext
-    conversation_history: List[Dict[str, Any]]
+    conversation_history: List[ConversationTurn]
     current_focus: Optional[BusinessDomain] = None
     ongoing_projects: List[str] = None
     last_recommendations: List[Dict[str, Any]] = None
     goals: List[str] = None
     pain_points: List[str] = None
+    history_summary: HistorySummary = field(default_factory=HistorySummary)
+
+    @property
+    def total_turns(self) -> int:
+        """Turns in the window plus those compacted into the summary"""
+        return self.history_summary.turns + len(self.conversation_history)
+
+    def add_turn(self, turn: ConversationTurn, history_window: int):
+        """Append a turn, compacting the oldest ones beyond the window"""
+        self.conversation_history.append(turn)
+        overflow = len(self.conversation_history) - history_window
+        if overflow > 0:
+            for old_turn in self.conversation_history[:overflow]:
+                self.history_summary.absorb(old_turn)
+            del self.conversation_history[:overflow]
+
+    def add_project(self, title: str):
+        """Track a project once, keeping only the most recent ones"""
+        if title in self.ongoing_projects:
+            self.ongoing_projects.remove(title)
+        self.ongoing_projects.append(title)
+        del self.ongoing_projects[:-MAX_ONGOING_PROJECTS]
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["shop_context"]["business_stage"] = self.shop_context.business_stage.value
+        data["current_focus"] = self.current_focus.value if self.current_focus else None
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ConversationContext':
+        shop = dict(data["shop_context"])
+        shop["business_stage"] = BusinessStage(shop["business_stage"])
+        return cls(
+            session_id=data["session_id"],
+            user_id=data["user_id"],
+            shop_context=ShopContext(**shop),
+            conversation_history=[ConversationTurn(**turn) for turn in data["conversation_history"]],
+            current_focus=BusinessDomain(data["current_focus"]) if data.get("current_focus") else None,
+            ongoing_projects=data.get("ongoing_projects") or [],
+            last_recommendations=data.get("last_recommendations"),
+            goals=data.get("goals") or [],
+            pain_points=data.get("pain_points") or [],
+            history_summary=HistorySummary(**data.get("history_summary", {}))
+        )
+
+class ConversationContextStore:
+    """
+    LRU session store with idle expiry for coach conversations
+
+    At most `max_sessions` contexts are held in memory. Sessions idle for
+    longer than `ttl_seconds`, or pushed out by newer ones, are dropped - or,
+    when `spill_path` is set, written to SQLite and restored on their next
+    message. Spilled sessions older than `spill_ttl_seconds` are purged.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 3600.0,
+                 history_window: int = 20, spill_path: Optional[str] = None,
+                 spill_ttl_seconds: float = 30 * 86400.0):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.history_window = history_window
+        self.spill_path = spill_path
+        self.spill_ttl_seconds = spill_ttl_seconds
+        self._sessions: 'OrderedDict[str, Tuple[float, ConversationContext]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._spill_conn: Optional[sqlite3.Connection] = None
+        self.evictions = 0
+        self.spilled = 0
+        self.restored = 0
+
+    @classmethod
+    def from_env(cls) -> 'ConversationContextStore':
+        """Sizing from COACH_MAX_SESSIONS, COACH_SESSION_TTL, COACH_HISTORY_WINDOW, COACH_SESSION_SPILL_PATH"""
+        return cls(
+            max_sessions=int(os.getenv("COACH_MAX_SESSIONS", "1000")),
+            ttl_seconds=float(os.getenv("COACH_SESSION_TTL", "3600")),
+            history_window=int(os.getenv("COACH_HISTORY_WINDOW", "20")),
+            spill_path=os.getenv("COACH_SESSION_SPILL_PATH") or None
+        )
+
+    def get(self, session_id: str) -> Optional[ConversationContext]:
+        """Live or spilled context for a session, or None"""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None and entry[0] + self.ttl_seconds <= time.monotonic():
+                self._evict(session_id, entry[1])
+                entry = None
+
+            context = entry[1] if entry is not None else self._restore(session_id)
+            if context is not None:
+                self._insert(session_id, context)
+            return context
+
+    def put(self, context: ConversationContext):
+        with self._lock:
+            self._sessions.pop(context.session_id, None)
+            self._insert(context.session_id, context)
+
+    def evict_expired(self) -> int:
+        """Drop or spill every idle session; returns how many were evicted"""
+        with self._lock:
+            return self._evict_expired(time.monotonic())
+
+    def _insert(self, session_id: str, context: ConversationContext):
+        now = time.monotonic()
+        self._sessions[session_id] = (now, context)
+        self._evict_expired(now)
+        while len(self._sessions) > self.max_sessions:
+            old_id, (_, old_context) = self._sessions.popitem(last=False)
+            self._evict(old_id, old_context)
+
+    def _evict_expired(self, now: float) -> int:
+        # Entries are in last-access order, so expired ones sit at the front
+        evicted = 0
+        while self._sessions:
+            session_id, (last_access, context) = next(iter(self._sessions.items()))
+            if last_access + self.ttl_seconds > now:
+                break
+            del self._sessions[session_id]
+            self._evict(session_id, context)
+            evicted += 1
+        return evicted
+
+    def _evict(self, session_id: str, context: ConversationContext):
+        self.evictions += 1
+        if not self.spill_path:
+            return
+        try:
+            conn = self._spill_connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO coach_sessions (session_id, payload, spilled_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(context.to_dict()), time.time())
+            )
+            conn.commit()
+            self.spilled += 1
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"Failed to spill coach session {session_id}: {e}")
+
+    def _restore(self, session_id: str) -> Optional[ConversationContext]:
+        if not self.spill_path:
+            return None
+        try:
+            conn = self._spill_connection()
+            row = conn.execute(
+                "SELECT payload FROM coach_sessions WHERE session_id = ? AND spilled_at > ?",
+                (session_id, time.time() - self.spill_ttl_seconds)
+            ).fetchone()
+            conn.execute("DELETE FROM coach_sessions WHERE session_id = ? OR spilled_at <= ?",
+                         (session_id, time.time() - self.spill_ttl_seconds))
+            conn.commit()
+            if row is None:
+                return None
+            self.restored += 1
+            return ConversationContext.from_dict(json.loads(row[0]))
+        except (sqlite3.Error, TypeError, ValueError, KeyError) as e:
+            logger.warning(f"Failed to restore coach session {session_id}: {e}")
+            return None
+
+    def _spill_connection(self) -> sqlite3.Connection:
+        if self._spill_conn is None:
+            conn = sqlite3.connect(self.spill_path, check_same_thread=False)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS coach_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    spilled_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_coach_sessions_spilled_at ON coach_sessions(spilled_at)")
+            conn.commit()
+            self._spill_conn = conn
+        return self._spill_conn
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "live_sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "history_window": self.history_window,
+            "evictions": self.evictions,
+            "spilled": self.spilled,
+            "restored": self.restored
+        }
 
 class AgenticBusinessCoach:
     """
@@ -65,9 +437,12 @@ class AgenticBusinessCoach:
     sophisticated recommendations as it learns more data.
     """
     
-    def __init__(self):
+    def __init__(self, keyword_classifier: Optional[KeywordClassifier] = None,
+                 context_store: Optional[ConversationContextStore] = None):
         self.knowledge_base = self._initialize_knowledge_base()
-        self.conversation_contexts = {}  # session_id -> ConversationContext
+        self.keyword_classifier = keyword_classifier or KeywordClassifier.from_config()
+        self.conversation_contexts = (context_store if context_store is not None
+                                      else ConversationContextStore.from_env())
         self.learning_data = {}  # Accumulated insights across all shops
         
     def _initialize_knowledge_base(self) -> Dict[str, Any]:
@@ -209,8 +584,9 @@ class AgenticBusinessCoach:
     
     def _get_conversation_context(self, session_id: str, shop_context: ShopContext) -> ConversationContext:
         """Get or create conversation context with memory"""
-        if session_id not in self.conversation_contexts:
-            self.conversation_contexts[session_id] = ConversationContext(
+        context = self.conversation_contexts.get(session_id)
+        if context is None:
+            context = ConversationContext(
                 session_id=session_id,
                 user_id=shop_context.shop_id,
                 shop_context=shop_context,
@@ -219,7 +595,8 @@ class AgenticBusinessCoach:
                 goals=[],
                 pain_points=[]
             )
-        return self.conversation_contexts[session_id]
+            self.conversation_contexts.put(context)
+        return context
     
     async def _analyze_message(self, message: str, context: ConversationContext) -> Dict[str, Any]:
         """
@@ -230,79 +607,31 @@ class AgenticBusinessCoach:
         - Shop-specific circumstances
         """
         
-        # Intent classification (would use NLP in production)
-        intents = self._classify_business_intent(message.lower())
-        
-        # Domain routing (can span multiple domains)
-        relevant_domains = self._identify_relevant_domains(message, intents)
+        # Intent, domain routing and urgency from one keyword scan
+        # (would use NLP in production)
+        classification = self.keyword_classifier.classify(message)
+        intents = classification.intents
         
         # Context analysis
         context_factors = self._analyze_context_factors(context)
         
-        # Urgency and priority assessment
-        urgency = self._assess_urgency(message, context)
-        
         return {
             "original_message": message,
             "intents": intents,
-            "relevant_domains": relevant_domains,
+            "relevant_domains": classification.domains,
             "context_factors": context_factors,
-            "urgency": urgency,
+            "urgency": classification.urgency,
             "requires_data": self._requires_real_data(intents),
             "followup_potential": self._assess_followup_potential(intents, context)
         }
     
     def _classify_business_intent(self, message: str) -> List[str]:
         """Classify business intents from the message"""
-        intents = []
-        
-        # Revenue-related intents
-        if any(word in message for word in ["revenue", "money", "profit", "income", "sales", "pricing"]):
-            intents.append("revenue_optimization")
-        
-        # Customer-related intents
-        if any(word in message for word in ["customer", "client", "retention", "acquisition", "marketing"]):
-            intents.append("customer_management")
-            
-        # Operations-related intents
-        if any(word in message for word in ["schedule", "efficiency", "operations", "workflow", "booking"]):
-            intents.append("operations_optimization")
-        
-        # Growth-related intents
-        if any(word in message for word in ["grow", "expand", "scale", "new location", "franchise"]):
-            intents.append("growth_planning")
-        
-        # Staff-related intents
-        if any(word in message for word in ["staff", "employee", "barber", "hiring", "training"]):
-            intents.append("staff_management")
-        
-        # Problem-solving intents
-        if any(word in message for word in ["problem", "issue", "struggling", "help", "stuck"]):
-            intents.append("problem_solving")
-        
-        # Strategic intents
-        if any(word in message for word in ["strategy", "plan", "future", "goals", "vision"]):
-            intents.append("strategic_planning")
-        
-        return intents if intents else ["general_business_advice"]
+        return self.keyword_classifier.classify(message).intents
     
     def _identify_relevant_domains(self, message: str, intents: List[str]) -> List[BusinessDomain]:
         """Map intents to business domains (can be multiple)"""
-        domain_mapping = {
-            "revenue_optimization": [BusinessDomain.FINANCIAL],
-            "customer_management": [BusinessDomain.MARKETING, BusinessDomain.CUSTOMER_EXPERIENCE],
-            "operations_optimization": [BusinessDomain.OPERATIONS],
-            "growth_planning": [BusinessDomain.GROWTH, BusinessDomain.STRATEGIC],
-            "staff_management": [BusinessDomain.STAFF],
-            "problem_solving": [BusinessDomain.OPERATIONS, BusinessDomain.FINANCIAL],
-            "strategic_planning": [BusinessDomain.STRATEGIC, BusinessDomain.GROWTH]
-        }
-        
-        domains = []
-        for intent in intents:
-            domains.extend(domain_mapping.get(intent, [BusinessDomain.STRATEGIC]))
-        
-        return list(set(domains))  # Remove duplicates
+        return self.keyword_classifier.domains_for(intents)
     
     def _analyze_context_factors(self, context: ConversationContext) -> Dict[str, Any]:
         """Analyze contextual factors that influence recommendations"""
@@ -315,7 +644,7 @@ class AgenticBusinessCoach:
             "growth_potential": self._assess_growth_potential(shop),
             "operational_sophistication": self._assess_operational_sophistication(shop),
             "market_position": self._assess_market_position(shop),
-            "conversation_history": len(context.conversation_history),
+            "conversation_history": context.total_turns,
             "ongoing_projects": context.ongoing_projects,
             "previous_goals": context.goals
         }
@@ -388,17 +717,7 @@ class AgenticBusinessCoach:
     
     def _assess_urgency(self, message: str, context: ConversationContext) -> str:
         """Assess urgency of the business need"""
-        urgent_indicators = ["urgent", "emergency", "asap", "immediately", "crisis", "failing", "desperate"]
-        moderate_indicators = ["soon", "quickly", "problem", "issue", "struggling"]
-        
-        message_lower = message.lower()
-        
-        if any(indicator in message_lower for indicator in urgent_indicators):
-            return "high"
-        elif any(indicator in message_lower for indicator in moderate_indicators):
-            return "medium"
-        else:
-            return "low"
+        return self.keyword_classifier.classify(message).urgency
     
     def _requires_real_data(self, intents: List[str]) -> bool:
         """Determine if this query would benefit from real shop data"""
@@ -415,7 +734,7 @@ class AgenticBusinessCoach:
         
         if any(intent in complex_intents for intent in intents):
             return "high"
-        elif len(context.conversation_history) > 0:
+        elif context.total_turns > 0:
             return "medium"
         else:
             return "low"
@@ -538,7 +857,7 @@ class AgenticBusinessCoach:
         shop = context.shop_context
         
         # Personalize greeting based on conversation history
-        if len(context.conversation_history) == 0:
+        if context.total_turns == 0:
             greeting = f"Hello {shop.owner_name}! I'm your AI business coach for {shop.shop_name}."
         else:
             greeting = f"Great to continue our conversation about {shop.shop_name}!"
@@ -603,7 +922,7 @@ class AgenticBusinessCoach:
         if BusinessDomain.FINANCIAL in analysis["relevant_domains"]:
             suggestions.append("Should we explore cost optimization strategies as well?")
         
-        if len(context.conversation_history) > 2:
+        if context.total_turns > 2:
             suggestions.append("Ready to move forward with implementing any of our previous recommendations?")
         
         return suggestions[:3]  # Limit to 3 suggestions
@@ -623,7 +942,7 @@ class AgenticBusinessCoach:
             base_confidence += 0.05
         
         # Increase confidence with conversation history
-        if len(context.conversation_history) > 2:
+        if context.total_turns > 2:
             base_confidence += 0.05
         
         # Adjust based on business stage sophistication
@@ -638,26 +957,22 @@ class AgenticBusinessCoach:
                                    response: Dict[str, Any]):
         """Update conversation context and learning data"""
         
-        # Update conversation history
-        context.conversation_history.append({
-            "timestamp": datetime.now().isoformat(),
-            "user_message": user_message,
-            "agent_response": response["response"],
-            "recommendations": response["recommendations"],
-            "domains": response["domains_addressed"]
-        })
+        # Update conversation history, compacting turns beyond the window
+        context.add_turn(ConversationTurn(
+            timestamp=datetime.now().isoformat(),
+            user_message=user_message,
+            agent_response=response["response"],
+            recommendations=response["recommendations"],
+            domains=response["domains_addressed"]
+        ), self.conversation_contexts.history_window)
         
         # Update ongoing projects based on recommendations
         for rec in response["recommendations"]:
             if rec["priority"] == "high":
-                context.ongoing_projects.append(rec["title"])
+                context.add_project(rec["title"])
         
         # Extract and store learning insights
         self._extract_learning_insights(context, user_message, response)
-        
-        # Limit conversation history to last 20 interactions
-        if len(context.conversation_history) > 20:
-            context.conversation_history = context.conversation_history[-20:]
     
     def _extract_learning_insights(self, 
                                  context: ConversationContext, 
@@ -673,7 +988,7 @@ class AgenticBusinessCoach:
             self.learning_data[shop_profile] = {
                 "common_questions": {},
                 "successful_recommendations": {},
-                "conversation_patterns": []
+                "conversation_patterns": deque(maxlen=MAX_CONVERSATION_PATTERNS)
             }
         
         # Track common questions for this shop profile
@@ -6,12 +6,48 @@ Analyzes customer behavior patterns for intelligent rebooking and personalizatio
 
 import sqlite3
 import json
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Iterator
 from collections import defaultdict, Counter
+from itertools import groupby
+from operator import itemgetter
 import statistics
 from dataclasses import dataclass
 
+# NumPy speeds up batch profiling; the pure-Python path gives the same results
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+TIME_SLOTS = ['morning', 'afternoon', 'evening']
+
+# Appointment history columns, in the order _row_to_appointment reads them
+APPOINTMENT_COLUMNS = """
+    a.id, a.customer_id, a.barber_id, a.service_id, a.location_id,
+    a.appointment_datetime, a.duration, a.price, a.status, a.notes,
+    s.name, s.category, b.display_name, l.name, u.full_name, u.phone
+"""
+
+APPOINTMENT_JOINS = """
+    FROM appointments a
+    JOIN services s ON a.service_id = s.id
+    JOIN barbers b ON a.barber_id = b.id
+    JOIN locations l ON a.location_id = l.id
+    JOIN users u ON a.customer_id = u.id
+"""
+
+def _time_slot(hour: int) -> str:
+    """Bucket an appointment hour into morning/afternoon/evening"""
+    if 9 <= hour < 12:
+        return "morning"
+    elif 12 <= hour < 17:
+        return "afternoon"
+    return "evening"
+
 class DateTimeEncoder(json.JSONEncoder):
     """Custom JSON encoder for datetime objects"""
     def default(self, obj):
@@ -44,6 +80,16 @@ class BarberRelationship:
     loyalty_score: float
     switching_pattern: str
 
+@dataclass
+class AppointmentFeatures:
+    """Per-customer aggregates shared by the analysis steps"""
+    days_between: List[int]
+    day_counts: Counter  # day name -> visits, in first-seen order
+    time_slot_counts: Counter  # morning/afternoon/evening -> visits, in first-seen order
+    barber_counts: Dict[str, int]  # barber_id -> visits, in first-seen order
+    barber_recency: Dict[str, float]  # barber_id -> mean recency score
+    service_counts: Counter  # service name -> visits, in first-seen order
+
 @dataclass
 class CommunicationProfile:
     """Customer communication preference analysis"""
@@ -67,43 +113,127 @@ class CustomerBehaviorAnalyzer:
         if len(appointments) < 2:
             return self._default_behavior_profile(customer_id)
         
+        now = datetime.now()
+        features = self._compute_features(appointments, now)
+        behavior_profile = self._build_behavior_profile(customer_id, appointments, features, now)
+        
+        # Store updated behavior profile
+        self._store_behavior_profile(customer_id, behavior_profile)
+        
+        return behavior_profile
+    
+    def analyze_barbershop_behavior(self, location_id: int, chunk_size: int = 20000,
+                                    fetch_size: int = 5000) -> Dict[str, Any]:
+        """
+        Profile every customer of a barbershop in one pass (nightly batch job)
+        
+        Streams the full history of every customer who has visited the location
+        with a single query sorted by customer, computes visit gaps, day/time
+        histograms and barber/service affinities for `chunk_size` appointments
+        at a time (grouped NumPy operations when available), and writes all
+        profiles back with one executemany. Profiles match analyze_customer_behavior.
+        """
+        started = time.perf_counter()
+        now = datetime.now()
+        profile_rows: List[Tuple] = []
+        customers_skipped = 0
+        appointments_processed = 0
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {APPOINTMENT_COLUMNS}
+                {APPOINTMENT_JOINS}
+                WHERE a.customer_id IN (
+                    SELECT DISTINCT customer_id FROM appointments WHERE location_id = ?
+                )
+                AND a.status IN ('completed', 'confirmed')
+                ORDER BY a.customer_id ASC, a.appointment_datetime ASC
+            """, (location_id,))
+            
+            chunk: List[Tuple[int, List[Dict[str, Any]]]] = []
+            chunk_appointments = 0
+            
+            for customer_id, rows in groupby(self._iter_rows(cursor, fetch_size), key=itemgetter(1)):
+                appointments = [self._row_to_appointment(row) for row in rows]
+                appointments_processed += len(appointments)
+                
+                # analyze_customer_behavior does not store profiles for thin histories either
+                if len(appointments) < 2:
+                    customers_skipped += 1
+                    continue
+                
+                chunk.append((customer_id, appointments))
+                chunk_appointments += len(appointments)
+                if chunk_appointments >= chunk_size:
+                    profile_rows.extend(self._profile_chunk(chunk, now))
+                    chunk, chunk_appointments = [], 0
+            
+            if chunk:
+                profile_rows.extend(self._profile_chunk(chunk, now))
+            
+            cursor.executemany("""
+                INSERT OR REPLACE INTO customer_behavior 
+                (customer_id, barber_preferences, service_patterns, timing_preferences, 
+                 communication_preferences, booking_behavior, seasonal_patterns, last_updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, profile_rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return {
+            'location_id': location_id,
+            'customers_profiled': len(profile_rows),
+            'customers_skipped': customers_skipped,
+            'appointments_processed': appointments_processed,
+            'numpy_enabled': NUMPY_AVAILABLE,
+            'duration_seconds': round(time.perf_counter() - started, 3)
+        }
+    
+    def _profile_chunk(self, chunk: List[Tuple[int, List[Dict[str, Any]]]],
+                       now: datetime) -> List[Tuple]:
+        """Build storage rows for a chunk of customers"""
+        features = self._compute_grouped_features([appointments for _, appointments in chunk], now)
+        return [
+            self._profile_row(customer_id, self._build_behavior_profile(customer_id, appointments, customer_features, now))
+            for (customer_id, appointments), customer_features in zip(chunk, features)
+        ]
+    
+    def _build_behavior_profile(self, customer_id: int, appointments: List[Dict[str, Any]],
+                                features: AppointmentFeatures, now: datetime) -> Dict[str, Any]:
+        """Assemble a behavior profile from appointments and their precomputed features"""
+        
         # Analyze different aspects of behavior
-        booking_patterns = self._analyze_booking_patterns(appointments)
-        service_preferences = self._analyze_service_preferences(appointments)
-        barber_relationships = self._analyze_barber_relationships(appointments)
+        booking_patterns = self._analyze_booking_patterns(appointments, features)
+        service_preferences = self._analyze_service_preferences(appointments, features)
+        barber_relationships = self._analyze_barber_relationships(appointments, features)
         communication_profile = self._analyze_communication_patterns(customer_id, appointments)
         
         # Calculate overall insights
-        behavior_profile = {
+        return {
             'customer_id': customer_id,
             'booking_patterns': booking_patterns.__dict__,
             'service_preferences': service_preferences.__dict__,
             'barber_relationships': barber_relationships.__dict__,
             'communication_profile': communication_profile.__dict__,
-            'predictive_insights': self._generate_predictive_insights(appointments),
-            'last_analyzed': datetime.now().isoformat(),
-            'confidence_score': self._calculate_confidence_score(appointments)
+            'predictive_insights': self._generate_predictive_insights(appointments, features.days_between, now),
+            'last_analyzed': now.isoformat(),
+            'confidence_score': self._calculate_confidence_score(appointments, features.days_between)
         }
-        
-        # Store updated behavior profile
-        self._store_behavior_profile(customer_id, behavior_profile)
-        
-        return behavior_profile
     
     def _get_customer_appointments(self, customer_id: int) -> List[Dict[str, Any]]:
         """Get customer's appointment history with related data"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT a.*, s.name as service_name, s.category as service_category,
-                   b.display_name as barber_name, l.name as location_name,
-                   u.full_name as customer_name, u.phone as customer_phone
-            FROM appointments a
-            JOIN services s ON a.service_id = s.id
-            JOIN barbers b ON a.barber_id = b.id
-            JOIN locations l ON a.location_id = l.id
-            JOIN users u ON a.customer_id = u.id
+        cursor.execute(f"""
+            SELECT {APPOINTMENT_COLUMNS}
+            {APPOINTMENT_JOINS}
             WHERE a.customer_id = ? AND a.status IN ('completed', 'confirmed')
             ORDER BY a.appointment_datetime ASC
         """, (customer_id,))
@@ -111,63 +241,172 @@ class CustomerBehaviorAnalyzer:
         rows = cursor.fetchall()
         conn.close()
         
-        appointments = []
-        for row in rows:
-            appointments.append({
-                'id': row[0],
-                'customer_id': row[1],
-                'barber_id': row[2],
-                'service_id': row[3],
-                'location_id': row[4],
-                'appointment_datetime': datetime.fromisoformat(row[5]),
-                'duration': row[6],
-                'price': row[7],
-                'status': row[8],
-                'notes': row[9],
-                'service_name': row[13],  # s.name
-                'service_category': row[14],  # s.category
-                'barber_name': row[15],  # b.display_name
-                'location_name': row[16],  # l.name
-                'customer_name': row[17],  # u.full_name
-                'customer_phone': row[18] # u.phone
-            })
-        
-        return appointments
+        return [self._row_to_appointment(row) for row in rows]
     
-    def _analyze_booking_patterns(self, appointments: List[Dict[str, Any]]) -> BookingPattern:
-        """Analyze customer booking timing and frequency patterns"""
-        
-        # Calculate days between visits
-        days_between = []
-        for i in range(1, len(appointments)):
-            prev_date = appointments[i-1]['appointment_datetime']
-            curr_date = appointments[i]['appointment_datetime']
-            days_diff = (curr_date - prev_date).days
-            days_between.append(days_diff)
-        
-        avg_days_between = statistics.mean(days_between) if days_between else 30
+    @staticmethod
+    def _iter_rows(cursor: sqlite3.Cursor, fetch_size: int) -> Iterator[Tuple]:
+        """Stream query results in fetchmany batches"""
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                return
+            yield from rows
+    
+    @staticmethod
+    def _row_to_appointment(row: Tuple) -> Dict[str, Any]:
+        """Map an APPOINTMENT_COLUMNS row to an appointment dict"""
+        return {
+            'id': row[0],
+            'customer_id': row[1],
+            'barber_id': row[2],
+            'service_id': row[3],
+            'location_id': row[4],
+            'appointment_datetime': datetime.fromisoformat(row[5]),
+            'duration': row[6],
+            'price': row[7],
+            'status': row[8],
+            'notes': row[9],
+            'service_name': row[10],
+            'service_category': row[11],
+            'barber_name': row[12],
+            'location_name': row[13],
+            'customer_name': row[14],
+            'customer_phone': row[15]
+        }
+    
+    def _compute_features(self, appointments: List[Dict[str, Any]], now: datetime) -> AppointmentFeatures:
+        """Per-customer aggregates for one appointment history (sorted by time)"""
+        days_between = [
+            (appointments[i]['appointment_datetime'] - appointments[i - 1]['appointment_datetime']).days
+            for i in range(1, len(appointments))
+        ]
         
-        # Analyze preferred days of week
         day_counts = Counter()
+        time_slot_counts = Counter()
+        service_counts = Counter()
+        barber_counts: Dict[str, int] = {}
+        recency_totals: Dict[str, float] = {}
+        
         for apt in appointments:
-            day_name = apt['appointment_datetime'].strftime('%A')
-            day_counts[day_name] += 1
+            appointment_datetime = apt['appointment_datetime']
+            day_counts[appointment_datetime.strftime('%A')] += 1
+            time_slot_counts[_time_slot(appointment_datetime.hour)] += 1
+            service_counts[apt['service_name']] += 1
+            
+            # Recency bonus - more recent appointments get higher weight (decay over a year)
+            barber_id = str(apt['barber_id'])
+            days_ago = (now - appointment_datetime).days
+            barber_counts[barber_id] = barber_counts.get(barber_id, 0) + 1
+            recency_totals[barber_id] = recency_totals.get(barber_id, 0.0) + max(0, 1 - (days_ago / 365))
+        
+        return AppointmentFeatures(
+            days_between=days_between,
+            day_counts=day_counts,
+            time_slot_counts=time_slot_counts,
+            barber_counts=barber_counts,
+            barber_recency={barber_id: recency_totals[barber_id] / count for barber_id, count in barber_counts.items()},
+            service_counts=service_counts
+        )
+    
+    def _compute_grouped_features(self, histories: List[List[Dict[str, Any]]],
+                                  now: datetime) -> List[AppointmentFeatures]:
+        """
+        Features for many customers at once
+        
+        Histories are concatenated into flat arrays with a customer index, so
+        gaps, histograms and affinities are computed with grouped NumPy
+        operations instead of per-customer loops.
+        """
+        if not NUMPY_AVAILABLE or not histories:
+            return [self._compute_features(appointments, now) for appointments in histories]
+        
+        flat = [apt for appointments in histories for apt in appointments]
+        sizes = np.fromiter((len(appointments) for appointments in histories), dtype=np.int64, count=len(histories))
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        customer_index = np.repeat(np.arange(len(histories)), sizes)
+        positions = np.arange(len(flat))
+        
+        micros = np.array([apt['appointment_datetime'] for apt in flat], dtype='datetime64[us]').astype(np.int64)
+        micros_per_day = 86_400_000_000
+        
+        # Whole days between consecutive visits; slices never cross customers
+        gaps = np.diff(micros) // micros_per_day
+        
+        # 1970-01-01 was a Thursday, so Monday == 0
+        weekday = (micros // micros_per_day + 3) % 7
+        hour = (micros // 3_600_000_000) % 24
+        slot = np.where((hour >= 9) & (hour < 12), 0, np.where((hour >= 12) & (hour < 17), 1, 2))
+        
+        now_micros = np.datetime64(now, 'us').astype(np.int64)
+        recency = np.maximum(0, 1 - ((now_micros - micros) // micros_per_day) / 365)
+        
+        service_codes: Dict[str, int] = {}
+        service_index = np.fromiter((service_codes.setdefault(apt['service_name'], len(service_codes)) for apt in flat),
+                                    dtype=np.int64, count=len(flat))
+        service_names = list(service_codes)
+        barber_ids = np.fromiter((apt['barber_id'] for apt in flat), dtype=np.int64, count=len(flat))
+        
+        day_counts = self._grouped_counts(customer_index, weekday, positions, DAY_NAMES)
+        slot_counts = self._grouped_counts(customer_index, slot, positions, TIME_SLOTS)
+        service_counts = self._grouped_counts(customer_index, service_index, positions, service_names)
+        
+        # Barber affinity: visit counts and mean recency per (customer, barber)
+        pairs, first_seen, inverse, pair_counts = np.unique(
+            np.stack([customer_index, barber_ids], axis=1), axis=0,
+            return_index=True, return_inverse=True, return_counts=True
+        )
+        recency_means = np.bincount(inverse.ravel(), weights=recency) / pair_counts
+        barber_counts: List[Dict[str, int]] = [{} for _ in histories]
+        barber_recency: List[Dict[str, float]] = [{} for _ in histories]
+        for pair in np.argsort(first_seen, kind='stable'):
+            customer, barber_id = int(pairs[pair][0]), str(int(pairs[pair][1]))
+            barber_counts[customer][barber_id] = int(pair_counts[pair])
+            barber_recency[customer][barber_id] = float(recency_means[pair])
+        
+        return [
+            AppointmentFeatures(
+                days_between=gaps[start:start + size - 1].tolist(),
+                day_counts=day_counts[customer],
+                time_slot_counts=slot_counts[customer],
+                barber_counts=barber_counts[customer],
+                barber_recency=barber_recency[customer],
+                service_counts=service_counts[customer]
+            )
+            for customer, (start, size) in enumerate(zip(starts.tolist(), sizes.tolist()))
+        ]
+    
+    @staticmethod
+    def _grouped_counts(customer_index, codes, positions, labels: List[str]) -> List[Counter]:
+        """Per-customer Counters of coded values, keyed by label in first-seen order"""
+        num_customers = int(customer_index[-1]) + 1
+        width = len(labels)
+        keys = customer_index * width + codes
+        
+        counts = np.bincount(keys, minlength=num_customers * width).reshape(num_customers, width)
+        first_seen = np.full(num_customers * width, len(positions), dtype=np.int64)
+        np.minimum.at(first_seen, keys, positions)
+        first_seen = first_seen.reshape(num_customers, width)
+        
+        result = []
+        for customer in range(num_customers):
+            present = np.flatnonzero(counts[customer])
+            ordered = present[np.argsort(first_seen[customer][present], kind='stable')]
+            result.append(Counter({labels[code]: int(counts[customer][code]) for code in ordered}))
+        return result
+    
+    def _analyze_booking_patterns(self, appointments: List[Dict[str, Any]],
+                                  features: AppointmentFeatures) -> BookingPattern:
+        """Analyze customer booking timing and frequency patterns"""
         
-        preferred_days = [day for day, count in day_counts.most_common(3)]
+        # Days between visits
+        days_between = features.days_between
+        avg_days_between = statistics.mean(days_between) if days_between else 30
         
-        # Analyze preferred times
-        hour_counts = Counter()
-        for apt in appointments:
-            hour = apt['appointment_datetime'].hour
-            if 9 <= hour < 12:
-                time_slot = "morning"
-            elif 12 <= hour < 17:
-                time_slot = "afternoon"
-            else:
-                time_slot = "evening"
-            hour_counts[time_slot] += 1
+        # Preferred days of week
+        preferred_days = [day for day, count in features.day_counts.most_common(3)]
         
-        preferred_times = [time for time, count in hour_counts.most_common(2)]
+        # Preferred times
+        preferred_times = [time_slot for time_slot, count in features.time_slot_counts.most_common(2)]
         
         # Analyze seasonal variations
         seasonal_data = defaultdict(list)
@@ -215,25 +454,27 @@ class CustomerBehaviorAnalyzer:
             frequency_trend=frequency_trend
         )
     
-    def _analyze_service_preferences(self, appointments: List[Dict[str, Any]]) -> ServicePreference:
+    def _analyze_service_preferences(self, appointments: List[Dict[str, Any]],
+                                     features: AppointmentFeatures) -> ServicePreference:
         """Analyze customer service preferences and patterns"""
         
         # Most frequent services
-        service_counts = Counter()
         service_prices = defaultdict(list)
+        last_booked = {}
         
         for apt in appointments:
-            service_counts[apt['service_name']] += 1
             service_prices[apt['service_name']].append(apt['price'])
+            # Appointments are in time order, so the last one seen is the latest
+            last_booked[apt['service_name']] = apt['appointment_datetime']
         
         most_frequent_services = []
-        for service, count in service_counts.most_common(5):
+        for service, count in features.service_counts.most_common(5):
             avg_price = statistics.mean(service_prices[service])
             most_frequent_services.append({
                 'service_name': service,
                 'frequency': count,
                 'avg_price': avg_price,
-                'last_booked': max([apt['appointment_datetime'] for apt in appointments if apt['service_name'] == service]).isoformat()
+                'last_booked': last_booked[service].isoformat()
             })
         
         # Analyze service combinations (services booked together or in sequence)
@@ -271,26 +512,19 @@ class CustomerBehaviorAnalyzer:
             upgrade_propensity=upgrade_propensity
         )
     
-    def _analyze_barber_relationships(self, appointments: List[Dict[str, Any]]) -> BarberRelationship:
+    def _analyze_barber_relationships(self, appointments: List[Dict[str, Any]],
+                                      features: AppointmentFeatures) -> BarberRelationship:
         """Analyze customer-barber relationship patterns"""
         
-        # Calculate barber preferences based on frequency and recency
         barber_data = defaultdict(list)
         for apt in appointments:
             barber_data[str(apt['barber_id'])].append(apt)
         
+        # Barber preferences based on frequency and recency
         preferred_barbers = {}
-        for barber_id, barber_apts in barber_data.items():
-            frequency_score = len(barber_apts) / len(appointments)
-            
-            # Recency bonus - more recent appointments get higher weight
-            recency_scores = []
-            for apt in barber_apts:
-                days_ago = (datetime.now() - apt['appointment_datetime']).days
-                recency_score = max(0, 1 - (days_ago / 365))  # Decay over a year
-                recency_scores.append(recency_score)
-            
-            avg_recency = statistics.mean(recency_scores) if recency_scores else 0
+        for barber_id, visit_count in features.barber_counts.items():
+            frequency_score = visit_count / len(appointments)
+            avg_recency = features.barber_recency[barber_id]
             
             # Combined preference score
             preference_score = (frequency_score * 0.7) + (avg_recency * 0.3)
@@ -298,11 +532,11 @@ class CustomerBehaviorAnalyzer:
         
         # Estimate satisfaction scores (in a real system, this would use actual ratings)
         satisfaction_scores = {}
+        overall_avg_price = statistics.mean([apt['price'] for apt in appointments])
         for barber_id, barber_apts in barber_data.items():
             # Proxy for satisfaction: repeat bookings and price paid
             repeat_rate = len(barber_apts) / len(appointments)
             avg_price = statistics.mean([apt['price'] for apt in barber_apts])
-            overall_avg_price = statistics.mean([apt['price'] for apt in appointments])
             
             # Higher price suggests satisfaction with premium service
             price_satisfaction = min(1.0, avg_price / max(overall_avg_price, 1))
@@ -374,20 +608,14 @@ class CustomerBehaviorAnalyzer:
             reminder_preferences=reminder_preferences
         )
     
-    def _generate_predictive_insights(self, appointments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _generate_predictive_insights(self, appointments: List[Dict[str, Any]],
+                                      days_between: List[int], now: datetime) -> Dict[str, Any]:
         """Generate predictive insights for future bookings"""
         
         if len(appointments) < 3:
             return {'next_booking_prediction': None, 'confidence': 'low'}
         
         # Predict next booking date
-        days_between = []
-        for i in range(1, len(appointments)):
-            prev_date = appointments[i-1]['appointment_datetime']
-            curr_date = appointments[i]['appointment_datetime']
-            days_diff = (curr_date - prev_date).days
-            days_between.append(days_diff)
-        
         avg_interval = statistics.mean(days_between)
         last_appointment = appointments[-1]['appointment_datetime']
         predicted_next_booking = last_appointment + timedelta(days=avg_interval)
@@ -416,29 +644,23 @@ class CustomerBehaviorAnalyzer:
                 'likely_barber': likely_barber,
                 'confidence_score': overall_confidence
             },
-            'churn_risk': self._calculate_churn_risk(appointments),
+            'churn_risk': self._calculate_churn_risk(appointments, days_between, now),
             'upsell_opportunities': self._identify_upsell_opportunities(appointments),
             'optimal_contact_time': (predicted_next_booking - timedelta(days=3)).isoformat()
         }
     
-    def _calculate_churn_risk(self, appointments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _calculate_churn_risk(self, appointments: List[Dict[str, Any]], days_between: List[int],
+                              now: datetime) -> Dict[str, Any]:
         """Calculate customer churn risk"""
         
         if len(appointments) < 2:
             return {'risk_level': 'unknown', 'score': 0.5}
         
         # Calculate expected next visit based on pattern
-        days_between = []
-        for i in range(1, len(appointments)):
-            prev_date = appointments[i-1]['appointment_datetime']
-            curr_date = appointments[i]['appointment_datetime']
-            days_diff = (curr_date - prev_date).days
-            days_between.append(days_diff)
-        
         avg_interval = statistics.mean(days_between)
         last_appointment = appointments[-1]['appointment_datetime']
         expected_next_visit = last_appointment + timedelta(days=avg_interval)
-        days_overdue = (datetime.now() - expected_next_visit).days
+        days_overdue = (now - expected_next_visit).days
         
         # Calculate risk score
         if days_overdue <= 0:
@@ -505,7 +727,8 @@ class CustomerBehaviorAnalyzer:
         
         return opportunities
     
-    def _calculate_confidence_score(self, appointments: List[Dict[str, Any]]) -> float:
+    def _calculate_confidence_score(self, appointments: List[Dict[str, Any]],
+                                    days_between: List[int]) -> float:
         """Calculate overall confidence in behavior analysis"""
         
         # Factors that increase confidence
@@ -515,13 +738,6 @@ class CustomerBehaviorAnalyzer:
         
         # Consistency in timing
         if data_points >= 3:
-            days_between = []
-            for i in range(1, len(appointments)):
-                prev_date = appointments[i-1]['appointment_datetime']
-                curr_date = appointments[i]['appointment_datetime']
-                days_diff = (curr_date - prev_date).days
-                days_between.append(days_diff)
-            
             if len(days_between) > 1:
                 interval_variance = statistics.stdev(days_between) / statistics.mean(days_between)
                 consistency_factors.append(1 - min(1, interval_variance))
@@ -584,26 +800,29 @@ class CustomerBehaviorAnalyzer:
             'confidence_score': 0.1
         }
     
+    def _profile_row(self, customer_id: int, behavior_profile: Dict[str, Any]) -> Tuple:
+        """customer_behavior row for a profile (JSON columns use the datetime-aware encoder)"""
+        return (
+            customer_id,
+            json.dumps(behavior_profile['barber_relationships']['preferred_barbers'], cls=DateTimeEncoder),
+            json.dumps(behavior_profile['service_preferences'], cls=DateTimeEncoder),
+            json.dumps(behavior_profile['booking_patterns'], cls=DateTimeEncoder),
+            json.dumps(behavior_profile['communication_profile'], cls=DateTimeEncoder),
+            json.dumps(behavior_profile['predictive_insights'], cls=DateTimeEncoder),
+            json.dumps(behavior_profile['booking_patterns']['seasonal_variations'], cls=DateTimeEncoder)
+        )
+    
     def _store_behavior_profile(self, customer_id: int, behavior_profile: Dict[str, Any]):
         """Store behavior profile in database"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # Convert profile to JSON strings for storage using custom encoder
-        barber_preferences = json.dumps(behavior_profile['barber_relationships']['preferred_barbers'], cls=DateTimeEncoder)
-        service_patterns = json.dumps(behavior_profile['service_preferences'], cls=DateTimeEncoder)
-        timing_preferences = json.dumps(behavior_profile['booking_patterns'], cls=DateTimeEncoder)
-        communication_preferences = json.dumps(behavior_profile['communication_profile'], cls=DateTimeEncoder)
-        booking_behavior = json.dumps(behavior_profile['predictive_insights'], cls=DateTimeEncoder)
-        seasonal_patterns = json.dumps(behavior_profile['booking_patterns']['seasonal_variations'], cls=DateTimeEncoder)
-        
         cursor.execute("""
             INSERT OR REPLACE INTO customer_behavior 
             (customer_id, barber_preferences, service_patterns, timing_preferences, 
              communication_preferences, booking_behavior, seasonal_patterns, last_updated)
             VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        """, (customer_id, barber_preferences, service_patterns, timing_preferences,
-              communication_preferences, booking_behavior, seasonal_patterns))
+        """, self._profile_row(customer_id, behavior_profile))
         
         conn.commit()
         conn.close()
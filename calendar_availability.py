@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Calendar Availability Engine
+Computes bookable slots from busy intervals with a sort-and-sweep merge,
+so multi-barber, multi-day, multi-duration queries are answered in one pass
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+Interval = Tuple[datetime, datetime]
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Normalise datetimes to naive UTC (the convention used for Calendar timeMin/timeMax)"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def event_interval(event: Dict) -> Optional[Interval]:
+    """
+    (start, end) of a Calendar event in naive UTC
+
+    All-day events carry `date` instead of `dateTime` and block their whole
+    days; the exclusive end date is midnight after the last day.
+    """
+    start, end = event.get('start', {}), event.get('end', {})
+    if start.get('dateTime') and end.get('dateTime'):
+        return (
+            to_naive_utc(datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00'))),
+            to_naive_utc(datetime.fromisoformat(end['dateTime'].replace('Z', '+00:00')))
+        )
+    if start.get('date') and end.get('date'):
+        return (datetime.fromisoformat(start['date']), datetime.fromisoformat(end['date']))
+    return None
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort busy intervals and merge overlapping or touching ones - O(n log n)"""
+    ordered = sorted(
+        (to_naive_utc(start), to_naive_utc(end))
+        for start, end in intervals
+        if end > start
+    )
+
+    merged: List[Interval] = []
+    for start, end in ordered:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_intervals(merged_busy: Sequence[Interval], window_start: datetime,
+                   window_end: datetime, busy_ends: Optional[Sequence[datetime]] = None) -> List[Interval]:
+    """
+    Free gaps inside [window_start, window_end) given merged, sorted busy intervals
+
+    `busy_ends` (the end times of merged_busy) lets callers reuse one bisect index
+    across many windows.
+    """
+    if busy_ends is None:
+        busy_ends = [end for _, end in merged_busy]
+
+    gaps: List[Interval] = []
+    cursor = window_start
+    # First busy interval that ends after the window opens
+    i = bisect_right(busy_ends, window_start)
+    while i < len(merged_busy) and merged_busy[i][0] < window_end:
+        busy_start, busy_end = merged_busy[i]
+        if busy_start > cursor:
+            gaps.append((cursor, busy_start))
+        if busy_end > cursor:
+            cursor = busy_end
+        i += 1
+    if cursor < window_end:
+        gaps.append((cursor, window_end))
+    return gaps
+
+
+def slot_starts(gaps: Sequence[Interval], duration_minutes: int, step_minutes: int,
+                grid_origin: datetime) -> List[datetime]:
+    """Grid-aligned slot starts that fit entirely inside a free gap"""
+    duration = timedelta(minutes=duration_minutes)
+    step = timedelta(minutes=step_minutes)
+    slots: List[datetime] = []
+
+    for gap_start, gap_end in gaps:
+        # First grid point at or after the gap start
+        offset = gap_start - grid_origin
+        steps = -(-offset // step) if offset > timedelta(0) else 0
+        current = grid_origin + steps * step
+        while current + duration <= gap_end:
+            slots.append(current)
+            current += step
+    return slots
+
+
+class AvailabilityEngine:
+    """
+    Answers slot queries over many barbers, days and service durations at once
+
+    Busy intervals for each barber are merged once for the whole date range;
+    each day window then costs a bisect plus a sweep over that day's intervals.
+    """
+
+    def __init__(self, start_hour: int = 9, end_hour: int = 18, step_minutes: int = 15):
+        self.start_hour = start_hour
+        self.end_hour = end_hour
+        self.step_minutes = step_minutes
+
+    def business_window(self, day: date) -> Interval:
+        """Business hours for a day (default 9 AM - 6 PM)"""
+        day_start = datetime(day.year, day.month, day.day)
+        return (day_start.replace(hour=self.start_hour), day_start.replace(hour=self.end_hour))
+
+    def compute_slots(self, busy_by_barber: Dict[int, Iterable[Interval]], days: Sequence[date],
+                      durations: Sequence[int]) -> Dict[int, Dict[date, Dict[int, List[datetime]]]]:
+        """
+        Available slots as {barber_id: {day: {duration_minutes: [slot_start, ...]}}}
+        """
+        windows = [(day, self.business_window(day)) for day in days]
+        results: Dict[int, Dict[date, Dict[int, List[datetime]]]] = {}
+
+        for barber_id, busy in busy_by_barber.items():
+            merged = merge_intervals(busy)
+            busy_ends = [end for _, end in merged]
+            barber_slots: Dict[date, Dict[int, List[datetime]]] = {}
+
+            for day, (window_start, window_end) in windows:
+                gaps = free_intervals(merged, window_start, window_end, busy_ends)
+                barber_slots[day] = {
+                    duration: slot_starts(gaps, duration, self.step_minutes, window_start)
+                    for duration in durations
+                }
+
+            results[barber_id] = barber_slots
+        return results
+
+    def is_free(self, busy: Iterable[Interval], start: datetime, end: datetime) -> bool:
+        """Check whether [start, end) overlaps no busy interval"""
+        merged = merge_intervals(busy)
+        start, end = to_naive_utc(start), to_naive_utc(end)
+        i = bisect_left([busy_end for _, busy_end in merged], start)
+        # Touching intervals (busy_end == start) do not conflict
+        while i < len(merged) and merged[i][1] <= start:
+            i += 1
+        return i == len(merged) or merged[i][0] >= end
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Calendar Busy-Time Mirror
+Keeps a local per-barber copy of busy intervals current with Google Calendar
+incremental sync tokens, so availability queries are answered locally within
+a bounded staleness instead of a live events().list round trip per query
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from calendar_availability import Interval, event_interval, merge_intervals, to_naive_utc
+
+logger = logging.getLogger(__name__)
+
+# Returns (service, calendar_id) for a barber, or (None, None) without calendar access
+ClientProvider = Callable[[int], Tuple[Any, Optional[str]]]
+
+
+def _is_sync_token_expired(error: Exception) -> bool:
+    """Google answers 410 Gone when a sync token is no longer valid"""
+    resp = getattr(error, 'resp', None)
+    return getattr(resp, 'status', None) == 410
+
+
+def _parse_busy_interval(event: Dict) -> Optional[Interval]:
+    """Busy interval for an opaque, non-cancelled event; all-day events block whole days"""
+    if event.get('status') == 'cancelled' or event.get('transparency') == 'transparent':
+        return None
+    return event_interval(event)
+
+
+def _build_index(intervals) -> Tuple[List[Interval], List[datetime], List[datetime]]:
+    """Merged intervals with their start and end lists; merged intervals are disjoint, so both are sorted"""
+    merged = merge_intervals(intervals)
+    return merged, [start for start, _ in merged], [end for _, end in merged]
+
+
+class CalendarBusyMirror:
+    """
+    Local busy-interval store per barber, synced incrementally from Google Calendar
+
+    Queries sync inline only when a barber's copy is older than
+    `staleness_seconds`; a background poller and push-notification hook keep
+    copies fresh so that is the exception rather than the rule.
+
+    Only events ending within the last `history_days` are kept (None keeps
+    everything): full syncs ask for nothing older, and every sync prunes
+    intervals that have aged out.
+    """
+
+    def __init__(self, client_provider: ClientProvider, db_path: str = 'booking_system.db',
+                 staleness_seconds: float = 60.0, poll_interval: float = 30.0,
+                 history_days: Optional[float] = 7.0):
+        self.client_provider = client_provider
+        self.db_path = db_path
+        self.staleness_seconds = staleness_seconds
+        self.poll_interval = poll_interval
+        self.history_days = history_days
+
+        self._events: Dict[int, Dict[str, Interval]] = {}
+        # (merged, starts, ends) per barber, rebuilt once per published copy
+        self._index: Dict[int, Tuple[List[Interval], List[datetime], List[datetime]]] = {}
+        self._sync_tokens: Dict[int, Optional[str]] = {}
+        self._last_synced: Dict[int, float] = {}
+        self._no_calendar: set = set()
+        self._barber_locks: Dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+        self._tracked_barbers: set = set()
+        self._wakeup = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+        self._polling = False
+
+        self._ensure_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+
+    def _ensure_schema(self):
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS calendar_busy_intervals (
+                    barber_id INTEGER NOT NULL,
+                    event_id TEXT NOT NULL,
+                    start_utc TEXT NOT NULL,
+                    end_utc TEXT NOT NULL,
+                    PRIMARY KEY (barber_id, event_id)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS calendar_mirror_state (
+                    barber_id INTEGER PRIMARY KEY,
+                    sync_token TEXT,
+                    last_synced_at REAL
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _lock_for(self, barber_id: int) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._barber_locks.get(barber_id)
+            if lock is None:
+                lock = self._barber_locks[barber_id] = threading.Lock()
+            return lock
+
+    def _load_barber(self, barber_id: int):
+        """Warm the in-memory copy from the persisted mirror"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT event_id, start_utc, end_utc FROM calendar_busy_intervals WHERE barber_id = ?",
+                (barber_id,)
+            ).fetchall()
+            state = conn.execute(
+                "SELECT sync_token, last_synced_at FROM calendar_mirror_state WHERE barber_id = ?",
+                (barber_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+
+        self._events[barber_id] = {
+            event_id: (datetime.fromisoformat(start), datetime.fromisoformat(end))
+            for event_id, start, end in rows
+        }
+        self._index[barber_id] = _build_index(self._events[barber_id].values())
+        self._sync_tokens[barber_id] = state[0] if state else None
+        self._last_synced[barber_id] = state[1] if state and state[1] else 0.0
+
+    def sync_barber(self, barber_id: int) -> int:
+        """
+        Pull changes since the last sync token and apply them; returns changes applied
+
+        Falls back to a full resync when Google reports the token as expired.
+        """
+        with self._lock_for(barber_id):
+            if barber_id not in self._events:
+                self._load_barber(barber_id)
+
+            service, calendar_id = self.client_provider(barber_id)
+            if not service:
+                self._no_calendar.add(barber_id)
+                return 0
+            self._no_calendar.discard(barber_id)
+
+            sync_token = self._sync_tokens.get(barber_id)
+            try:
+                changes, next_token = self._list_changes(service, calendar_id, sync_token)
+                full_sync = sync_token is None
+            except Exception as e:
+                if not _is_sync_token_expired(e):
+                    raise
+                logger.info(f"Sync token expired for barber {barber_id}, running full resync")
+                changes, next_token = self._list_changes(service, calendar_id, None)
+                full_sync = True
+
+            self._apply_changes(barber_id, changes, next_token, full_sync)
+            return len(changes)
+
+    def _history_cutoff(self) -> Optional[datetime]:
+        """Events ending before this are dropped from the mirror"""
+        if self.history_days is None:
+            return None
+        return (datetime.utcnow() - timedelta(days=self.history_days)).replace(microsecond=0)
+
+    def _list_changes(self, service, calendar_id: str, sync_token: Optional[str]):
+        """All pages of events changed since sync_token (everything within the history window when None)"""
+        changes = []
+        page_token = None
+        cutoff = self._history_cutoff()
+        while True:
+            params = {'calendarId': calendar_id, 'singleEvents': True, 'showDeleted': True,
+                      'maxResults': 250}
+            if sync_token:
+                params['syncToken'] = sync_token
+            elif cutoff:
+                # Google rejects timeMin alongside a sync token, so only full syncs are bounded
+                params['timeMin'] = cutoff.isoformat() + 'Z'
+            if page_token:
+                params['pageToken'] = page_token
+
+            result = service.events().list(**params).execute()
+            changes.extend(result.get('items', []))
+
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                return changes, result.get('nextSyncToken')
+
+    def _apply_changes(self, barber_id: int, changes: List[Dict], next_token: Optional[str],
+                       full_sync: bool):
+        cutoff = self._history_cutoff()
+        events = {} if full_sync else dict(self._events.get(barber_id, {}))
+        if cutoff:
+            events = {event_id: interval for event_id, interval in events.items() if interval[1] > cutoff}
+        upserts, deletes = [], []
+        for event in changes:
+            event_id = event['id']
+            interval = _parse_busy_interval(event)
+            if interval and cutoff and interval[1] <= cutoff:
+                interval = None  # Aged out of the history window
+            if interval:
+                events[event_id] = interval
+                upserts.append((barber_id, event_id, interval[0].isoformat(), interval[1].isoformat()))
+            elif event_id in events or not full_sync:
+                events.pop(event_id, None)
+                deletes.append((barber_id, event_id))
+
+        synced_at = time.time()
+        conn = self._connect()
+        try:
+            if full_sync:
+                conn.execute("DELETE FROM calendar_busy_intervals WHERE barber_id = ?", (barber_id,))
+            elif cutoff:
+                conn.execute("DELETE FROM calendar_busy_intervals WHERE barber_id = ? AND end_utc <= ?",
+                             (barber_id, cutoff.isoformat()))
+            if deletes:
+                conn.executemany(
+                    "DELETE FROM calendar_busy_intervals WHERE barber_id = ? AND event_id = ?", deletes
+                )
+            if upserts:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO calendar_busy_intervals (barber_id, event_id, start_utc, end_utc) "
+                    "VALUES (?, ?, ?, ?)", upserts
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO calendar_mirror_state (barber_id, sync_token, last_synced_at) "
+                "VALUES (?, ?, ?)", (barber_id, next_token, synced_at)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        # Publish the new copy by rebinding, so readers never see a partial update
+        self._events[barber_id] = events
+        self._index[barber_id] = _build_index(events.values())
+        self._sync_tokens[barber_id] = next_token
+        self._last_synced[barber_id] = synced_at
+
+    def is_fresh(self, barber_id: int) -> bool:
+        """Check if the barber's copy is within the staleness bound"""
+        return time.time() - self._last_synced.get(barber_id, 0.0) <= self.staleness_seconds
+
+    def get_busy_periods(self, barber_id: int, range_start: datetime,
+                         range_end: datetime) -> Optional[List[Interval]]:
+        """
+        Merged busy intervals overlapping [range_start, range_end)
+
+        Returns None when the barber has no calendar access.
+        """
+        self._tracked_barbers.add(barber_id)
+        if barber_id not in self._events:
+            with self._lock_for(barber_id):
+                if barber_id not in self._events:
+                    self._load_barber(barber_id)
+        if not self.is_fresh(barber_id):
+            self.sync_barber(barber_id)
+        if barber_id in self._no_calendar:
+            return None
+
+        merged, starts, ends = self._index.get(barber_id, ([], [], []))
+        range_start, range_end = to_naive_utc(range_start), to_naive_utc(range_end)
+        first = bisect_right(ends, range_start)
+        last = bisect_left(starts, range_end)
+        return merged[first:last]
+
+    def mark_stale(self, barber_id: int):
+        """Force the next query (or poll) to sync this barber"""
+        self._last_synced[barber_id] = 0.0
+        self._wakeup.set()
+
+    def handle_push_notification(self, barber_id: int, resource_state: str = 'exists'):
+        """
+        Hook for Calendar push notifications (events().watch channels)
+
+        'sync' is the channel handshake; any other state means events changed.
+        """
+        if resource_state == 'sync':
+            return
+        self._tracked_barbers.add(barber_id)
+        self.mark_stale(barber_id)
+
+    def start_polling(self, barber_ids: Optional[List[int]] = None):
+        """Start background polling for tracked barbers"""
+        if barber_ids:
+            self._tracked_barbers.update(barber_ids)
+        if self._polling:
+            return
+        self._polling = True
+        self._poller = threading.Thread(target=self._poll_loop, daemon=True)
+        self._poller.start()
+        logger.info("📅 Calendar busy mirror polling started")
+
+    def stop_polling(self):
+        """Stop background polling"""
+        self._polling = False
+        self._wakeup.set()
+        if self._poller:
+            self._poller.join(timeout=5)
+
+    def _poll_loop(self):
+        while self._polling:
+            for barber_id in list(self._tracked_barbers):
+                if not self._polling:
+                    break
+                # Poll a little ahead of the staleness bound so queries rarely sync inline
+                if time.time() - self._last_synced.get(barber_id, 0.0) >= self.poll_interval:
+                    try:
+                        self.sync_barber(barber_id)
+                    except Exception as e:
+                        logger.error(f"Calendar mirror sync failed for barber {barber_id}: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+class FakeHttpError(Exception):
+    """Stand-in for googleapiclient HttpError carrying an HTTP status"""
+
+    def __init__(self, status: int, reason: str = ''):
+        super().__init__(f"HTTP {status}: {reason}")
+        self.resp = type('Response', (), {'status': status})()
+
+
+class _FakeRequest:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self):
+        return self._fn()
+
+
+class FakeCalendarService:
+    """
+    In-memory stand-in for the Calendar v3 client, supporting events().list with
+    timeMin/timeMax, syncToken incremental sync, paging and deleted events
+
+    Usage:
+        fake = FakeCalendarService()
+        fake.add_event('evt1', datetime(2025, 1, 6, 10), datetime(2025, 1, 6, 11))
+        mirror = CalendarBusyMirror(lambda barber_id: (fake, 'primary'), db_path=tmp_db)
+    """
+
+    def __init__(self, page_size: int = 250):
+        self.page_size = page_size
+        self._events: Dict[str, Dict] = {}
+        self._changed_at: Dict[str, int] = {}
+        self._sequence = 0
+        self._min_valid_token = 0
+        self.list_calls = 0
+
+    def _touch(self, event_id: str):
+        self._sequence += 1
+        self._changed_at[event_id] = self._sequence
+
+    def add_event(self, event_id: str, start: datetime, end: datetime, **fields):
+        self._events[event_id] = {
+            'id': event_id,
+            'status': 'confirmed',
+            'start': {'dateTime': start.isoformat() + ('Z' if start.tzinfo is None else '')},
+            'end': {'dateTime': end.isoformat() + ('Z' if end.tzinfo is None else '')},
+            **fields
+        }
+        self._touch(event_id)
+
+    update_event = add_event
+
+    def add_all_day_event(self, event_id: str, first_day, last_day, **fields):
+        self._events[event_id] = {
+            'id': event_id,
+            'status': 'confirmed',
+            'start': {'date': first_day.isoformat()},
+            'end': {'date': (last_day + timedelta(days=1)).isoformat()},
+            **fields
+        }
+        self._touch(event_id)
+
+    def delete_event(self, event_id: str):
+        if event_id in self._events:
+            self._events[event_id]['status'] = 'cancelled'
+            self._touch(event_id)
+
+    def expire_sync_tokens(self):
+        """Make every issued sync token invalid (next incremental sync gets 410)"""
+        self._min_valid_token = self._sequence + 1
+
+    def events(self):
+        return self
+
+    def list(self, calendarId: str = 'primary', syncToken: str = None, pageToken: str = None,
+             timeMin: str = None, timeMax: str = None, showDeleted: bool = False,
+             maxResults: int = None, **kwargs):
+        return _FakeRequest(lambda: self._list(syncToken, pageToken, timeMin, timeMax,
+                                               showDeleted, min(maxResults or self.page_size, self.page_size)))
+
+    def _list(self, sync_token, page_token, time_min, time_max, show_deleted, page_size):
+        self.list_calls += 1
+        if sync_token is not None and int(sync_token) < self._min_valid_token:
+            raise FakeHttpError(410, 'Sync token is no longer valid')
+
+        since = int(sync_token) if sync_token is not None else 0
+        items = []
+        for event_id, event in self._events.items():
+            if self._changed_at[event_id] <= since:
+                continue
+            cancelled = event['status'] == 'cancelled'
+            if cancelled and not (show_deleted or sync_token is not None):
+                continue
+            if time_min or time_max:
+                start = event['start'].get('dateTime') or event['start']['date']
+                end = event['end'].get('dateTime') or event['end']['date']
+                if (time_max and start >= time_max) or (time_min and end <= time_min):
+                    continue
+            items.append(event)
+        items.sort(key=lambda event: self._changed_at[event['id']])
+
+        offset = int(page_token) if page_token else 0
+        page = items[offset:offset + page_size]
+        result = {'items': page}
+        if offset + page_size < len(items):
+            result['nextPageToken'] = str(offset + page_size)
+        else:
+            result['nextSyncToken'] = str(self._sequence)
+        return result
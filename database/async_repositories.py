@@ -13,6 +13,7 @@ import json
 import logging
 import aiosqlite
 from .async_connection_pool import get_database_connection, execute_query, execute_transaction
+from services.auth_cache import auth_cache
 
 logger = logging.getLogger(__name__)
 
@@ -151,12 +152,19 @@ class AsyncUserRepository(AsyncRepository):
         parameters.append(user_id)
         query = f"UPDATE users SET {', '.join(set_clauses)} WHERE id = ?"
         
-        return await self._execute_with_result(query, tuple(parameters))
+        result = await self._execute_with_result(query, tuple(parameters))
+        if result.success and ('is_active' in updates or 'hashed_password' in updates):
+            # Cached sessions skip the is_active lookup until they expire
+            auth_cache.invalidate_user(user_id)
+        return result
     
     async def delete_user(self, user_id: int) -> DatabaseResult:
         """Soft delete user (set is_active to False)"""
         query = "UPDATE users SET is_active = FALSE WHERE id = ?"
-        return await self._execute_with_result(query, (user_id,))
+        result = await self._execute_with_result(query, (user_id,))
+        if result.success:
+            auth_cache.invalidate_user(user_id)
+        return result
     
     async def get_all_active_users(self) -> DatabaseResult:
         """Get all active users"""
@@ -11,9 +11,7 @@ from fastapi import FastAPI, HTTPException, Depends, status, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
-from middleware.rate_limiting import RateLimitMiddleware
-from middleware.security_headers import SecurityHeadersMiddleware, SecurityReportingMiddleware
-from middleware.input_validation import InputValidationMiddleware
+from middleware.request_pipeline import RequestPipelineMiddleware
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 import asyncio
@@ -39,6 +37,8 @@ from services.memory_manager import (
     register_oauth_session,
     cleanup_oauth_session
 )
+from services.auth_cache import auth_cache, REVOKED
+from services.request_metrics import BoundedLabelSet, SlowRequestSampler, resolve_route_template
 
 # Import shop management router and service
 try:
@@ -183,7 +183,8 @@ except ImportError as e:
 # Removed: print(f"⚠️ PHASE 3: Supabase API proxy not available: {e}")
 
 # Import Prometheus metrics
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Histogram, Gauge, REGISTRY
+from prometheus_client.exposition import choose_encoder
 from fastapi.responses import Response
 import time
 
@@ -264,127 +265,40 @@ if sentry_service.initialized:
 else:
     pass  # Sentry not configured
 
-# 🧠 CRITICAL: Memory management middleware to fix OAuth callback loops
-@app.middleware("http")
-async def memory_management_middleware(request, call_next):
-    """Production-grade memory management to prevent OAuth callback failures"""
-    # Check if this is an authentication-related request
-    is_auth_request = any(path in request.url.path for path in [
-        '/auth', '/oauth', '/login', '/signup', '/callback'
-    ])
-    
-    # OAuth callback performance tracking with Sentry
-    transaction = None
-    oauth_timer = None
-    if is_auth_request and ('/oauth' in request.url.path or '/callback' in request.url.path):
-        oauth_timer = time.time()
-        # Start Sentry transaction for OAuth flow
-        if sentry_service.initialized:
-            transaction = sentry_service.start_transaction(
-                name=f"oauth.{request.method.lower()}.{request.url.path}",
-                op="http.server"
-            )
-            if transaction:
-                transaction.set_tag("oauth.flow", "callback")
-                transaction.set_data("url", str(request.url))
-    
-    # Use memory-limited operation for auth requests
-    if is_auth_request:
-        with memory_limited_oauth_operation():
-            response = await call_next(request)
-            
-            # Force garbage collection after auth operations
-            if memory_manager.is_memory_pressure():
-                gc.collect()
-            
-            # Complete OAuth performance tracking
-            if oauth_timer:
-                oauth_duration = time.time() - oauth_timer
-                
-                # Complete Sentry transaction
-                if transaction:
-                    transaction.set_data("duration_ms", oauth_duration * 1000)
-                    transaction.set_tag("performance.slow", oauth_duration > 2.0)
-                    transaction.finish()
-                
-                if oauth_duration > 2.0:  # Alert if OAuth takes more than 2 seconds
-# Removed: print(f"⚠️ Slow OAuth callback: {oauth_duration:.2f}s")
-                    # Report to Sentry
-                    if sentry_service.initialized:
-                        sentry_service.capture_message(
-                            f"Slow OAuth callback detected: {oauth_duration:.2f}s",
-                            level="warning",
-                            context={
-                                "duration_seconds": oauth_duration,
-                                "url": str(request.url),
-                                "memory_pressure": memory_manager.get_memory_pressure()
-                            }
-                        )
-            
-            return response
-    else:
-        # Regular request processing
-        response = await call_next(request)
-        return response
-
-# Metrics middleware to track all requests
-@app.middleware("http")
-async def track_metrics(request, call_next):
-    """Track HTTP metrics for Prometheus monitoring with memory stats"""
-    start_time = time.time()
-    
-    # Get memory stats before request
-    memory_stats = get_memory_stats()
-    
-    # Process request
-    response = await call_next(request)
-    
-    # Calculate duration
-    duration = time.time() - start_time
-    
-    # Track metrics
-    endpoint = request.url.path
-    method = request.method
-    status = response.status_code
+# Request metrics recorded by the composed middleware pipeline
+def record_request_metrics(scope, status_code: int, duration: float):
+    """Track HTTP metrics for Prometheus monitoring, labelled by route template"""
+    method = scope["method"]
+    route = resolve_route_template(scope)
+    endpoint = request_metric_labels.admit(route)
     
     http_requests_total.labels(
         method=method,
         endpoint=endpoint,
-        status=status
+        status=status_code
     ).inc()
     
+    # Slow requests keep their raw path as an exemplar instead of a label
+    exemplar = slow_request_sampler.sample(route, method, scope["path"], status_code, duration)
     http_request_duration_seconds.labels(
         method=method,
         endpoint=endpoint
-    ).observe(duration)
-    
-    # Log memory pressure warnings for auth endpoints
-    if endpoint.startswith('/auth') or endpoint.startswith('/api/auth'):
-        if memory_stats.memory_pressure > 0.8:
-            pass  # Removed: print(f"⚠️ High memory pressure during auth request: {memory_stats.memory_pressure:.1%}")
-    
-    return response
-
-# 🛡️ SECURITY HEADERS MIDDLEWARE (PRODUCTION READY)
-app.add_middleware(
-    SecurityHeadersMiddleware,
-    environment=os.getenv('NODE_ENV', 'development')
-)
+    ).observe(duration, exemplar=exemplar)
 
-# 🛡️ SECURITY REPORTING MIDDLEWARE 
-app.add_middleware(SecurityReportingMiddleware)
+def observe_middleware_stage(stage: str, duration: float):
+    """Track per-stage middleware overhead"""
+    http_middleware_stage_seconds.labels(stage=stage).observe(duration)
 
-# 🛡️ INPUT VALIDATION MIDDLEWARE - Protects against injection attacks
+# 🛡️ Composed pure-ASGI pipeline: rate limiting, input validation, security reports,
+# security headers, request metrics and OAuth memory management in a single layer
 app.add_middleware(
-    InputValidationMiddleware,
-    max_content_length=10 * 1024 * 1024  # 10MB limit
-)
-
-# Rate limiting middleware (before CORS) - now fixed with proper BaseHTTPMiddleware
-app.add_middleware(
-    RateLimitMiddleware,
+    RequestPipelineMiddleware,
+    environment=os.getenv('NODE_ENV', 'development'),
     redis_client=None,  # Using in-memory fallback
-    enabled=True
+    rate_limit_enabled=True,
+    max_content_length=10 * 1024 * 1024,  # 10MB limit
+    metrics_callback=record_request_metrics,
+    stage_observer=observe_middleware_stage
 )
 
 # CORS configuration
@@ -483,6 +397,21 @@ http_request_duration_seconds = Histogram(
     ['method', 'endpoint']
 )
 
+# Bound request metric cardinality: route templates only, capped label sets
+request_metric_labels = BoundedLabelSet(
+    max_label_sets=int(os.getenv('METRICS_MAX_LABEL_SETS', '500'))
+)
+slow_request_sampler = SlowRequestSampler(
+    threshold_seconds=float(os.getenv('METRICS_SLOW_REQUEST_SECONDS', '1.0'))
+)
+
+http_middleware_stage_seconds = Histogram(
+    'http_middleware_stage_seconds',
+    'Time spent in each request pipeline middleware stage',
+    ['stage'],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+)
+
 ai_request_duration_seconds = Histogram(
     'ai_request_duration_seconds',
     'AI request processing duration in seconds',
@@ -685,6 +614,16 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
                 detail="Invalid token payload"
             )
         
+        # Serve repeat requests from the auth cache (keyed by jti) before touching the database
+        cached = auth_cache.get(jti)
+        if cached is REVOKED:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked or expired"
+            )
+        if cached is not None and cached["id"] == user_id:
+            return cached
+        
         # Check if token is revoked (check session table)
         with get_db() as conn:
             cursor = conn.execute(
@@ -694,6 +633,7 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             session = cursor.fetchone()
             
             if not session or session["user_id"] != user_id:
+                auth_cache.set_revoked(jti, user_id)
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Token has been revoked or expired"
@@ -712,12 +652,14 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
                     detail="User not found or inactive"
                 )
         
-        return {
+        current_user = {
             "id": user["id"],
             "email": user["email"],
             "shop_name": user["shop_name"],
             "is_active": user["is_active"]
         }
+        auth_cache.set(jti, current_user, token_exp=payload.get("exp"))
+        return current_user
         
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -898,12 +840,14 @@ async def health():
             "process_memory_mb": round(memory_stats.process_memory, 2),
             "memory_pressure": round(memory_stats.memory_pressure, 3),
             "memory_pressure_percent": f"{memory_stats.memory_pressure:.1%}",
+            "pressure_state": memory_manager.pressure_state,
             "status": "critical" if memory_stats.memory_pressure > 0.95 else 
                      "high" if memory_stats.memory_pressure > 0.85 else 
                      "normal"
         },
         "oauth_sessions": len(memory_manager.oauth_sessions),
-        "monitoring_active": memory_manager.monitoring_active
+        "monitoring_active": memory_manager.monitoring_active,
+        "auth_cache": auth_cache.get_stats()
     }
 
 @app.get("/phase2-test")
@@ -953,17 +897,27 @@ async def phase2_test():
         }
 
 @app.get("/metrics")
-async def metrics():
-    """Prometheus metrics endpoint"""
+async def metrics(request: Request):
+    """Prometheus metrics endpoint (OpenMetrics, with exemplars, when the scraper asks for it)"""
     # Update database connection metrics
     stats = get_pool_stats()
     database_connections_active.set(getattr(stats, 'active_connections', 0))
     database_connections_idle.set(getattr(stats, 'idle_connections', 0))
     database_connections_max.set(getattr(stats, 'max_connections', 0))
     
-    # Generate Prometheus metrics
-    metrics_data = generate_latest()
-    return Response(content=metrics_data, media_type=CONTENT_TYPE_LATEST)
+    # Exemplars are only part of the OpenMetrics format; plain text scrapers get the classic format
+    encoder, content_type = choose_encoder(request.headers.get("accept"))
+    return Response(content=encoder(REGISTRY), media_type=content_type)
+
+@app.get("/metrics/slow-requests")
+async def slow_requests():
+    """Recent slow requests per route template, matching histogram exemplar trace ids"""
+    return {
+        "threshold_seconds": slow_request_sampler.threshold_seconds,
+        "label_sets": len(request_metric_labels),
+        "overflowed_requests": request_metric_labels.overflowed,
+        "samples": slow_request_sampler.get_samples()
+    }
 
 # Authentication endpoints
 @app.post("/api/v1/auth/register", response_model=TokenResponse)
@@ -1042,10 +996,21 @@ async def login(user: UserLogin):
         }
     }
 
+def revoke_session(jti: str, user_id: int = 0):
+    """Revoke a single session and drop it from the auth cache"""
+    with get_db() as conn:
+        conn.execute("DELETE FROM sessions WHERE token = ?", (jti,))
+        conn.commit()
+    auth_cache.revoke(jti, user_id)
+
 @app.post("/api/v1/auth/logout")
-async def logout(current_user: dict = Depends(get_current_user)):
-    """Logout user"""
-    # In a real app, invalidate the token
+async def logout(
+    current_user: dict = Depends(get_current_user),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Logout user and revoke the access token's session"""
+    payload = jwt.decode(credentials.credentials, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    revoke_session(payload["jti"], current_user["id"])
     return {"message": "Logged out successfully"}
 
 @app.get("/api/v1/auth/me")
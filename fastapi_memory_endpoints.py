@@ -98,8 +98,8 @@ async def force_memory_cleanup(request: MemoryCleanupRequest):
             memory_manager.cleanup_connection_pools()
             cleanup_results["connection_pools_cleaned"] = "completed"
         
-        # Get updated memory stats
-        updated_stats = get_memory_stats()
+        # Sample now; the background snapshot still predates the cleanup
+        updated_stats = memory_manager.refresh_memory_stats()
         
         return {
             "success": True,
@@ -12,13 +12,17 @@ from googleapiclient.errors import HttpError
 import sqlite3
 import json
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Sequence
 import os
+import threading
+
+from calendar_availability import AvailabilityEngine, Interval, event_interval, to_naive_utc
+from calendar_busy_mirror import CalendarBusyMirror
 
 class GoogleCalendarService:
     """Google Calendar integration service for barbershop booking system"""
     
-    def __init__(self):
+    def __init__(self, use_busy_mirror: Optional[bool] = None):
         self.scopes = ['https://www.googleapis.com/auth/calendar']
         # In production, store these securely
         self.client_config = {
@@ -30,6 +34,36 @@ class GoogleCalendarService:
                 "redirect_uris": ["http://localhost:8002/api/v1/auth/google/callback"]
             }
         }
+        
+        # Built API clients are cached per barber and per thread (the httplib2
+        # transport under each client is not thread-safe, and the mirror poller
+        # runs on its own thread); building one per call dominated availability
+        # checks. Bumping a barber's generation drops their clients on every thread.
+        self._thread_clients = threading.local()
+        self._client_generation: Dict[int, int] = {}
+        self._calendar_id_cache: Dict[int, str] = {}
+        self._cache_lock = threading.Lock()
+        self.availability_engine = AvailabilityEngine()
+        
+        # Local busy-time mirror kept current with incremental sync tokens
+        if use_busy_mirror is None:
+            use_busy_mirror = os.getenv("GOOGLE_CALENDAR_MIRROR_ENABLED", "false").lower() == "true"
+        self.busy_mirror: Optional[CalendarBusyMirror] = None
+        if use_busy_mirror:
+            self.enable_busy_mirror()
+    
+    def enable_busy_mirror(self, staleness_seconds: float = None, poll_interval: float = None,
+                           start_polling: bool = True) -> CalendarBusyMirror:
+        """Answer availability queries from a local busy-time mirror instead of live API calls"""
+        self.busy_mirror = CalendarBusyMirror(
+            self._get_calendar_client,
+            staleness_seconds=staleness_seconds or float(os.getenv("GOOGLE_CALENDAR_MIRROR_STALENESS", "60")),
+            poll_interval=poll_interval or float(os.getenv("GOOGLE_CALENDAR_MIRROR_POLL_INTERVAL", "30")),
+            history_days=float(os.getenv("GOOGLE_CALENDAR_MIRROR_HISTORY_DAYS", "7"))
+        )
+        if start_polling:
+            self.busy_mirror.start_polling()
+        return self.busy_mirror
     
     def get_authorization_url(self, barber_id: int) -> str:
         """Generate Google OAuth authorization URL for barber"""
@@ -87,6 +121,9 @@ class GoogleCalendarService:
             conn.commit()
             conn.close()
             
+            self.invalidate_barber_cache(barber_id)
+            if self.busy_mirror:
+                self.busy_mirror.mark_stale(barber_id)
             return True
             
         except Exception as e:
@@ -148,21 +185,102 @@ class GoogleCalendarService:
         conn.commit()
         conn.close()
     
-    def create_calendar_event(self, barber_id: int, appointment_data: Dict[str, Any]) -> Optional[str]:
-        """Create appointment event in barber's Google Calendar"""
+    def invalidate_barber_cache(self, barber_id: int):
+        """Drop the cached API client and calendar id for a barber (reconnect, revoke)"""
+        with self._cache_lock:
+            self._client_generation[barber_id] = self._client_generation.get(barber_id, 0) + 1
+            self._calendar_id_cache.pop(barber_id, None)
+    
+    def _get_calendar_id(self, barber_id: int) -> Optional[str]:
+        """Google calendar id for barber, cached after the first lookup"""
+        calendar_id = self._calendar_id_cache.get(barber_id)
+        if calendar_id is None:
+            conn = sqlite3.connect('booking_system.db')
+            cursor = conn.cursor()
+            cursor.execute("SELECT google_calendar_id FROM calendar_sync WHERE barber_id = ?", (barber_id,))
+            row = cursor.fetchone()
+            conn.close()
+            if not row:
+                return None
+            calendar_id = row[0]
+            with self._cache_lock:
+                self._calendar_id_cache[barber_id] = calendar_id
+        return calendar_id
+    
+    def _get_calendar_client(self, barber_id: int):
+        """
+        Return (service, calendar_id) for a barber, or (None, None) without calendar access
+        
+        The calling thread's client and its credentials are reused until the
+        access token expires; only then are credentials reloaded (and
+        refreshed) from storage. A barber with no calendar id has no access.
+        """
+        calendar_id = self._get_calendar_id(barber_id)
+        if not calendar_id:
+            return None, None
+        
+        clients = getattr(self._thread_clients, 'clients', None)
+        if clients is None:
+            clients = self._thread_clients.clients = {}
+        generation = self._client_generation.get(barber_id, 0)
+        cached = clients.get(barber_id)
+        if cached and cached[0] == generation and not cached[1].expired:
+            return cached[2], calendar_id
+        
         credentials = self.get_barber_credentials(barber_id)
         if not credentials:
+            return None, None
+        
+        service = build('calendar', 'v3', credentials=credentials, cache_discovery=False)
+        clients[barber_id] = (generation, credentials, service)
+        return service, calendar_id
+    
+    def _fetch_busy_periods(self, barber_id: int, range_start: datetime, range_end: datetime) -> Optional[List[Interval]]:
+        """
+        Busy (start, end) intervals from the barber's calendar for a time range
+        
+        All-day events are busy for their whole days, as they were when any
+        event in the range blocked a booking. Returns None when the barber has
+        no calendar access.
+        """
+        if self.busy_mirror:
+            try:
+                return self.busy_mirror.get_busy_periods(barber_id, range_start, range_end)
+            except Exception as e:
+                print(f"Busy mirror unavailable for barber {barber_id}, querying live: {e}")
+        
+        service, calendar_id = self._get_calendar_client(barber_id)
+        if not service:
             return None
         
-        try:
-            service = build('calendar', 'v3', credentials=credentials)
+        busy_periods = []
+        page_token = None
+        while True:
+            events_result = service.events().list(
+                calendarId=calendar_id,
+                timeMin=to_naive_utc(range_start).isoformat() + 'Z',
+                timeMax=to_naive_utc(range_end).isoformat() + 'Z',
+                singleEvents=True,
+                orderBy='startTime',
+                pageToken=page_token
+            ).execute()
             
-            # Get calendar ID for barber
-            conn = sqlite3.connect('booking_system.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT google_calendar_id FROM calendar_sync WHERE barber_id = ?", (barber_id,))
-            calendar_id = cursor.fetchone()[0]
-            conn.close()
+            for event in events_result.get('items', []):
+                interval = event_interval(event)
+                if interval:
+                    busy_periods.append(interval)
+            
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                return busy_periods
+    
+    def create_calendar_event(self, barber_id: int, appointment_data: Dict[str, Any]) -> Optional[str]:
+        """Create appointment event in barber's Google Calendar"""
+        service, calendar_id = self._get_calendar_client(barber_id)
+        if not service:
+            return None
+        
+        try:
             
             # Create event
             start_time = appointment_data['appointment_datetime']
@@ -192,6 +310,8 @@ class GoogleCalendarService:
             }
             
             created_event = service.events().insert(calendarId=calendar_id, body=event).execute()
+            if self.busy_mirror:
+                self.busy_mirror.mark_stale(barber_id)
             return created_event['id']
             
         except HttpError as error:
@@ -200,19 +320,11 @@ class GoogleCalendarService:
     
     def update_calendar_event(self, barber_id: int, event_id: str, appointment_data: Dict[str, Any]) -> bool:
         """Update existing calendar event"""
-        credentials = self.get_barber_credentials(barber_id)
-        if not credentials:
+        service, calendar_id = self._get_calendar_client(barber_id)
+        if not service:
             return False
         
         try:
-            service = build('calendar', 'v3', credentials=credentials)
-            
-            # Get calendar ID
-            conn = sqlite3.connect('booking_system.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT google_calendar_id FROM calendar_sync WHERE barber_id = ?", (barber_id,))
-            calendar_id = cursor.fetchone()[0]
-            conn.close()
             
             # Get existing event
             event = service.events().get(calendarId=calendar_id, eventId=event_id).execute()
@@ -233,6 +345,8 @@ class GoogleCalendarService:
             }
             
             updated_event = service.events().update(calendarId=calendar_id, eventId=event_id, body=event).execute()
+            if self.busy_mirror:
+                self.busy_mirror.mark_stale(barber_id)
             return True
             
         except HttpError as error:
@@ -241,21 +355,15 @@ class GoogleCalendarService:
     
     def delete_calendar_event(self, barber_id: int, event_id: str) -> bool:
         """Delete calendar event"""
-        credentials = self.get_barber_credentials(barber_id)
-        if not credentials:
+        service, calendar_id = self._get_calendar_client(barber_id)
+        if not service:
             return False
         
         try:
-            service = build('calendar', 'v3', credentials=credentials)
-            
-            # Get calendar ID
-            conn = sqlite3.connect('booking_system.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT google_calendar_id FROM calendar_sync WHERE barber_id = ?", (barber_id,))
-            calendar_id = cursor.fetchone()[0]
-            conn.close()
             
             service.events().delete(calendarId=calendar_id, eventId=event_id).execute()
+            if self.busy_mirror:
+                self.busy_mirror.mark_stale(barber_id)
             return True
             
         except HttpError as error:
@@ -264,35 +372,14 @@ class GoogleCalendarService:
     
     def check_availability(self, barber_id: int, start_time: datetime, duration: int) -> bool:
         """Check if barber is available at specified time"""
-        credentials = self.get_barber_credentials(barber_id)
-        if not credentials:
-            return True  # If no calendar access, assume available
-        
         try:
-            service = build('calendar', 'v3', credentials=credentials)
-            
-            # Get calendar ID
-            conn = sqlite3.connect('booking_system.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT google_calendar_id FROM calendar_sync WHERE barber_id = ?", (barber_id,))
-            calendar_id = cursor.fetchone()[0]
-            conn.close()
-            
             end_time = start_time + timedelta(minutes=duration)
-            
-            # Check for conflicts
-            events_result = service.events().list(
-                calendarId=calendar_id,
-                timeMin=start_time.isoformat() + 'Z',
-                timeMax=end_time.isoformat() + 'Z',
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            events = events_result.get('items', [])
+            busy_periods = self._fetch_busy_periods(barber_id, start_time, end_time)
+            if busy_periods is None:
+                return True  # If no calendar access, assume available
             
             # If any events exist in this time range, not available
-            return len(events) == 0
+            return len(busy_periods) == 0
             
         except HttpError as error:
             print(f"Availability check error: {error}")
@@ -300,71 +387,37 @@ class GoogleCalendarService:
     
     def get_available_slots(self, barber_id: int, date: datetime, service_duration: int) -> List[datetime]:
         """Get available time slots for a specific date"""
-        credentials = self.get_barber_credentials(barber_id)
-        if not credentials:
-            return []
+        slots = self.get_available_slots_bulk([barber_id], date, days=1, durations=[service_duration])
+        return slots.get(barber_id, {}).get(date.date(), {}).get(service_duration, [])
+    
+    def get_available_slots_bulk(self, barber_ids: Sequence[int], start_date: datetime, days: int = 7,
+                                 durations: Sequence[int] = (30,)) -> Dict[int, Dict[Any, Dict[int, List[datetime]]]]:
+        """
+        Available slots for several barbers, days and service durations in one computation
         
-        try:
-            service = build('calendar', 'v3', credentials=credentials)
-            
-            # Get calendar ID
-            conn = sqlite3.connect('booking_system.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT google_calendar_id FROM calendar_sync WHERE barber_id = ?", (barber_id,))
-            calendar_id = cursor.fetchone()[0]
-            conn.close()
-            
-            # Get business hours (default 9 AM - 6 PM)
-            start_hour = 9
-            end_hour = 18
-            
-            # Get existing events for the day
-            day_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-            day_end = day_start + timedelta(days=1)
-            
-            events_result = service.events().list(
-                calendarId=calendar_id,
-                timeMin=day_start.isoformat() + 'Z',
-                timeMax=day_end.isoformat() + 'Z',
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            events = events_result.get('items', [])
-            
-            # Convert events to busy periods
-            busy_periods = []
-            for event in events:
-                if 'dateTime' in event['start'] and 'dateTime' in event['end']:
-                    start = datetime.fromisoformat(event['start']['dateTime'].replace('Z', '+00:00'))
-                    end = datetime.fromisoformat(event['end']['dateTime'].replace('Z', '+00:00'))
-                    busy_periods.append((start, end))
-            
-            # Generate available slots
-            available_slots = []
-            current_time = date.replace(hour=start_hour, minute=0)
-            business_end = date.replace(hour=end_hour, minute=0)
-            
-            while current_time + timedelta(minutes=service_duration) <= business_end:
-                slot_end = current_time + timedelta(minutes=service_duration)
-                
-                # Check if this slot conflicts with any busy period
-                is_available = True
-                for busy_start, busy_end in busy_periods:
-                    if (current_time < busy_end and slot_end > busy_start):
-                        is_available = False
-                        break
-                
-                if is_available:
-                    available_slots.append(current_time)
-                
-                current_time += timedelta(minutes=15)  # 15-minute intervals
-            
-            return available_slots
-            
-        except HttpError as error:
-            print(f"Available slots error: {error}")
-            return []
+        Returns {barber_id: {date: {duration_minutes: [slot_start, ...]}}}. Each barber's
+        calendar is read once for the whole range; barbers without calendar access
+        have no slots.
+        """
+        first_day = start_date.date() if isinstance(start_date, datetime) else start_date
+        day_list = [first_day + timedelta(days=offset) for offset in range(days)]
+        range_start = datetime(first_day.year, first_day.month, first_day.day)
+        range_end = range_start + timedelta(days=days)
+        
+        busy_by_barber = {}
+        for barber_id in barber_ids:
+            try:
+                busy_periods = self._fetch_busy_periods(barber_id, range_start, range_end)
+            except HttpError as error:
+                print(f"Available slots error: {error}")
+                busy_periods = None
+            if busy_periods is not None:
+                busy_by_barber[barber_id] = busy_periods
+        
+        slots = self.availability_engine.compute_slots(busy_by_barber, day_list, list(durations))
+        for barber_id in barber_ids:
+            slots.setdefault(barber_id, {day: {duration: [] for duration in durations} for day in day_list})
+        return slots
     
     def sync_appointment_to_calendar(self, appointment_id: int) -> bool:
         """Sync a booking system appointment to Google Calendar"""
@@ -4,14 +4,20 @@ Intelligent Waitlist Management System
 FIFO queue with smart notifications and automatic processing
 """
 
+import os
 import sqlite3
 import json
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
 from enum import Enum
 import asyncio
 import uuid
 from dataclasses import dataclass
+from services.database_connection_pool import DatabaseConnectionPool, PoolStrategy, write_transaction
+
+# barber_key used in waitlist_slots for "any available barber" entries
+ANY_BARBER = 0
 
 class WaitlistStatus(str, Enum):
     ACTIVE = "active"
@@ -25,6 +31,18 @@ class NotificationMethod(str, Enum):
     EMAIL = "email"
     PUSH = "push"
 
+# Position of waitlist row `w` in its slot's queue: 1 + active entries that joined
+# earlier (ties broken by id). Derived on read, so removals never rewrite rows.
+QUEUE_POSITION_SQL = f"""
+    (SELECT COUNT(*) + 1 FROM waitlist ahead
+     WHERE ahead.service_id = w.service_id AND ahead.location_id = w.location_id
+           AND ahead.preferred_datetime = w.preferred_datetime
+           AND ahead.status = '{WaitlistStatus.ACTIVE.value}'
+           AND ahead.barber_id IS w.barber_id
+           AND (ahead.created_at < w.created_at
+                OR (ahead.created_at = w.created_at AND ahead.id < w.id)))
+"""
+
 @dataclass
 class WaitlistEntry:
     """Waitlist entry data structure"""
@@ -53,10 +71,128 @@ class WaitlistNotification:
 class IntelligentWaitlistManager:
     """Manages intelligent waitlist with FIFO ordering and smart notifications"""
     
-    def __init__(self):
-        self.db_path = 'booking_system.db'
+    def __init__(self, db_path: str = 'booking_system.db'):
+        self.db_path = db_path
         self.notification_window = 15  # minutes to respond to notification
         self.max_alternatives = 3  # maximum alternative time slots
+        self.slot_bucket_minutes = 15  # matching granularity, same grid as the booking calendar
+        self._pool: Optional[DatabaseConnectionPool] = None
+        self._pool_lock = threading.Lock()
+    
+    @property
+    def pool(self) -> DatabaseConnectionPool:
+        """
+        Connection pool for booking_system.db reads, opened on first use
+        
+        Pooled connections are shared between threads, so writes go through
+        _transaction() instead.
+        """
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    pool = DatabaseConnectionPool(
+                        database_path=os.path.abspath(self.db_path),
+                        max_connections=5,
+                        strategy=PoolStrategy.ROUND_ROBIN
+                    )
+                    self._ensure_schema(pool)
+                    self._pool = pool
+        return self._pool
+    
+    def _ensure_schema(self, pool: DatabaseConnectionPool):
+        """
+        Create the waitlist indexes and backfill the slot matching index
+        
+        waitlist_slots holds one row per (entry, time bucket) for the preferred
+        and alternative datetimes of every active entry, so a freed slot is
+        matched with a single index seek instead of scanning JSON blobs.
+        idx_waitlist_queue orders each slot's queue by join time, and
+        idx_waitlist_open_request lets adds detect duplicates with an upsert.
+        """
+        with pool.get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS waitlist_slots (
+                    waitlist_id INTEGER NOT NULL,
+                    barber_key INTEGER NOT NULL,
+                    service_id INTEGER NOT NULL,
+                    location_id INTEGER NOT NULL,
+                    slot_bucket TEXT NOT NULL,
+                    slot_datetime TEXT NOT NULL,
+                    created_at TEXT,
+                    PRIMARY KEY (waitlist_id, slot_bucket)
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_waitlist_slots_match
+                ON waitlist_slots(barber_key, service_id, location_id, slot_bucket, created_at, waitlist_id)
+            """)
+            
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(waitlist)")}
+            if columns:
+                # Slot actually offered, which may be one of the alternatives
+                if 'offered_datetime' not in columns:
+                    conn.execute("ALTER TABLE waitlist ADD COLUMN offered_datetime TEXT")
+                
+                conn.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_waitlist_queue
+                    ON waitlist(service_id, location_id, preferred_datetime, status, barber_id, created_at)
+                """)
+                try:
+                    conn.execute(f"""
+                        CREATE UNIQUE INDEX IF NOT EXISTS idx_waitlist_open_request
+                        ON waitlist(customer_id, service_id, location_id, preferred_datetime,
+                                    COALESCE(barber_id, {ANY_BARBER}))
+                        WHERE status IN ('{WaitlistStatus.ACTIVE.value}', '{WaitlistStatus.NOTIFIED.value}')
+                    """)
+                except sqlite3.IntegrityError as e:
+                    print(f"Duplicate open waitlist requests exist, duplicate adds will not be rejected: {str(e)}")
+                
+                rows = conn.execute("""
+                    SELECT w.id, w.barber_id, w.service_id, w.location_id,
+                           w.preferred_datetime, w.alternative_datetimes
+                    FROM waitlist w
+                    WHERE w.status = ? AND NOT EXISTS (
+                        SELECT 1 FROM waitlist_slots ws WHERE ws.waitlist_id = w.id
+                    )
+                """, (WaitlistStatus.ACTIVE.value,)).fetchall()
+                
+                for row in rows:
+                    alternatives = [datetime.fromisoformat(dt) for dt in json.loads(row[5] or '[]')]
+                    self._index_waitlist_slots(
+                        conn, row[0], row[1], row[2], row[3],
+                        datetime.fromisoformat(row[4]), alternatives
+                    )
+            
+            conn.commit()
+    
+    def _transaction(self):
+        """Exclusive BEGIN IMMEDIATE transaction on its own connection"""
+        self.pool  # Schema and slot index are set up on first use
+        return write_transaction(os.path.abspath(self.db_path))
+    
+    def _slot_bucket(self, slot: datetime) -> str:
+        """Floor a datetime to the matching grid"""
+        slot = slot.replace(second=0, microsecond=0)
+        return slot.replace(minute=slot.minute - slot.minute % self.slot_bucket_minutes).isoformat()
+    
+    def _index_waitlist_slots(self, conn: sqlite3.Connection, waitlist_id: int,
+                              barber_id: Optional[int], service_id: int, location_id: int,
+                              preferred_datetime: datetime, alternative_datetimes: List[datetime]):
+        """Add the preferred and alternative slots of an entry to the matching index"""
+        slots = [preferred_datetime] + list(alternative_datetimes)[:self.max_alternatives]
+        conn.executemany("""
+            INSERT OR IGNORE INTO waitlist_slots
+            (waitlist_id, barber_key, service_id, location_id, slot_bucket, slot_datetime, created_at)
+            SELECT ?, ?, ?, ?, ?, ?, created_at FROM waitlist WHERE id = ?
+        """, [
+            (waitlist_id, barber_id or ANY_BARBER, service_id, location_id,
+             self._slot_bucket(slot), slot.isoformat(), waitlist_id)
+            for slot in slots
+        ])
+    
+    def _unindex_waitlist_slots(self, conn: sqlite3.Connection, waitlist_id: int):
+        """Remove an entry from the matching index once it leaves the active state"""
+        conn.execute("DELETE FROM waitlist_slots WHERE waitlist_id = ?", (waitlist_id,))
     
     def add_to_waitlist(self, 
                        customer_id: int,
@@ -67,122 +203,144 @@ class IntelligentWaitlistManager:
                        alternative_datetimes: Optional[List[datetime]] = None) -> Dict[str, Any]:
         """Add customer to waitlist for specific slot"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        return self.add_to_waitlist_batch([{
+            'customer_id': customer_id,
+            'barber_id': barber_id,
+            'service_id': service_id,
+            'location_id': location_id,
+            'preferred_datetime': preferred_datetime,
+            'alternative_datetimes': alternative_datetimes
+        }])[0]
+    
+    def add_to_waitlist_batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Add several waitlist requests in one transaction
+        
+        Each request takes the add_to_waitlist arguments as keys; results are
+        returned in the same order.
+        """
         
         try:
-            # Check if customer is already on waitlist for this slot
-            existing_entry = self._get_existing_waitlist_entry(
-                customer_id, barber_id, service_id, location_id, preferred_datetime
-            )
-            
-            if existing_entry:
-                return {
-                    'success': False,
-                    'message': 'You are already on the waitlist for this slot',
-                    'queue_position': existing_entry['queue_position']
-                }
-            
-            # Get next queue position
-            queue_position = self._get_next_queue_position(
-                barber_id, service_id, location_id, preferred_datetime
-            )
-            
-            # Convert alternative datetimes to JSON
-            alternatives_json = json.dumps([
-                dt.isoformat() for dt in (alternative_datetimes or [])
-            ])
-            
-            # Insert waitlist entry
-            cursor.execute("""
-                INSERT INTO waitlist 
-                (customer_id, barber_id, service_id, location_id, preferred_datetime,
-                 alternative_datetimes, status, queue_position, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (customer_id, barber_id, service_id, location_id, 
-                  preferred_datetime.isoformat(), alternatives_json, 
-                  WaitlistStatus.ACTIVE.value, queue_position))
-            
-            waitlist_id = cursor.lastrowid
-            conn.commit()
-            
-            # Get customer and service details for response
-            customer_info = self._get_customer_info(customer_id)
-            service_info = self._get_service_info(service_id)
-            barber_info = self._get_barber_info(barber_id) if barber_id else None
-            
-            formatted_datetime = preferred_datetime.strftime("%A, %B %d at %I:%M %p")
-            barber_text = f" with {barber_info['display_name']}" if barber_info else ""
-            
+            with self._transaction() as conn:
+                return [self._insert_waitlist_entry(conn, **request) for request in requests]
+        except Exception as e:
+            return [{
+                'success': False,
+                'message': f'Error adding to waitlist: {str(e)}'
+            } for _ in requests]
+    
+    def _insert_waitlist_entry(self, conn: sqlite3.Connection, customer_id: int,
+                               barber_id: Optional[int], service_id: int, location_id: int,
+                               preferred_datetime: datetime,
+                               alternative_datetimes: Optional[List[datetime]] = None) -> Dict[str, Any]:
+        """Insert one entry inside the caller's transaction"""
+        
+        details = self._get_request_details(conn, customer_id, service_id, barber_id)
+        if not details:
             return {
-                'success': True,
-                'waitlist_id': waitlist_id,
-                'queue_position': queue_position,
-                'message': f"Added to waitlist for {service_info['name']}{barber_text} on {formatted_datetime}. You're #{queue_position} in line.",
-                'estimated_wait_time': self._estimate_wait_time(queue_position),
-                'notification_method': customer_info.get('preferred_contact', 'sms')
+                'success': False,
+                'message': f'Error adding to waitlist: service {service_id} not found'
             }
-            
-        except Exception as e:
-            conn.rollback()
+        
+        # Convert alternative datetimes to JSON
+        alternatives_json = json.dumps([
+            dt.isoformat() for dt in (alternative_datetimes or [])
+        ])
+        
+        # Insert unless the customer already has an open request for this slot
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO waitlist 
+            (customer_id, barber_id, service_id, location_id, preferred_datetime,
+             alternative_datetimes, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT DO NOTHING
+        """, (customer_id, barber_id, service_id, location_id, 
+              preferred_datetime.isoformat(), alternatives_json, 
+              WaitlistStatus.ACTIVE.value))
+        inserted = cursor.rowcount > 0
+        waitlist_id = cursor.lastrowid
+        cursor.close()
+        
+        if not inserted:
+            existing_entry = self._get_existing_waitlist_entry(
+                conn, customer_id, barber_id, service_id, location_id, preferred_datetime
+            )
             return {
                 'success': False,
-                'message': f'Error adding to waitlist: {str(e)}'
+                'message': 'You are already on the waitlist for this slot',
+                'queue_position': existing_entry['queue_position'] if existing_entry else None
             }
-        finally:
-            conn.close()
+        
+        self._index_waitlist_slots(
+            conn, waitlist_id, barber_id, service_id, location_id,
+            preferred_datetime, alternative_datetimes or []
+        )
+        queue_position = self._get_queue_position(conn, waitlist_id)
+        
+        formatted_datetime = preferred_datetime.strftime("%A, %B %d at %I:%M %p")
+        barber_text = f" with {details['barber_name']}" if details['barber_name'] else ""
+        method = NotificationMethod.SMS if details['phone'] else NotificationMethod.EMAIL
+        
+        return {
+            'success': True,
+            'waitlist_id': waitlist_id,
+            'queue_position': queue_position,
+            'message': f"Added to waitlist for {details['service_name']}{barber_text} on {formatted_datetime}. You're #{queue_position} in line.",
+            'estimated_wait_time': self._estimate_wait_time(queue_position),
+            'notification_method': method.value
+        }
     
     def remove_from_waitlist(self, waitlist_id: int, customer_id: int) -> Dict[str, Any]:
         """Remove customer from waitlist"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        return self.remove_from_waitlist_batch([(waitlist_id, customer_id)])[0]
+    
+    def remove_from_waitlist_batch(self, entries: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+        """
+        Remove several (waitlist_id, customer_id) entries in one transaction
+        
+        Queue positions are derived from join order, so removals do not
+        touch the entries behind them.
+        """
+        
+        results = []
         
         try:
-            # Verify ownership and get current entry
-            cursor.execute("""
-                SELECT queue_position, barber_id, service_id, location_id, preferred_datetime
-                FROM waitlist
-                WHERE id = ? AND customer_id = ? AND status = ?
-            """, (waitlist_id, customer_id, WaitlistStatus.ACTIVE.value))
-            
-            entry = cursor.fetchone()
-            if not entry:
-                return {
-                    'success': False,
-                    'message': 'Waitlist entry not found or already processed'
-                }
-            
-            queue_position, barber_id, service_id, location_id, preferred_datetime = entry
-            preferred_dt = datetime.fromisoformat(preferred_datetime)
-            
-            # Remove from waitlist
-            cursor.execute("""
-                UPDATE waitlist 
-                SET status = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (WaitlistStatus.CANCELLED.value, waitlist_id))
-            
-            # Update queue positions for others
-            self._update_queue_positions_after_removal(
-                barber_id, service_id, location_id, preferred_dt, queue_position
-            )
-            
-            conn.commit()
-            
-            return {
-                'success': True,
-                'message': 'Successfully removed from waitlist'
-            }
-            
+            with self._transaction() as conn:
+                cursor = conn.cursor()
+                removed_ids = []
+                for waitlist_id, customer_id in entries:
+                    # Ownership and state are checked by the update itself
+                    cursor.execute("""
+                        UPDATE waitlist 
+                        SET status = ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ? AND customer_id = ? AND status = ?
+                    """, (WaitlistStatus.CANCELLED.value, waitlist_id, customer_id,
+                          WaitlistStatus.ACTIVE.value))
+                    
+                    if cursor.rowcount:
+                        removed_ids.append((waitlist_id,))
+                        results.append({
+                            'success': True,
+                            'message': 'Successfully removed from waitlist'
+                        })
+                    else:
+                        results.append({
+                            'success': False,
+                            'message': 'Waitlist entry not found or already processed'
+                        })
+                
+                cursor.executemany("DELETE FROM waitlist_slots WHERE waitlist_id = ?", removed_ids)
+                cursor.close()
+                
         except Exception as e:
-            conn.rollback()
-            return {
+            return [{
                 'success': False,
                 'message': f'Error removing from waitlist: {str(e)}'
-            }
-        finally:
-            conn.close()
+            } for _ in entries]
+        
+        return results
     
     def check_slot_availability_and_notify(self, 
                                          barber_id: Optional[int],
@@ -191,29 +349,53 @@ class IntelligentWaitlistManager:
                                          datetime_slot: datetime) -> List[WaitlistNotification]:
         """Check if slot became available and notify waitlist customers"""
         
+        with self._transaction() as conn:
+            return self._notify_next_in_line(
+                conn, barber_id, service_id, location_id, datetime_slot
+            )
+    
+    def on_appointment_cancelled(self, appointment: Dict[str, Any]) -> List[WaitlistNotification]:
+        """
+        Cancellation event hook: offer the freed slot to the first matching entry
+        
+        Expects the cancelled appointment's barber_id, service_id, location_id
+        and appointment_datetime (datetime or ISO string).
+        """
+        slot = appointment['appointment_datetime']
+        if isinstance(slot, str):
+            slot = datetime.fromisoformat(slot)
+        
+        return self.check_slot_availability_and_notify(
+            appointment.get('barber_id'),
+            appointment['service_id'],
+            appointment['location_id'],
+            slot
+        )
+    
+    def _notify_next_in_line(self, conn: sqlite3.Connection, barber_id: Optional[int],
+                             service_id: int, location_id: int,
+                             datetime_slot: datetime) -> List[WaitlistNotification]:
+        """Offer a slot to the longest-waiting matching entry (caller commits)"""
+        
         notifications = []
         
-        # Find all waitlist entries for this slot
+        # Longest-waiting active entry whose preferred or alternative slot matches (FIFO)
         waitlist_entries = self._get_waitlist_entries_for_slot(
-            barber_id, service_id, location_id, datetime_slot
+            conn, barber_id, service_id, location_id, datetime_slot, limit=1
         )
         
         if not waitlist_entries:
             return notifications
         
-        # Sort by queue position (FIFO)
-        waitlist_entries.sort(key=lambda x: x.queue_position)
-        
-        # Notify the first person in queue
         first_entry = waitlist_entries[0]
         
         if first_entry.status == WaitlistStatus.ACTIVE:
-            notification = self._create_slot_available_notification(first_entry, datetime_slot)
+            notification = self._create_slot_available_notification(conn, first_entry, datetime_slot)
             if notification:
                 notifications.append(notification)
                 
                 # Update entry status and set expiration
-                self._mark_waitlist_entry_notified(first_entry.id)
+                self._mark_waitlist_entry_notified(conn, first_entry.id, datetime_slot)
         
         return notifications
     
@@ -222,58 +404,70 @@ class IntelligentWaitlistManager:
         
         notifications = []
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            # Find expired notifications
-            cursor.execute("""
-                SELECT id, customer_id, barber_id, service_id, location_id, 
-                       preferred_datetime, queue_position
-                FROM waitlist
-                WHERE status = ? AND expires_at < CURRENT_TIMESTAMP
-            """, (WaitlistStatus.NOTIFIED.value,))
-            
-            expired_entries = cursor.fetchall()
-            
-            for entry in expired_entries:
-                (waitlist_id, customer_id, barber_id, service_id, 
-                 location_id, preferred_datetime, queue_position) = entry
+            # Expiring an offer and passing the slot on commit together, so a slot
+            # is never left expired without being offered to the next entry
+            with self._transaction() as conn:
+                cursor = conn.cursor()
                 
-                # Mark as expired
+                # Find expired notifications (expires_at is stored as a local ISO timestamp)
                 cursor.execute("""
-                    UPDATE waitlist 
-                    SET status = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                """, (WaitlistStatus.EXPIRED.value, waitlist_id))
+                    SELECT id, customer_id, barber_id, service_id, location_id, 
+                           COALESCE(offered_datetime, preferred_datetime)
+                    FROM waitlist
+                    WHERE status = ? AND expires_at < ?
+                """, (WaitlistStatus.NOTIFIED.value, datetime.now().isoformat()))
+                
+                expired_entries = cursor.fetchall()
+                
+                for entry in expired_entries:
+                    (waitlist_id, customer_id, barber_id, service_id, 
+                     location_id, offered_datetime) = entry
+                    
+                    # Mark as expired
+                    cursor.execute("""
+                        UPDATE waitlist 
+                        SET status = ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    """, (WaitlistStatus.EXPIRED.value, waitlist_id))
+                    
+                    # Offer the same slot to the next person in line
+                    offered_dt = datetime.fromisoformat(offered_datetime)
+                    next_notifications = self._notify_next_in_line(
+                        conn, barber_id, service_id, location_id, offered_dt
+                    )
+                    notifications.extend(next_notifications)
                 
-                # Find next person in queue for the same slot
-                preferred_dt = datetime.fromisoformat(preferred_datetime)
-                next_notifications = self.check_slot_availability_and_notify(
-                    barber_id, service_id, location_id, preferred_dt
-                )
-                notifications.extend(next_notifications)
-            
-            conn.commit()
-            
         except Exception as e:
-            conn.rollback()
             print(f"Error processing expired notifications: {str(e)}")
-        finally:
-            conn.close()
+            return []
         
         return notifications
     
     def book_from_waitlist(self, waitlist_id: int, customer_id: int) -> Dict[str, Any]:
         """Process booking from waitlist notification"""
         
-        conn = sqlite3.connect(self.db_path)
+        try:
+            # The status check, appointment insert and status change commit together;
+            # BEGIN IMMEDIATE keeps two bookings of the same offer from both passing the check
+            with self._transaction() as conn:
+                return self._book_from_waitlist(conn, waitlist_id, customer_id)
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error booking from waitlist: {str(e)}'
+            }
+    
+    def _book_from_waitlist(self, conn: sqlite3.Connection, waitlist_id: int,
+                            customer_id: int) -> Dict[str, Any]:
+        """Book an offered slot inside the caller's transaction"""
         cursor = conn.cursor()
         
         try:
             # Verify waitlist entry is valid and notified
             cursor.execute("""
-                SELECT barber_id, service_id, location_id, preferred_datetime, expires_at
+                SELECT barber_id, service_id, location_id,
+                       COALESCE(offered_datetime, preferred_datetime), expires_at
                 FROM waitlist
                 WHERE id = ? AND customer_id = ? AND status = ?
             """, (waitlist_id, customer_id, WaitlistStatus.NOTIFIED.value))
@@ -285,7 +479,7 @@ class IntelligentWaitlistManager:
                     'message': 'Invalid waitlist entry or notification expired'
                 }
             
-            barber_id, service_id, location_id, preferred_datetime, expires_at = entry
+            barber_id, service_id, location_id, offered_datetime, expires_at = entry
             
             # Check if notification hasn't expired
             if expires_at and datetime.fromisoformat(expires_at) < datetime.now():
@@ -300,12 +494,12 @@ class IntelligentWaitlistManager:
                 'barber_id': barber_id,
                 'service_id': service_id,
                 'location_id': location_id,
-                'appointment_datetime': datetime.fromisoformat(preferred_datetime)
+                'appointment_datetime': datetime.fromisoformat(offered_datetime)
             }
             
             # Here you would call the main booking system to create the appointment
             # For now, we'll simulate success
-            appointment_created = self._create_appointment_from_waitlist(appointment_data)
+            appointment_created = self._create_appointment_from_waitlist(conn, appointment_data)
             
             if appointment_created:
                 # Mark waitlist entry as booked
@@ -315,8 +509,6 @@ class IntelligentWaitlistManager:
                     WHERE id = ?
                 """, (WaitlistStatus.BOOKED.value, waitlist_id))
                 
-                conn.commit()
-                
                 return {
                     'success': True,
                     'message': 'Appointment successfully booked!',
@@ -328,36 +520,29 @@ class IntelligentWaitlistManager:
                     'message': 'Slot no longer available'
                 }
         
-        except Exception as e:
-            conn.rollback()
-            return {
-                'success': False,
-                'message': f'Error booking from waitlist: {str(e)}'
-            }
         finally:
-            conn.close()
+            cursor.close()
     
     def get_customer_waitlist_status(self, customer_id: int) -> List[Dict[str, Any]]:
         """Get all active waitlist entries for a customer"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT w.id, w.barber_id, w.service_id, w.location_id, w.preferred_datetime,
-                   w.alternative_datetimes, w.status, w.queue_position, w.notification_sent_at,
-                   w.expires_at, w.created_at,
-                   s.name as service_name, b.display_name as barber_name, l.name as location_name
-            FROM waitlist w
-            JOIN services s ON w.service_id = s.id
-            LEFT JOIN barbers b ON w.barber_id = b.id
-            JOIN locations l ON w.location_id = l.id
-            WHERE w.customer_id = ? AND w.status IN (?, ?)
-            ORDER BY w.created_at DESC
-        """, (customer_id, WaitlistStatus.ACTIVE.value, WaitlistStatus.NOTIFIED.value))
-        
-        rows = cursor.fetchall()
-        conn.close()
+        with self.pool.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT w.id, w.barber_id, w.service_id, w.location_id, w.preferred_datetime,
+                       w.alternative_datetimes, w.status, {QUEUE_POSITION_SQL}, w.notification_sent_at,
+                       w.expires_at, w.created_at,
+                       s.name as service_name, b.display_name as barber_name, l.name as location_name
+                FROM waitlist w
+                JOIN services s ON w.service_id = s.id
+                LEFT JOIN barbers b ON w.barber_id = b.id
+                JOIN locations l ON w.location_id = l.id
+                WHERE w.customer_id = ? AND w.status IN (?, ?)
+                ORDER BY w.created_at DESC
+            """, (customer_id, WaitlistStatus.ACTIVE.value, WaitlistStatus.NOTIFIED.value))
+            
+            rows = cursor.fetchall()
+            cursor.close()
         
         waitlist_entries = []
         for row in rows:
@@ -384,7 +569,11 @@ class IntelligentWaitlistManager:
     def get_waitlist_analytics(self, location_id: Optional[int] = None) -> Dict[str, Any]:
         """Get waitlist analytics for business intelligence"""
         
-        conn = sqlite3.connect(self.db_path)
+        with self.pool.get_connection() as conn:
+            return self._get_waitlist_analytics(conn, location_id)
+    
+    def _get_waitlist_analytics(self, conn: sqlite3.Connection,
+                                location_id: Optional[int]) -> Dict[str, Any]:
         cursor = conn.cursor()
         
         # Base query conditions
@@ -440,8 +629,7 @@ class IntelligentWaitlistManager:
             ORDER BY waitlist_requests DESC
         """, params)
         service_demand = cursor.fetchall()
-        
-        conn.close()
+        cursor.close()
         
         return {
             'total_waitlist_entries': total_entries,
@@ -466,26 +654,24 @@ class IntelligentWaitlistManager:
     
     # Helper methods
     
-    def _get_existing_waitlist_entry(self, customer_id: int, barber_id: Optional[int], 
-                                   service_id: int, location_id: int, 
+    def _get_existing_waitlist_entry(self, conn: sqlite3.Connection, customer_id: int,
+                                   barber_id: Optional[int], service_id: int, location_id: int, 
                                    preferred_datetime: datetime) -> Optional[Dict[str, Any]]:
         """Check if customer already has waitlist entry for this slot"""
         
-        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, queue_position, status
-            FROM waitlist
-            WHERE customer_id = ? AND barber_id = ? AND service_id = ? 
-                  AND location_id = ? AND preferred_datetime = ?
-                  AND status IN (?, ?)
+        cursor.execute(f"""
+            SELECT w.id, {QUEUE_POSITION_SQL}, w.status
+            FROM waitlist w
+            WHERE w.customer_id = ? AND w.barber_id IS ? AND w.service_id = ? 
+                  AND w.location_id = ? AND w.preferred_datetime = ?
+                  AND w.status IN (?, ?)
         """, (customer_id, barber_id, service_id, location_id, 
               preferred_datetime.isoformat(),
               WaitlistStatus.ACTIVE.value, WaitlistStatus.NOTIFIED.value))
         
         row = cursor.fetchone()
-        conn.close()
+        cursor.close()
         
         if row:
             return {
@@ -495,67 +681,43 @@ class IntelligentWaitlistManager:
             }
         return None
     
-    def _get_next_queue_position(self, barber_id: Optional[int], service_id: int,
-                               location_id: int, preferred_datetime: datetime) -> int:
-        """Get next queue position for this slot"""
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT MAX(queue_position)
-            FROM waitlist
-            WHERE barber_id = ? AND service_id = ? AND location_id = ?
-                  AND preferred_datetime = ? AND status = ?
-        """, (barber_id, service_id, location_id, 
-              preferred_datetime.isoformat(), WaitlistStatus.ACTIVE.value))
+    def _get_queue_position(self, conn: sqlite3.Connection, waitlist_id: int) -> int:
+        """Current queue position of an entry for its preferred slot"""
         
-        max_position = cursor.fetchone()[0]
-        conn.close()
-        
-        return (max_position or 0) + 1
+        row = conn.execute(f"""
+            SELECT {QUEUE_POSITION_SQL} FROM waitlist w WHERE w.id = ?
+        """, (waitlist_id,)).fetchone()
+        return row[0] if row else 0
     
-    def _update_queue_positions_after_removal(self, barber_id: Optional[int], service_id: int,
-                                            location_id: int, preferred_datetime: datetime,
-                                            removed_position: int):
-        """Update queue positions after someone leaves"""
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _get_waitlist_entries_for_slot(self, conn: sqlite3.Connection, barber_id: Optional[int],
+                                     service_id: int, location_id: int, datetime_slot: datetime,
+                                     limit: Optional[int] = None) -> List[WaitlistEntry]:
+        """
+        Active entries matching a slot, longest-waiting first
         
-        cursor.execute("""
-            UPDATE waitlist
-            SET queue_position = queue_position - 1,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE barber_id = ? AND service_id = ? AND location_id = ?
-                  AND preferred_datetime = ? AND queue_position > ?
-                  AND status = ?
-        """, (barber_id, service_id, location_id,
-              preferred_datetime.isoformat(), removed_position,
-              WaitlistStatus.ACTIVE.value))
+        Looks up waitlist_slots, so alternative datetimes match as well as the
+        preferred one. Entries for "any available barber" match every barber.
+        """
         
-        conn.commit()
-        conn.close()
-    
-    def _get_waitlist_entries_for_slot(self, barber_id: Optional[int], service_id: int,
-                                     location_id: int, datetime_slot: datetime) -> List[WaitlistEntry]:
-        """Get all waitlist entries for a specific slot"""
+        barber_keys = (barber_id, ANY_BARBER) if barber_id else (ANY_BARBER,)
+        placeholders = ','.join(['?' for _ in barber_keys])
         
-        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, customer_id, barber_id, service_id, location_id,
-                   preferred_datetime, alternative_datetimes, status, queue_position,
-                   notification_sent_at, expires_at, created_at
-            FROM waitlist
-            WHERE barber_id = ? AND service_id = ? AND location_id = ?
-                  AND preferred_datetime = ? AND status = ?
-        """, (barber_id, service_id, location_id, 
-              datetime_slot.isoformat(), WaitlistStatus.ACTIVE.value))
+        cursor.execute(f"""
+            SELECT w.id, w.customer_id, w.barber_id, w.service_id, w.location_id,
+                   w.preferred_datetime, w.alternative_datetimes, w.status, {QUEUE_POSITION_SQL},
+                   w.notification_sent_at, w.expires_at, w.created_at
+            FROM waitlist_slots ws
+            JOIN waitlist w ON w.id = ws.waitlist_id
+            WHERE ws.barber_key IN ({placeholders}) AND ws.service_id = ? AND ws.location_id = ?
+                  AND ws.slot_bucket = ? AND w.status = ?
+            ORDER BY ws.created_at, ws.waitlist_id
+            LIMIT ?
+        """, (*barber_keys, service_id, location_id, self._slot_bucket(datetime_slot),
+              WaitlistStatus.ACTIVE.value, -1 if limit is None else limit))
         
         rows = cursor.fetchall()
-        conn.close()
+        cursor.close()
         
         entries = []
         for row in rows:
@@ -581,14 +743,14 @@ class IntelligentWaitlistManager:
         
         return entries
     
-    def _create_slot_available_notification(self, waitlist_entry: WaitlistEntry, 
+    def _create_slot_available_notification(self, conn: sqlite3.Connection, waitlist_entry: WaitlistEntry, 
                                           available_slot: datetime) -> Optional[WaitlistNotification]:
         """Create notification for available slot"""
         
         # Get customer, service, and barber info
-        customer_info = self._get_customer_info(waitlist_entry.customer_id)
-        service_info = self._get_service_info(waitlist_entry.service_id)
-        barber_info = self._get_barber_info(waitlist_entry.barber_id) if waitlist_entry.barber_id else None
+        customer_info = self._get_customer_info(conn, waitlist_entry.customer_id)
+        service_info = self._get_service_info(conn, waitlist_entry.service_id)
+        barber_info = self._get_barber_info(conn, waitlist_entry.barber_id) if waitlist_entry.barber_id else None
         
         if not customer_info or not service_info:
             return None
@@ -616,10 +778,10 @@ class IntelligentWaitlistManager:
             expires_at=expires_at
         )
     
-    def _mark_waitlist_entry_notified(self, waitlist_id: int):
-        """Mark waitlist entry as notified"""
+    def _mark_waitlist_entry_notified(self, conn: sqlite3.Connection, waitlist_id: int,
+                                      offered_slot: datetime):
+        """Mark waitlist entry as notified for the offered slot (caller commits)"""
         
-        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         expires_at = datetime.now() + timedelta(minutes=self.notification_window)
@@ -627,20 +789,21 @@ class IntelligentWaitlistManager:
         cursor.execute("""
             UPDATE waitlist
             SET status = ?, notification_sent_at = CURRENT_TIMESTAMP,
-                expires_at = ?, updated_at = CURRENT_TIMESTAMP
+                expires_at = ?, offered_datetime = ?, updated_at = CURRENT_TIMESTAMP
             WHERE id = ?
-        """, (WaitlistStatus.NOTIFIED.value, expires_at.isoformat(), waitlist_id))
+        """, (WaitlistStatus.NOTIFIED.value, expires_at.isoformat(),
+              offered_slot.isoformat(), waitlist_id))
+        cursor.close()
         
-        conn.commit()
-        conn.close()
+        self._unindex_waitlist_slots(conn, waitlist_id)
     
-    def _create_appointment_from_waitlist(self, appointment_data: Dict[str, Any]) -> Optional[int]:
+    def _create_appointment_from_waitlist(self, conn: sqlite3.Connection,
+                                          appointment_data: Dict[str, Any]) -> Optional[int]:
         """Create appointment from waitlist (placeholder - integrate with main booking system)"""
         
         # This would integrate with the main appointment creation system
         # For now, we'll simulate creating an appointment
         
-        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -665,27 +828,43 @@ class IntelligentWaitlistManager:
                   appointment_data['appointment_datetime'].isoformat(),
                   base_duration, base_price))
             
-            appointment_id = cursor.lastrowid
-            conn.commit()
-            
-            return appointment_id
+            # Committed together with the waitlist status change by the caller
+            return cursor.lastrowid
             
         except Exception as e:
-            conn.rollback()
+            # A failed INSERT writes nothing; the caller's transaction is left intact
             print(f"Error creating appointment from waitlist: {str(e)}")
             return None
         finally:
-            conn.close()
+            cursor.close()
     
-    def _get_customer_info(self, customer_id: int) -> Optional[Dict[str, Any]]:
+    def _get_request_details(self, conn: sqlite3.Connection, customer_id: int, service_id: int,
+                             barber_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Service, barber and customer contact details for a waitlist request in one query"""
+        
+        row = conn.execute("""
+            SELECT s.name, b.display_name, u.phone
+            FROM services s
+            LEFT JOIN barbers b ON b.id = ?
+            LEFT JOIN users u ON u.id = ?
+            WHERE s.id = ?
+        """, (barber_id, customer_id, service_id)).fetchone()
+        
+        if row:
+            return {
+                'service_name': row[0],
+                'barber_name': row[1],
+                'phone': row[2]
+            }
+        return None
+    
+    def _get_customer_info(self, conn: sqlite3.Connection, customer_id: int) -> Optional[Dict[str, Any]]:
         """Get customer information"""
         
-        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        
         cursor.execute("SELECT full_name, email, phone FROM users WHERE id = ?", (customer_id,))
         row = cursor.fetchone()
-        conn.close()
+        cursor.close()
         
         if row:
             return {
@@ -695,15 +874,13 @@ class IntelligentWaitlistManager:
             }
         return None
     
-    def _get_service_info(self, service_id: int) -> Optional[Dict[str, Any]]:
+    def _get_service_info(self, conn: sqlite3.Connection, service_id: int) -> Optional[Dict[str, Any]]:
         """Get service information"""
         
-        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        
         cursor.execute("SELECT name, base_price, base_duration FROM services WHERE id = ?", (service_id,))
         row = cursor.fetchone()
-        conn.close()
+        cursor.close()
         
         if row:
             return {
@@ -713,15 +890,13 @@ class IntelligentWaitlistManager:
             }
         return None
     
-    def _get_barber_info(self, barber_id: int) -> Optional[Dict[str, Any]]:
+    def _get_barber_info(self, conn: sqlite3.Connection, barber_id: int) -> Optional[Dict[str, Any]]:
         """Get barber information"""
         
-        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        
         cursor.execute("SELECT display_name FROM barbers WHERE id = ?", (barber_id,))
         row = cursor.fetchone()
-        conn.close()
+        cursor.close()
         
         if row:
             return {
@@ -61,28 +61,7 @@ class InputValidationMiddleware(BaseHTTPMiddleware):
             if self._should_skip_validation(request.url.path):
                 return await call_next(request)
             
-            # Validate request size
-            if hasattr(request, "headers") and "content-length" in request.headers:
-                content_length = int(request.headers.get("content-length", 0))
-                if content_length > self.max_content_length:
-                    logger.warning(f"Request too large: {content_length} bytes from {request.client.host}")
-                    raise HTTPException(
-                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                        detail="Request too large"
-                    )
-            
-            # Only validate content type for POST/PUT/PATCH requests
-            if request.method in ["POST", "PUT", "PATCH"]:
-                await self._validate_content_type(request)
-                await self._validate_request_body(request)
-            
-            # Only validate headers for potentially dangerous requests
-            if request.method not in ["GET", "HEAD", "OPTIONS"]:
-                await self._validate_headers(request)
-            
-            # Only validate query parameters if they exist and request isn't basic
-            if request.url.query and not self._is_basic_request(request):
-                await self._validate_query_params(request)
+            await self.validate_request(request)
             
             # Process request
             response = await call_next(request)
@@ -96,6 +75,34 @@ class InputValidationMiddleware(BaseHTTPMiddleware):
             logger.warning(f"Skipping validation error: {e}")
             return await call_next(request)
     
+    async def validate_request(self, request: Request):
+        """
+        Run every request check, raising HTTPException on the first violation
+        """
+        
+        # Validate request size
+        if hasattr(request, "headers") and "content-length" in request.headers:
+            content_length = int(request.headers.get("content-length", 0))
+            if content_length > self.max_content_length:
+                logger.warning(f"Request too large: {content_length} bytes from {request.client.host}")
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="Request too large"
+                )
+        
+        # Only validate content type for POST/PUT/PATCH requests
+        if request.method in ["POST", "PUT", "PATCH"]:
+            await self._validate_content_type(request)
+            await self._validate_request_body(request)
+        
+        # Only validate headers for potentially dangerous requests
+        if request.method not in ["GET", "HEAD", "OPTIONS"]:
+            await self._validate_headers(request)
+        
+        # Only validate query parameters if they exist and request isn't basic
+        if request.url.query and not self._is_basic_request(request):
+            await self._validate_query_params(request)
+    
     async def _validate_content_type(self, request: Request):
         """Validate request content type"""
         if request.method in ["POST", "PUT", "PATCH"]:
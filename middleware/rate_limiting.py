@@ -360,6 +360,78 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         
         return any(path.startswith(skip_path) for skip_path in self.skip_paths)
     
+    def rate_limit_headers(self, limit_info: Dict) -> Dict[str, str]:
+        """X-RateLimit-* headers describing the caller's current window"""
+        
+        return {
+            'X-RateLimit-Limit': str(limit_info.get('limit', 0)),
+            'X-RateLimit-Remaining': str(max(0, limit_info.get('limit', 0) - limit_info.get('requests', 0))),
+            'X-RateLimit-Reset': str(int(limit_info.get('reset_time', time.time())))
+        }
+    
+    def build_limited_response(self, request: Request, limit_info: Dict) -> JSONResponse:
+        """Build the 403/429 response for a request that failed the rate limit check"""
+        
+        # Track metrics
+        self.blocked_requests += 1
+        self.request_counts['blocked'] += 1
+        
+        # Check if IP is blocked
+        if limit_info.get('blocked'):
+            error_response = {
+                'error': 'Access denied',
+                'message': 'Your IP has been temporarily blocked due to excessive requests.',
+                'code': 'IP_BLOCKED',
+                'details': {
+                    'reason': limit_info.get('reason'),
+                    'retry_after': self.limiter.block_duration
+                }
+            }
+            
+            return JSONResponse(
+                status_code=status.HTTP_403_FORBIDDEN,
+                content=error_response
+            )
+        
+        # Rate limit exceeded
+        retry_after = int(limit_info.get('reset_time', time.time()) - time.time())
+        
+        error_response = {
+            'error': 'Rate limit exceeded',
+            'message': f"Too many requests. Try again in {retry_after} seconds.",
+            'code': 'RATE_LIMIT_EXCEEDED',
+            'details': {
+                'requests': limit_info.get('requests', 0),
+                'limit': limit_info.get('limit', 0),
+                'window': limit_info.get('window', 0),
+                'retry_after': retry_after
+            }
+        }
+        
+        headers = self.rate_limit_headers(limit_info)
+        headers['Retry-After'] = str(retry_after)
+        
+        logger.warning(f"Rate limit exceeded for {request.url.path}: {limit_info}")
+        
+        # Report repeated violations to Sentry
+        client_ip = self.limiter._get_client_ip(request)
+        if self.sentry and self.limiter.violation_counts[client_ip] > 5:
+            self.sentry.capture_message(
+                f"Repeated rate limit violations from {client_ip}",
+                level="warning",
+                context={
+                    'ip': client_ip,
+                    'path': request.url.path,
+                    'violations': self.limiter.violation_counts[client_ip]
+                }
+            )
+        
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content=error_response,
+            headers=headers
+        )
+    
     async def dispatch(self, request: Request, call_next):
         """Process request with rate limiting"""
         
@@ -373,77 +445,13 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             )
             
             if not allowed:
-                # Track metrics
-                self.blocked_requests += 1
-                self.request_counts['blocked'] += 1
-                
-                # Check if IP is blocked
-                if limit_info.get('blocked'):
-                    error_response = {
-                        'error': 'Access denied',
-                        'message': 'Your IP has been temporarily blocked due to excessive requests.',
-                        'code': 'IP_BLOCKED',
-                        'details': {
-                            'reason': limit_info.get('reason'),
-                            'retry_after': self.limiter.block_duration
-                        }
-                    }
-                    
-                    return JSONResponse(
-                        status_code=status.HTTP_403_FORBIDDEN,
-                        content=error_response
-                    )
-                
-                # Rate limit exceeded
-                retry_after = int(limit_info.get('reset_time', time.time()) - time.time())
-                
-                error_response = {
-                    'error': 'Rate limit exceeded',
-                    'message': f"Too many requests. Try again in {retry_after} seconds.",
-                    'code': 'RATE_LIMIT_EXCEEDED',
-                    'details': {
-                        'requests': limit_info.get('requests', 0),
-                        'limit': limit_info.get('limit', 0),
-                        'window': limit_info.get('window', 0),
-                        'retry_after': retry_after
-                    }
-                }
-                
-                headers = {
-                    'X-RateLimit-Limit': str(limit_info.get('limit', 0)),
-                    'X-RateLimit-Remaining': str(max(0, limit_info.get('limit', 0) - limit_info.get('requests', 0))),
-                    'X-RateLimit-Reset': str(int(limit_info.get('reset_time', time.time()))),
-                    'Retry-After': str(retry_after)
-                }
-                
-                logger.warning(f"Rate limit exceeded for {request.url.path}: {limit_info}")
-                
-                # Report repeated violations to Sentry
-                client_ip = self.limiter._get_client_ip(request)
-                if self.sentry and self.limiter.violation_counts[client_ip] > 5:
-                    self.sentry.capture_message(
-                        f"Repeated rate limit violations from {client_ip}",
-                        level="warning",
-                        context={
-                            'ip': client_ip,
-                            'path': request.url.path,
-                            'violations': self.limiter.violation_counts[client_ip]
-                        }
-                    )
-                
-                return JSONResponse(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    content=error_response,
-                    headers=headers
-                )
+                return self.build_limited_response(request, limit_info)
             
             # Add rate limit headers to successful responses
             response = await call_next(request)
             
             # Add rate limit information to response headers
-            response.headers['X-RateLimit-Limit'] = str(limit_info.get('limit', 0))
-            response.headers['X-RateLimit-Remaining'] = str(max(0, limit_info.get('limit', 0) - limit_info.get('requests', 0)))
-            response.headers['X-RateLimit-Reset'] = str(int(limit_info.get('reset_time', time.time())))
+            response.headers.update(self.rate_limit_headers(limit_info))
             
             return response
             
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Composed Request Pipeline Middleware for 6FB AI Agent System
+Runs rate limiting, input validation, security reporting, security headers,
+request metrics and OAuth memory management as one pure-ASGI middleware.
+
+Each of those used to be a separate BaseHTTPMiddleware or @app.middleware layer,
+which costs an extra task plus request/response stream wrapping per layer on
+every request. The stages below reuse the existing middleware classes for their
+logic, so behaviour and configuration stay in one place.
+"""
+
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.requests import Request
+
+from middleware.input_validation import InputValidationMiddleware
+from middleware.rate_limiting import RateLimitMiddleware
+from middleware.security_headers import SecurityHeadersMiddleware, SecurityReportingMiddleware
+from services.memory_manager import memory_manager, memory_limited_oauth_operation
+from services.sentry_service import sentry_service
+
+logger = logging.getLogger(__name__)
+
+# Path fragments that mark authentication traffic for OAuth memory management
+AUTH_PATH_MARKERS = ('/auth', '/oauth', '/login', '/signup', '/callback')
+
+# Stage names reported to the stage observer
+PIPELINE_STAGES = ('rate_limit', 'input_validation', 'security_reports', 'app', 'total')
+
+
+class RequestPipelineMiddleware:
+    """
+    Single pure-ASGI middleware replacing the per-layer middleware chain
+
+    Stage order matches the previous middleware stack (outermost first):
+    rate limiting -> input validation -> security reports -> security headers
+    -> request metrics -> OAuth memory management -> application
+    """
+
+    def __init__(self,
+                 app,
+                 environment: str = None,
+                 redis_client=None,
+                 rate_limit_enabled: bool = True,
+                 max_content_length: int = 10 * 1024 * 1024,
+                 metrics_callback: Optional[Callable[[Dict, int, float], None]] = None,
+                 stage_observer: Optional[Callable[[str, float], None]] = None):
+
+        self.app = app
+        environment = environment or os.getenv('NODE_ENV', 'development')
+
+        # Existing middleware classes provide the stage logic; only their helpers are used
+        self.rate_limiter = RateLimitMiddleware(app, redis_client=redis_client, enabled=rate_limit_enabled)
+        self.validator = InputValidationMiddleware(app, max_content_length=max_content_length)
+        self.reporter = SecurityReportingMiddleware(app)
+        self.security_headers = SecurityHeadersMiddleware(app, environment=environment)
+
+        self.metrics_callback = metrics_callback
+        self.stage_observer = stage_observer
+
+        # Security headers only depend on a handful of request properties
+        self._header_cache: Dict[tuple, List[List[bytes]]] = {}
+
+        # Per-stage timing totals for get_stage_stats()
+        self.stage_totals = defaultdict(float)
+        self.stage_counts = defaultdict(int)
+
+    def _observe(self, stage: str, started: float):
+        """Record the time spent in a pipeline stage"""
+        elapsed = time.perf_counter() - started
+        self.stage_totals[stage] += elapsed
+        self.stage_counts[stage] += 1
+        if self.stage_observer:
+            self.stage_observer(stage, elapsed)
+
+    def get_stage_stats(self) -> Dict[str, Dict[str, float]]:
+        """Average time per stage since startup"""
+        return {
+            stage: {
+                'count': self.stage_counts[stage],
+                'avg_ms': (self.stage_totals[stage] / self.stage_counts[stage]) * 1000
+                          if self.stage_counts[stage] else 0.0
+            }
+            for stage in PIPELINE_STAGES
+        }
+
+    def _get_security_headers(self, request: Request) -> List[List[bytes]]:
+        """Encoded security headers, cached by the request properties they depend on"""
+        path = request.url.path
+        is_api = self.security_headers._is_api_request(path)
+        cache_key = (
+            self.security_headers._should_skip_csp(path),
+            is_api,
+            request.url.scheme == 'https',
+            is_api and 'auth' in path
+        )
+        raw_headers = self._header_cache.get(cache_key)
+        if raw_headers is None:
+            raw_headers = self.security_headers.get_raw_headers(request)
+            self._header_cache[cache_key] = raw_headers
+        return raw_headers
+
+    @staticmethod
+    def _replay_body(body: bytes, receive):
+        """Receive callable that replays a body already consumed by validation"""
+        body_sent = False
+
+        async def replay():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return replay
+
+    async def __call__(self, scope, receive, send):
+        """Run all stages for HTTP requests; pass everything else straight through"""
+
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_started = time.perf_counter()
+        request = Request(scope, receive)
+        path = scope["path"]
+
+        # Stage 1: rate limiting
+        started = time.perf_counter()
+        limit_info = None
+        if self.rate_limiter.enabled and not self.rate_limiter._should_skip_rate_limiting(path):
+            try:
+                allowed, limit_info = await self.rate_limiter.limiter.check_rate_limit(request, path)
+            except Exception as e:
+                logger.error(f"Rate limiting stage error: {e}")
+                # Don't block requests if rate limiting fails
+                allowed, limit_info = True, None
+
+            if not allowed:
+                self._observe('rate_limit', started)
+                response = self.rate_limiter.build_limited_response(request, limit_info)
+                await response(scope, receive, send)
+                return
+        self._observe('rate_limit', started)
+
+        # Stage 2: input validation
+        started = time.perf_counter()
+        if not self.validator._should_skip_validation(path):
+            try:
+                await self.validator.validate_request(request)
+            except HTTPException as e:
+                self._observe('input_validation', started)
+                response = JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+                await response(scope, receive, send)
+                return
+            except Exception as e:
+                logger.warning(f"Skipping validation error: {e}")
+
+            # The body stream can only be read once; hand the buffered copy downstream
+            body = getattr(request, '_body', None)
+            if body is not None:
+                receive = self._replay_body(body, receive)
+        self._observe('input_validation', started)
+
+        # Stage 3: security reports are answered here and never reach the app
+        if self.reporter.is_report_request(request):
+            started = time.perf_counter()
+            response = await self.reporter.build_report_response(request)
+            self._observe('security_reports', started)
+            await response(scope, receive, send)
+            return
+
+        # Stage 4: security headers, rate limit headers and status capture on the way out
+        security_headers = self._get_security_headers(request)
+        rate_limit_headers = [
+            [name.encode(), value.encode()]
+            for name, value in self.rate_limiter.rate_limit_headers(limit_info).items()
+        ] if limit_info else []
+        response_status = 500
+
+        async def send_wrapper(message):
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.extend(rate_limit_headers)
+                headers.extend(security_headers)
+                message = {**message, "headers": headers}
+            await send(message)
+
+        # Stage 5: application, wrapped in OAuth memory management for auth traffic
+        started = time.perf_counter()
+        if any(marker in path for marker in AUTH_PATH_MARKERS):
+            await self._call_auth_request(scope, receive, send_wrapper, request)
+        else:
+            await self.app(scope, receive, send_wrapper)
+        self._observe('app', started)
+
+        # Stage 6: request metrics
+        duration = time.perf_counter() - request_started
+        if self.metrics_callback:
+            self.metrics_callback(scope, response_status, duration)
+        self._observe('total', request_started)
+
+    async def _call_auth_request(self, scope, receive, send, request: Request):
+        """Run an authentication request under memory-limited OAuth handling"""
+
+        path = scope["path"]
+        transaction = None
+        oauth_timer = None
+        if '/oauth' in path or '/callback' in path:
+            oauth_timer = time.time()
+            # Start Sentry transaction for OAuth flow
+            if sentry_service.initialized:
+                transaction = sentry_service.start_transaction(
+                    name=f"oauth.{scope['method'].lower()}.{path}",
+                    op="http.server"
+                )
+                if transaction:
+                    transaction.set_tag("oauth.flow", "callback")
+                    transaction.set_data("url", str(request.url))
+
+        with memory_limited_oauth_operation():
+            await self.app(scope, receive, send)
+
+            # Garbage collect after auth operations under pressure (cooldown-limited)
+            memory_manager.collect_if_under_pressure()
+
+        if oauth_timer:
+            oauth_duration = time.time() - oauth_timer
+
+            # Complete Sentry transaction
+            if transaction:
+                transaction.set_data("duration_ms", oauth_duration * 1000)
+                transaction.set_tag("performance.slow", oauth_duration > 2.0)
+                transaction.finish()
+
+            # Alert if OAuth takes more than 2 seconds
+            if oauth_duration > 2.0 and sentry_service.initialized:
+                sentry_service.capture_message(
+                    f"Slow OAuth callback detected: {oauth_duration:.2f}s",
+                    level="warning",
+                    context={
+                        "duration_seconds": oauth_duration,
+                        "url": str(request.url),
+                        "memory_pressure": memory_manager.get_memory_stats().memory_pressure
+                    }
+                )
+
+
+# Export main components
+__all__ = [
+    'RequestPipelineMiddleware',
+    'AUTH_PATH_MARKERS',
+    'PIPELINE_STAGES'
+]
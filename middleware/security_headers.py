@@ -233,6 +233,21 @@ class SecurityHeadersMiddleware:
         
         return headers
     
+    def get_raw_headers(self, request: Request) -> List[List[bytes]]:
+        """Encoded security headers, ready to append to an ASGI response start message"""
+        
+        raw_headers = [
+            [header_name.encode(), header_value.encode()]
+            for header_name, header_value in self._get_security_headers(request).items()
+        ]
+        
+        # Add custom security headers for API responses
+        if self._is_api_request(request.url.path):
+            raw_headers.append([b"X-API-Version", b"2.0.0"])
+            raw_headers.append([b"X-Powered-By", b"6FB-AI-System"])
+        
+        return raw_headers
+    
     async def __call__(self, scope, receive, send):
         """Process request and add security headers to response using ASGI interface"""
         
@@ -249,20 +264,7 @@ class SecurityHeadersMiddleware:
             # Create a custom send function to add headers
             async def send_with_headers(message):
                 if message["type"] == "http.response.start":
-                    # Get security headers for this request
-                    security_headers = self._get_security_headers(request)
-                    
-                    # Add security headers to response
-                    for header_name, header_value in security_headers.items():
-                        message["headers"].append([
-                            header_name.encode(),
-                            header_value.encode()
-                        ])
-                    
-                    # Add custom security headers for API responses
-                    if self._is_api_request(request.url.path):
-                        message["headers"].append([b"X-API-Version", b"2.0.0"])
-                        message["headers"].append([b"X-Powered-By", b"6FB-AI-System"])
+                    message["headers"].extend(self.get_raw_headers(request))
                 
                 await send(message)
             
@@ -297,39 +299,44 @@ class SecurityReportingMiddleware:
         request = Request(scope, receive)
         
         # Check if this is a security report
-        if (request.url.path == self.report_endpoint and 
-            request.method == 'POST'):
-            
-            try:
-                # Log security violation report
-                report_data = await request.json()
-                logger.warning(f"Security violation report: {report_data}")
-                
-                # Process specific types of reports
-                if 'csp-report' in report_data:
-                    await self._handle_csp_report(report_data['csp-report'])
-                elif 'nel' in report_data:
-                    await self._handle_nel_report(report_data)
-                
-                response = JSONResponse(
-                    status_code=204,
-                    content={"status": "report received"}
-                )
-                await response(scope, receive, send)
-                return
-                
-            except Exception as e:
-                logger.error(f"Security report processing error: {e}")
-                response = JSONResponse(
-                    status_code=400,
-                    content={"error": "Invalid report format"}
-                )
-                await response(scope, receive, send)
-                return
+        if self.is_report_request(request):
+            response = await self.build_report_response(request)
+            await response(scope, receive, send)
+            return
         
         # Continue to next middleware/app
         await self.app(scope, receive, send)
     
+    def is_report_request(self, request: Request) -> bool:
+        """Check if request is a security report submission"""
+        return request.url.path == self.report_endpoint and request.method == 'POST'
+    
+    async def build_report_response(self, request: Request) -> JSONResponse:
+        """Process a security report and build the acknowledgement response"""
+        
+        try:
+            # Log security violation report
+            report_data = await request.json()
+            logger.warning(f"Security violation report: {report_data}")
+            
+            # Process specific types of reports
+            if 'csp-report' in report_data:
+                await self._handle_csp_report(report_data['csp-report'])
+            elif 'nel' in report_data:
+                await self._handle_nel_report(report_data)
+            
+            return JSONResponse(
+                status_code=204,
+                content={"status": "report received"}
+            )
+            
+        except Exception as e:
+            logger.error(f"Security report processing error: {e}")
+            return JSONResponse(
+                status_code=400,
+                content={"error": "Invalid report format"}
+            )
+    
     async def _handle_csp_report(self, csp_report: Dict):
         """Handle Content Security Policy violation reports"""
         
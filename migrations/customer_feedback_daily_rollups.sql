@@ -0,0 +1,127 @@
+-- Migration: Customer Feedback Daily Rollups
+-- Description: Per-barbershop, per-day NPS and sentiment counts kept current by a trigger on
+--              customer_feedback, so NPS and sentiment over any date range are a sum over buckets.
+--              Populate existing feedback with services/feedback_rollup_backfill.py
+
+CREATE TABLE IF NOT EXISTS customer_feedback_daily_rollups (
+    barbershop_id UUID NOT NULL REFERENCES barbershops(id) ON DELETE CASCADE,
+    day DATE NOT NULL, -- UTC day of customer_feedback.created_at
+
+    -- NPS feedback by score band: promoters 9-10, passives 7-8, detractors 0-6
+    nps_promoters INTEGER NOT NULL DEFAULT 0,
+    nps_passives INTEGER NOT NULL DEFAULT 0,
+    nps_detractors INTEGER NOT NULL DEFAULT 0,
+
+    -- Feedback with a comment, by stored sentiment_label
+    sentiment_very_positive INTEGER NOT NULL DEFAULT 0,
+    sentiment_positive INTEGER NOT NULL DEFAULT 0,
+    sentiment_neutral INTEGER NOT NULL DEFAULT 0,
+    sentiment_negative INTEGER NOT NULL DEFAULT 0,
+    sentiment_very_negative INTEGER NOT NULL DEFAULT 0,
+
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (barbershop_id, day)
+);
+
+ALTER TABLE customer_feedback_daily_rollups ENABLE ROW LEVEL SECURITY;
+
+-- Add (p_sign = 1) or remove (p_sign = -1) one feedback row's contribution to its bucket
+CREATE OR REPLACE FUNCTION apply_customer_feedback_rollup(
+    p_barbershop_id UUID,
+    p_created_at TIMESTAMPTZ,
+    p_feedback_type TEXT,
+    p_nps_score INTEGER,
+    p_comment TEXT,
+    p_sentiment TEXT,
+    p_sign INTEGER
+) RETURNS VOID AS $$
+DECLARE
+    is_nps BOOLEAN := p_feedback_type = 'nps' AND p_nps_score IS NOT NULL;
+    has_comment BOOLEAN := p_comment IS NOT NULL;
+BEGIN
+    INSERT INTO customer_feedback_daily_rollups AS r (
+        barbershop_id, day,
+        nps_promoters, nps_passives, nps_detractors,
+        sentiment_very_positive, sentiment_positive, sentiment_neutral,
+        sentiment_negative, sentiment_very_negative
+    ) VALUES (
+        p_barbershop_id, (p_created_at AT TIME ZONE 'UTC')::date,
+        CASE WHEN is_nps AND p_nps_score >= 9 THEN p_sign ELSE 0 END,
+        CASE WHEN is_nps AND p_nps_score BETWEEN 7 AND 8 THEN p_sign ELSE 0 END,
+        CASE WHEN is_nps AND p_nps_score <= 6 THEN p_sign ELSE 0 END,
+        CASE WHEN has_comment AND p_sentiment = 'very_positive' THEN p_sign ELSE 0 END,
+        CASE WHEN has_comment AND p_sentiment = 'positive' THEN p_sign ELSE 0 END,
+        CASE WHEN has_comment AND p_sentiment = 'neutral' THEN p_sign ELSE 0 END,
+        CASE WHEN has_comment AND p_sentiment = 'negative' THEN p_sign ELSE 0 END,
+        CASE WHEN has_comment AND p_sentiment = 'very_negative' THEN p_sign ELSE 0 END
+    )
+    ON CONFLICT (barbershop_id, day) DO UPDATE SET
+        nps_promoters = r.nps_promoters + EXCLUDED.nps_promoters,
+        nps_passives = r.nps_passives + EXCLUDED.nps_passives,
+        nps_detractors = r.nps_detractors + EXCLUDED.nps_detractors,
+        sentiment_very_positive = r.sentiment_very_positive + EXCLUDED.sentiment_very_positive,
+        sentiment_positive = r.sentiment_positive + EXCLUDED.sentiment_positive,
+        sentiment_neutral = r.sentiment_neutral + EXCLUDED.sentiment_neutral,
+        sentiment_negative = r.sentiment_negative + EXCLUDED.sentiment_negative,
+        sentiment_very_negative = r.sentiment_very_negative + EXCLUDED.sentiment_very_negative,
+        updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION customer_feedback_rollup_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_customer_feedback_rollup(OLD.barbershop_id, OLD.created_at, OLD.feedback_type,
+                                               OLD.nps_score, OLD.comment, OLD.sentiment_label, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_customer_feedback_rollup(NEW.barbershop_id, NEW.created_at, NEW.feedback_type,
+                                               NEW.nps_score, NEW.comment, NEW.sentiment_label, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Status and note updates don't touch the counted columns and skip the trigger
+DROP TRIGGER IF EXISTS maintain_customer_feedback_rollups ON customer_feedback;
+CREATE TRIGGER maintain_customer_feedback_rollups
+    AFTER INSERT OR DELETE OR UPDATE OF barbershop_id, created_at, feedback_type, nps_score, comment, sentiment_label
+    ON customer_feedback
+    FOR EACH ROW EXECUTE FUNCTION customer_feedback_rollup_trigger();
+
+-- Recompute one barbershop's buckets (or all) from customer_feedback. The lock keeps
+-- concurrent inserts from applying deltas to buckets while they are being replaced.
+CREATE OR REPLACE FUNCTION rebuild_customer_feedback_daily_rollups(p_barbershop_id UUID DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    bucket_count INTEGER;
+BEGIN
+    LOCK TABLE customer_feedback_daily_rollups IN EXCLUSIVE MODE;
+
+    DELETE FROM customer_feedback_daily_rollups
+    WHERE p_barbershop_id IS NULL OR barbershop_id = p_barbershop_id;
+
+    INSERT INTO customer_feedback_daily_rollups (
+        barbershop_id, day,
+        nps_promoters, nps_passives, nps_detractors,
+        sentiment_very_positive, sentiment_positive, sentiment_neutral,
+        sentiment_negative, sentiment_very_negative
+    )
+    SELECT
+        barbershop_id, (created_at AT TIME ZONE 'UTC')::date,
+        COUNT(*) FILTER (WHERE feedback_type = 'nps' AND nps_score >= 9),
+        COUNT(*) FILTER (WHERE feedback_type = 'nps' AND nps_score BETWEEN 7 AND 8),
+        COUNT(*) FILTER (WHERE feedback_type = 'nps' AND nps_score <= 6),
+        COUNT(*) FILTER (WHERE comment IS NOT NULL AND sentiment_label = 'very_positive'),
+        COUNT(*) FILTER (WHERE comment IS NOT NULL AND sentiment_label = 'positive'),
+        COUNT(*) FILTER (WHERE comment IS NOT NULL AND sentiment_label = 'neutral'),
+        COUNT(*) FILTER (WHERE comment IS NOT NULL AND sentiment_label = 'negative'),
+        COUNT(*) FILTER (WHERE comment IS NOT NULL AND sentiment_label = 'very_negative')
+    FROM customer_feedback
+    WHERE p_barbershop_id IS NULL OR barbershop_id = p_barbershop_id
+    GROUP BY barbershop_id, (created_at AT TIME ZONE 'UTC')::date;
+
+    GET DIAGNOSTICS bucket_count = ROW_COUNT;
+    RETURN bucket_count;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,24 @@
+-- Migration: Birthday Bonus Lookup and Ledger Idempotency
+-- Description: Month/day columns so the daily birthday job reads only today's customers,
+--              and idempotency keys so re-running a points job never double-awards
+
+-- Generated from date_of_birth; EXTRACT on a DATE is immutable, so they can be stored
+ALTER TABLE customers
+    ADD COLUMN IF NOT EXISTS birth_month SMALLINT
+        GENERATED ALWAYS AS (EXTRACT(MONTH FROM date_of_birth)::SMALLINT) STORED,
+    ADD COLUMN IF NOT EXISTS birth_day SMALLINT
+        GENERATED ALWAYS AS (EXTRACT(DAY FROM date_of_birth)::SMALLINT) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_customers_birthday
+    ON customers(barbershop_id, birth_month, birth_day)
+    WHERE date_of_birth IS NOT NULL;
+
+-- One ledger row per idempotency key, e.g. birthday_bonus:<customer>:<program>:<year>.
+-- Callers skip keys that already exist; a concurrent duplicate fails the whole insert
+-- statement, which also rolls back the balance trigger's enrollment update.
+ALTER TABLE loyalty_points
+    ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_loyalty_points_idempotency_key
+    ON loyalty_points(idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
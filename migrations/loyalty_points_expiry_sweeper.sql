@@ -0,0 +1,27 @@
+-- Migration: Loyalty Points Expiry Sweeper
+-- Description: Due-date index over unexpired points and the persisted cursor used by
+--              services/loyalty_expiry_sweeper.py to expire points in bounded chunks
+
+-- Only unexpired rows are indexed, so the index stays the size of the live backlog
+-- rather than the whole ledger. id breaks ties for the (expires_at, id) keyset.
+CREATE INDEX IF NOT EXISTS idx_loyalty_points_expiry_due
+    ON loyalty_points(expires_at, id)
+    WHERE is_expired = false AND expires_at IS NOT NULL;
+
+-- Sweep cursor: the last (expires_at, id) the sweeper has processed
+CREATE TABLE IF NOT EXISTS loyalty_expiry_sweep_state (
+    sweep_name TEXT PRIMARY KEY,
+    last_expires_at TIMESTAMPTZ,
+    last_point_id UUID,
+    rows_processed BIGINT NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Service role only; no end-user access
+ALTER TABLE loyalty_expiry_sweep_state ENABLE ROW LEVEL SECURITY;
+
+DROP TRIGGER IF EXISTS set_loyalty_expiry_sweep_state_updated_at ON loyalty_expiry_sweep_state;
+CREATE TRIGGER set_loyalty_expiry_sweep_state_updated_at
+    BEFORE UPDATE ON loyalty_expiry_sweep_state
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
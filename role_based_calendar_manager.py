@@ -4,13 +4,23 @@ Role-Based Calendar Management System
 Manages calendar access permissions based on user roles and business hierarchy
 """
 
+import os
+import logging
 import sqlite3
 import json
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, FrozenSet
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from google_calendar_integration import GoogleCalendarService
+from services.database_connection_pool import DatabaseConnectionPool, PoolStrategy, write_transaction
+
+logger = logging.getLogger(__name__)
+
+# Statuses counted in location summaries
+SUMMARY_STATUSES = ('confirmed', 'completed')
 
 class CalendarPermission(str, Enum):
     VIEW_OWN = "view_own"
@@ -27,109 +37,234 @@ class UserRole(str, Enum):
     MANAGER = "manager"
     ADMIN = "admin"
 
-@dataclass
+@dataclass(frozen=True)
 class CalendarAccess:
-    """Calendar access permissions for a user"""
+    """Calendar access permissions for a user (immutable so it can be shared from the cache)"""
     user_id: int
     role: UserRole
-    permissions: List[CalendarPermission]
-    accessible_locations: List[int]
-    accessible_barbers: List[int]
+    permissions: FrozenSet[CalendarPermission]
+    accessible_locations: FrozenSet[int]
+    accessible_barbers: FrozenSet[int]
     can_modify: bool
     can_book_for_others: bool
+    own_barbers: FrozenSet[int] = field(default_factory=frozenset)
+
+class CalendarAccessCache:
+    """
+    TTL cache of resolved CalendarAccess keyed by user id
+
+    Roles, barbers and locations are written outside this process (the
+    dashboard and seed scripts), so the TTL is what bounds staleness: a
+    change is picked up within ttl_seconds (CALENDAR_ACCESS_CACHE_TTL,
+    default 30). Code that changes them in-process should also call the
+    invalidation hooks so the change applies immediately.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[int, Tuple[float, CalendarAccess]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[CalendarAccess]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, access: CalendarAccess):
+        with self._lock:
+            self._entries[access.user_id] = (time.monotonic() + self.ttl_seconds, access)
+
+    def invalidate_user(self, user_id: int):
+        """Role or profile change for a single user"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def invalidate_barber(self, barber_id: int, location_id: Optional[int] = None):
+        """
+        Barber added, moved, removed or toggled available
+
+        Drops every entry that can see the barber or its location, plus admins,
+        whose barber list covers all available barbers.
+        """
+        with self._lock:
+            stale = [
+                user_id for user_id, (_, access) in self._entries.items()
+                if barber_id in access.accessible_barbers
+                or barber_id in access.own_barbers
+                or (location_id is not None and location_id in access.accessible_locations)
+                or access.role == UserRole.ADMIN
+            ]
+            for user_id in stale:
+                del self._entries[user_id]
+
+    def invalidate_location(self, location_id: int):
+        """Location added, removed or toggled active"""
+        with self._lock:
+            stale = [
+                user_id for user_id, (_, access) in self._entries.items()
+                if location_id in access.accessible_locations or access.role == UserRole.ADMIN
+            ]
+            for user_id in stale:
+                del self._entries[user_id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total * 100, 2) if total else 0.0
+        }
 
 class RoleBasedCalendarManager:
     """Manages calendar access based on user roles and business hierarchy"""
     
-    def __init__(self):
-        self.db_path = 'booking_system.db'
+    def __init__(self, db_path: str = 'booking_system.db', access_cache_ttl: Optional[float] = None):
+        self.db_path = db_path
         self.calendar_service = GoogleCalendarService()
+        self._pool: Optional[DatabaseConnectionPool] = None
+        self._pool_lock = threading.Lock()
+        
+        if access_cache_ttl is None:
+            access_cache_ttl = float(os.getenv('CALENDAR_ACCESS_CACHE_TTL', '30'))
+        self.access_cache = CalendarAccessCache(ttl_seconds=access_cache_ttl)
         
         # Define role-based permissions matrix
         self.role_permissions = {
-            UserRole.CUSTOMER: [
+            UserRole.CUSTOMER: frozenset([
                 CalendarPermission.VIEW_OWN
-            ],
-            UserRole.BARBER: [
+            ]),
+            UserRole.BARBER: frozenset([
                 CalendarPermission.VIEW_OWN,
                 CalendarPermission.MANAGE_OWN
-            ],
-            UserRole.MANAGER: [
+            ]),
+            UserRole.MANAGER: frozenset([
                 CalendarPermission.VIEW_OWN,
                 CalendarPermission.VIEW_LOCATION,
                 CalendarPermission.MANAGE_OWN,
                 CalendarPermission.MANAGE_LOCATION
-            ],
-            UserRole.ADMIN: [
+            ]),
+            UserRole.ADMIN: frozenset([
                 CalendarPermission.VIEW_ALL,
                 CalendarPermission.MANAGE_ALL,
                 CalendarPermission.ADMIN_ACCESS
-            ]
+            ])
         }
     
+    @property
+    def pool(self) -> DatabaseConnectionPool:
+        """
+        Connection pool for booking_system.db reads, opened on first use
+        
+        Pooled connections are shared between threads, so writes go through
+        _transaction() instead.
+        """
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = DatabaseConnectionPool(
+                        database_path=os.path.abspath(self.db_path),
+                        max_connections=5,
+                        strategy=PoolStrategy.ROUND_ROBIN
+                    )
+                    self._ensure_indexes(self._pool)
+        return self._pool
+    
+    def _transaction(self):
+        """Exclusive BEGIN IMMEDIATE transaction on its own connection"""
+        self.pool  # Indexes are set up on first use
+        return write_transaction(os.path.abspath(self.db_path))
+    
+    @staticmethod
+    def _ensure_indexes(pool: DatabaseConnectionPool):
+        """Indexes backing the location summary queries"""
+        # Leading (location_id, appointment_datetime, status) serves the range scan;
+        # trailing columns make the per-barber aggregate index-only
+        try:
+            with pool.get_connection() as conn:
+                conn.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_appointments_location_time_status
+                    ON appointments(location_id, appointment_datetime, status, barber_id, duration, price)
+                """)
+                conn.commit()
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Could not create appointment summary index: {e}")
+    
     def get_user_calendar_access(self, user_id: int) -> CalendarAccess:
-        """Get calendar access permissions for a user"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get user information
-        cursor.execute("SELECT role FROM users WHERE id = ?", (user_id,))
-        user_data = cursor.fetchone()
-        
-        if not user_data:
-            conn.close()
-            raise ValueError(f"User {user_id} not found")
-        
-        role = UserRole(user_data[0])
-        permissions = self.role_permissions[role]
-        
-        # Get accessible locations and barbers based on role
-        accessible_locations = []
-        accessible_barbers = []
-        
-        if role == UserRole.CUSTOMER:
-            # Customers can only see their own appointments
-            accessible_locations = []
-            accessible_barbers = []
+        """Get calendar access permissions for a user (served from the access cache)"""
+        access = self.access_cache.get(user_id)
+        if access is None:
+            access = self._resolve_calendar_access(user_id)
+            self.access_cache.set(access)
+        return access
+    
+    def _resolve_calendar_access(self, user_id: int) -> CalendarAccess:
+        """Resolve calendar access from the database"""
+        with self.pool.get_connection() as conn:
+            cursor = conn.cursor()
             
-        elif role == UserRole.BARBER:
-            # Barbers can see their own calendar and location
-            cursor.execute("""
-                SELECT location_id FROM barbers WHERE user_id = ?
-            """, (user_id,))
-            barber_data = cursor.fetchone()
-            if barber_data:
-                accessible_locations = [barber_data[0]]
-                cursor.execute("SELECT id FROM barbers WHERE user_id = ?", (user_id,))
-                accessible_barbers = [cursor.fetchone()[0]]
-                
-        elif role == UserRole.MANAGER:
-            # Managers can see all barbers in their locations
-            cursor.execute("""
-                SELECT DISTINCT b.location_id 
-                FROM barbers b 
-                WHERE b.user_id = ? OR b.location_id IN (
-                    SELECT location_id FROM barbers WHERE user_id = ?
-                )
-            """, (user_id, user_id))
-            accessible_locations = [row[0] for row in cursor.fetchall()]
+            # Get user information
+            cursor.execute("SELECT role FROM users WHERE id = ?", (user_id,))
+            user_data = cursor.fetchone()
+            
+            if not user_data:
+                raise ValueError(f"User {user_id} not found")
+            
+            role = UserRole(user_data[0])
+            permissions = self.role_permissions[role]
+            
+            # Get accessible locations and barbers based on role
+            accessible_locations: FrozenSet[int] = frozenset()
+            accessible_barbers: FrozenSet[int] = frozenset()
+            own_barbers: FrozenSet[int] = frozenset()
             
-            if accessible_locations:
-                placeholders = ','.join(['?' for _ in accessible_locations])
-                cursor.execute(f"""
-                    SELECT id FROM barbers WHERE location_id IN ({placeholders})
-                """, accessible_locations)
-                accessible_barbers = [row[0] for row in cursor.fetchall()]
+            if role != UserRole.CUSTOMER:
+                # Barber profiles owned by this user, with their locations
+                cursor.execute("SELECT id, location_id FROM barbers WHERE user_id = ?", (user_id,))
+                own_rows = cursor.fetchall()
+                own_barbers = frozenset(row[0] for row in own_rows)
+                own_locations = frozenset(row[1] for row in own_rows)
+            
+            if role == UserRole.CUSTOMER:
+                # Customers can only see their own appointments
+                pass
+                
+            elif role == UserRole.BARBER:
+                # Barbers can see their own calendar and location
+                if own_rows:
+                    accessible_locations = frozenset([own_rows[0][1]])
+                    accessible_barbers = frozenset([own_rows[0][0]])
+                    
+            elif role == UserRole.MANAGER:
+                # Managers can see all barbers in their locations
+                accessible_locations = own_locations
+                
+                if accessible_locations:
+                    placeholders = ','.join(['?' for _ in accessible_locations])
+                    cursor.execute(f"""
+                        SELECT id FROM barbers WHERE location_id IN ({placeholders})
+                    """, tuple(accessible_locations))
+                    accessible_barbers = frozenset(row[0] for row in cursor.fetchall())
+                    
+            elif role == UserRole.ADMIN:
+                # Admins can access everything
+                cursor.execute("SELECT id FROM locations WHERE is_active = TRUE")
+                accessible_locations = frozenset(row[0] for row in cursor.fetchall())
                 
-        elif role == UserRole.ADMIN:
-            # Admins can access everything
-            cursor.execute("SELECT id FROM locations WHERE is_active = TRUE")
-            accessible_locations = [row[0] for row in cursor.fetchall()]
+                cursor.execute("SELECT id FROM barbers WHERE is_available = TRUE")
+                accessible_barbers = frozenset(row[0] for row in cursor.fetchall())
             
-            cursor.execute("SELECT id FROM barbers WHERE is_available = TRUE")
-            accessible_barbers = [row[0] for row in cursor.fetchall()]
-        
-        conn.close()
+            cursor.close()
         
         return CalendarAccess(
             user_id=user_id,
@@ -140,9 +275,22 @@ class RoleBasedCalendarManager:
             can_modify=CalendarPermission.MANAGE_OWN in permissions or 
                       CalendarPermission.MANAGE_LOCATION in permissions or 
                       CalendarPermission.MANAGE_ALL in permissions,
-            can_book_for_others=role in [UserRole.MANAGER, UserRole.ADMIN]
+            can_book_for_others=role in [UserRole.MANAGER, UserRole.ADMIN],
+            own_barbers=own_barbers
         )
     
+    def invalidate_user_access(self, user_id: int):
+        """Call after a user's role changes"""
+        self.access_cache.invalidate_user(user_id)
+    
+    def invalidate_barber_access(self, barber_id: int, location_id: Optional[int] = None):
+        """Call after a barber is created, moved, removed or toggled available"""
+        self.access_cache.invalidate_barber(barber_id, location_id)
+    
+    def invalidate_location_access(self, location_id: int):
+        """Call after a location is created, removed or toggled active"""
+        self.access_cache.invalidate_location(location_id)
+    
     def can_access_barber_calendar(self, user_id: int, barber_id: int) -> bool:
         """Check if user can access a specific barber's calendar"""
         access = self.get_user_calendar_access(user_id)
@@ -159,16 +307,13 @@ class RoleBasedCalendarManager:
         if not self.can_access_barber_calendar(user_id, barber_id):
             return False
             
-        access = self.get_user_calendar_access(user_id)
-        
+        return self._can_modify(self.get_user_calendar_access(user_id), barber_id)
+    
+    @staticmethod
+    def _can_modify(access: CalendarAccess, barber_id: int) -> bool:
+        """Modify check for a barber the user is already known to have access to"""
         # Check if user is the barber themselves
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id FROM barbers WHERE id = ?", (barber_id,))
-        barber_user = cursor.fetchone()
-        conn.close()
-        
-        if barber_user and barber_user[0] == user_id:
+        if barber_id in access.own_barbers:
             return CalendarPermission.MANAGE_OWN in access.permissions
             
         # Check location-level or admin permissions
@@ -182,23 +327,25 @@ class RoleBasedCalendarManager:
         if not access.accessible_barbers:
             return []
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         placeholders = ','.join(['?' for _ in access.accessible_barbers])
-        cursor.execute(f"""
-            SELECT b.id, b.display_name, b.user_id, l.name as location_name,
-                   cs.google_calendar_id, cs.sync_status
-            FROM barbers b
-            JOIN locations l ON b.location_id = l.id
-            LEFT JOIN calendar_sync cs ON b.id = cs.barber_id
-            WHERE b.id IN ({placeholders}) AND b.is_available = TRUE
-            ORDER BY l.name, b.display_name
-        """, access.accessible_barbers)
+        with self.pool.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT b.id, b.display_name, b.user_id, l.name as location_name,
+                       cs.google_calendar_id, cs.sync_status
+                FROM barbers b
+                JOIN locations l ON b.location_id = l.id
+                LEFT JOIN calendar_sync cs ON b.id = cs.barber_id
+                WHERE b.id IN ({placeholders}) AND b.is_available = TRUE
+                ORDER BY l.name, b.display_name
+            """, tuple(access.accessible_barbers))
+            rows = cursor.fetchall()
+            cursor.close()
         
         barbers = []
-        for row in cursor.fetchall():
-            can_modify = self.can_modify_barber_calendar(user_id, row[0])
+        for row in rows:
+            # Every row comes from accessible_barbers, so only the modify check remains
+            can_modify = self._can_modify(access, row[0])
             
             barbers.append({
                 'barber_id': row[0],
@@ -212,7 +359,6 @@ class RoleBasedCalendarManager:
                 'can_authorize': can_modify or (access.role == UserRole.BARBER and row[2] == user_id)
             })
         
-        conn.close()
         return barbers
     
     def authorize_barber_calendar(self, user_id: int, barber_id: int) -> Dict[str, Any]:
@@ -221,13 +367,7 @@ class RoleBasedCalendarManager:
         # Check permissions
         if not self.can_modify_barber_calendar(user_id, barber_id):
             # Special case: barbers can authorize their own calendar
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT user_id FROM barbers WHERE id = ?", (barber_id,))
-            barber_user = cursor.fetchone()
-            conn.close()
-            
-            if not (barber_user and barber_user[0] == user_id):
+            if barber_id not in self.get_user_calendar_access(user_id).own_barbers:
                 return {
                     'success': False,
                     'message': 'Insufficient permissions to authorize calendar'
@@ -312,28 +452,27 @@ class RoleBasedCalendarManager:
         
         try:
             # Create appointment in database
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO appointments 
-                (customer_id, barber_id, service_id, location_id, appointment_datetime,
-                 duration, price, status, notes, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, 'confirmed', ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-            """, (
-                appointment_data['customer_id'],
-                appointment_data['barber_id'],
-                appointment_data['service_id'],
-                appointment_data['location_id'],
-                appointment_data['appointment_datetime'].isoformat(),
-                appointment_data['duration'],
-                appointment_data['price'],
-                appointment_data.get('notes', '')
-            ))
-            
-            appointment_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with self._transaction() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    INSERT INTO appointments 
+                    (customer_id, barber_id, service_id, location_id, appointment_datetime,
+                     duration, price, status, notes, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 'confirmed', ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                """, (
+                    appointment_data['customer_id'],
+                    appointment_data['barber_id'],
+                    appointment_data['service_id'],
+                    appointment_data['location_id'],
+                    appointment_data['appointment_datetime'].isoformat(),
+                    appointment_data['duration'],
+                    appointment_data['price'],
+                    appointment_data.get('notes', '')
+                ))
+                
+                appointment_id = cursor.lastrowid
+                cursor.close()
             
             # Sync to Google Calendar
             calendar_event_id = None
@@ -354,8 +493,16 @@ class RoleBasedCalendarManager:
             }
     
     def get_location_calendar_summary(self, user_id: int, location_id: int, 
-                                    date_range: Tuple[datetime, datetime]) -> Dict[str, Any]:
-        """Get calendar summary for a location (Manager/Admin only)"""
+                                    date_range: Tuple[datetime, datetime],
+                                    include_appointments: bool = False,
+                                    page_size: int = 100) -> Dict[str, Any]:
+        """
+        Get calendar summary for a location (Manager/Admin only)
+        
+        Totals and per-barber stats are aggregated in SQL. Appointment details
+        are only included on request, as the first page of
+        get_location_appointments (follow 'next_cursor' for the rest).
+        """
         
         access = self.get_user_calendar_access(user_id)
         
@@ -365,59 +512,45 @@ class RoleBasedCalendarManager:
                 'message': 'Access denied to location'
             }
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         start_date, end_date = date_range
+        placeholders = ','.join(['?' for _ in SUMMARY_STATUSES])
         
-        # Get appointments in date range for this location
-        cursor.execute("""
-            SELECT a.*, b.display_name as barber_name, s.name as service_name,
-                   u.full_name as customer_name
-            FROM appointments a
-            JOIN barbers b ON a.barber_id = b.id
-            JOIN services s ON a.service_id = s.id
-            JOIN users u ON a.customer_id = u.id
-            WHERE a.location_id = ? 
-            AND a.appointment_datetime BETWEEN ? AND ?
-            AND a.status IN ('confirmed', 'completed')
-            ORDER BY a.appointment_datetime
-        """, (location_id, start_date.isoformat(), end_date.isoformat()))
-        
-        appointments = []
+        with self.pool.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT b.display_name AS barber_name,
+                       COUNT(*) AS appointments,
+                       COALESCE(SUM(a.price), 0) AS revenue,
+                       COALESCE(SUM(a.duration), 0) / 60.0 AS total_hours
+                FROM appointments a
+                JOIN barbers b ON a.barber_id = b.id
+                WHERE a.location_id = ?
+                AND a.appointment_datetime BETWEEN ? AND ?
+                AND a.status IN ({placeholders})
+                GROUP BY a.barber_id
+            """, (location_id, start_date.isoformat(), end_date.isoformat(), *SUMMARY_STATUSES))
+            rows = cursor.fetchall()
+            cursor.close()
+        
+        total_appointments = 0
         total_revenue = 0
         barber_stats = {}
         
-        for row in cursor.fetchall():
-            appointment = {
-                'id': row[0],
-                'customer_name': row[15],
-                'barber_name': row[13],
-                'service_name': row[14],
-                'appointment_datetime': row[5],
-                'duration': row[6],
-                'price': row[7],
-                'status': row[8]
-            }
-            appointments.append(appointment)
-            total_revenue += row[7]
-            
-            # Track barber stats
-            barber_name = row[13]
-            if barber_name not in barber_stats:
-                barber_stats[barber_name] = {
-                    'appointments': 0,
-                    'revenue': 0,
-                    'total_hours': 0
-                }
+        for barber_name, appointments, revenue, total_hours in rows:
+            total_appointments += appointments
+            total_revenue += revenue
             
-            barber_stats[barber_name]['appointments'] += 1
-            barber_stats[barber_name]['revenue'] += row[7]
-            barber_stats[barber_name]['total_hours'] += row[6] / 60
-        
-        conn.close()
+            # Barbers sharing a display name are reported together
+            stats = barber_stats.setdefault(barber_name, {
+                'appointments': 0,
+                'revenue': 0,
+                'total_hours': 0
+            })
+            stats['appointments'] += appointments
+            stats['revenue'] += revenue
+            stats['total_hours'] += total_hours
         
-        return {
+        result = {
             'success': True,
             'location_id': location_id,
             'date_range': {
@@ -425,11 +558,93 @@ class RoleBasedCalendarManager:
                 'end': end_date.isoformat()
             },
             'summary': {
-                'total_appointments': len(appointments),
+                'total_appointments': total_appointments,
                 'total_revenue': total_revenue,
                 'barber_stats': barber_stats
-            },
-            'appointments': appointments
+            }
+        }
+        
+        if include_appointments:
+            page = self.get_location_appointments(user_id, location_id, date_range, limit=page_size)
+            result['appointments'] = page['appointments']
+            result['next_cursor'] = page['next_cursor']
+        
+        return result
+    
+    def get_location_appointments(self, user_id: int, location_id: int,
+                                  date_range: Tuple[datetime, datetime],
+                                  cursor: Optional[str] = None,
+                                  limit: int = 100) -> Dict[str, Any]:
+        """
+        Page through a location's appointments in date order (Manager/Admin only)
+        
+        Keyset pagination on (appointment_datetime, id): pass the returned
+        'next_cursor' back in to fetch the following page. It is None after
+        the last page.
+        """
+        
+        access = self.get_user_calendar_access(user_id)
+        
+        if location_id not in access.accessible_locations:
+            return {
+                'success': False,
+                'message': 'Access denied to location'
+            }
+        
+        start_date, end_date = date_range
+        placeholders = ','.join(['?' for _ in SUMMARY_STATUSES])
+        params: List[Any] = [location_id, start_date.isoformat(), end_date.isoformat(), *SUMMARY_STATUSES]
+        
+        keyset = ''
+        if cursor:
+            after_datetime, after_id = cursor.rsplit('|', 1)
+            keyset = "AND (a.appointment_datetime > ? OR (a.appointment_datetime = ? AND a.id > ?))"
+            params.extend([after_datetime, after_datetime, int(after_id)])
+        
+        with self.pool.get_connection() as conn:
+            db_cursor = conn.cursor()
+            db_cursor.execute(f"""
+                SELECT a.id, u.full_name AS customer_name, b.display_name AS barber_name,
+                       s.name AS service_name, a.appointment_datetime, a.duration,
+                       a.price, a.status
+                FROM appointments a
+                JOIN barbers b ON a.barber_id = b.id
+                JOIN services s ON a.service_id = s.id
+                JOIN users u ON a.customer_id = u.id
+                WHERE a.location_id = ?
+                AND a.appointment_datetime BETWEEN ? AND ?
+                AND a.status IN ({placeholders})
+                {keyset}
+                ORDER BY a.appointment_datetime, a.id
+                LIMIT ?
+            """, (*params, limit + 1))
+            rows = db_cursor.fetchall()
+            db_cursor.close()
+        
+        appointments = [
+            {
+                'id': row[0],
+                'customer_name': row[1],
+                'barber_name': row[2],
+                'service_name': row[3],
+                'appointment_datetime': row[4],
+                'duration': row[5],
+                'price': row[6],
+                'status': row[7]
+            }
+            for row in rows[:limit]
+        ]
+        
+        next_cursor = None
+        if len(rows) > limit:
+            last = appointments[-1]
+            next_cursor = f"{last['appointment_datetime']}|{last['id']}"
+        
+        return {
+            'success': True,
+            'location_id': location_id,
+            'appointments': appointments,
+            'next_cursor': next_cursor
         }
     
     def disconnect_barber_calendar(self, user_id: int, barber_id: int) -> Dict[str, Any]:
@@ -441,18 +656,16 @@ class RoleBasedCalendarManager:
                 'message': 'Insufficient permissions to disconnect calendar'
             }
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE calendar_sync 
-            SET sync_status = 'disabled', updated_at = CURRENT_TIMESTAMP
-            WHERE barber_id = ?
-        """, (barber_id,))
-        
-        rows_affected = cursor.rowcount
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE calendar_sync 
+                SET sync_status = 'disabled', updated_at = CURRENT_TIMESTAMP
+                WHERE barber_id = ?
+            """, (barber_id,))
+            
+            rows_affected = cursor.rowcount
+            cursor.close()
         
         if rows_affected > 0:
             return {
@@ -20,6 +20,7 @@ from enum import Enum
 
 # Import memory manager
 from services.memory_manager import memory_manager
+from services.feedback_sentiment import score_sentiment
 
 # Initialize Supabase client
 supabase_url = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
@@ -229,72 +230,30 @@ async def get_current_user_barbershop(credentials: HTTPAuthorizationCredentials
 
 def analyze_sentiment(text: str) -> tuple[SentimentScore, float]:
     """Basic sentiment analysis using keyword matching"""
-    if not text:
-        return SentimentScore.NEUTRAL, 0.5
+    label, confidence = score_sentiment(text)
+    return SentimentScore(label), confidence
+
+def get_feedback_rollups(barbershop_id: str, date_from: date, date_to: date) -> List[Dict[str, Any]]:
+    """Daily NPS and sentiment buckets for the period, both dates inclusive"""
+    rollup_response = supabase.table('customer_feedback_daily_rollups')\
+        .select('*')\
+        .eq('barbershop_id', barbershop_id)\
+        .gte('day', date_from.isoformat())\
+        .lte('day', date_to.isoformat())\
+        .order('day')\
+        .execute()
     
-    text_lower = text.lower()
-    
-    # Positive keywords
-    positive_keywords = [
-        "excellent", "amazing", "fantastic", "outstanding", "perfect", "love", "great",
-        "wonderful", "awesome", "brilliant", "superb", "exceptional", "pleased", "satisfied",
-        "happy", "thrilled", "impressed", "recommend", "professional", "clean", "friendly"
-    ]
-    
-    # Negative keywords  
-    negative_keywords = [
-        "terrible", "awful", "horrible", "disgusting", "worst", "hate", "disappointed",
-        "unsatisfied", "unprofessional", "dirty", "rude", "slow", "expensive", "bad",
-        "poor", "unacceptable", "frustrated", "angry", "upset", "complaint"
-    ]
-    
-    positive_count = sum(1 for word in positive_keywords if word in text_lower)
-    negative_count = sum(1 for word in negative_keywords if word in text_lower)
-    
-    total_words = len(text_lower.split())
-    
-    if positive_count > negative_count:
-        if positive_count >= 3 or positive_count / total_words > 0.1:
-            return SentimentScore.VERY_POSITIVE, min(0.8 + (positive_count * 0.05), 0.95)
-        else:
-            return SentimentScore.POSITIVE, 0.6 + (positive_count * 0.05)
-    elif negative_count > positive_count:
-        if negative_count >= 3 or negative_count / total_words > 0.1:
-            return SentimentScore.VERY_NEGATIVE, max(0.2 - (negative_count * 0.05), 0.05)
-        else:
-            return SentimentScore.NEGATIVE, 0.4 - (negative_count * 0.05)
-    else:
-        return SentimentScore.NEUTRAL, 0.5
+    return rollup_response.data or []
 
 async def calculate_nps_score(barbershop_id: str, date_from: date, date_to: date) -> Dict[str, Any]:
-    """Calculate NPS score for given period"""
+    """Calculate NPS score for given period from the daily rollups"""
     try:
-        # Get NPS responses for period
-        nps_response = supabase.table('customer_feedback')\
-            .select('nps_score')\
-            .eq('barbershop_id', barbershop_id)\
-            .eq('feedback_type', 'nps')\
-            .gte('created_at', date_from.isoformat())\
-            .lte('created_at', date_to.isoformat())\
-            .execute()
-        
-        responses = nps_response.data or []
-        
-        if not responses:
-            return {
-                "total_responses": 0,
-                "nps_score": 0,
-                "promoters": 0,
-                "passives": 0, 
-                "detractors": 0
-            }
+        buckets = get_feedback_rollups(barbershop_id, date_from, date_to)
         
-        scores = [r['nps_score'] for r in responses if r['nps_score'] is not None]
-        total = len(scores)
-        
-        promoters = len([s for s in scores if s >= 9])
-        passives = len([s for s in scores if 7 <= s <= 8])
-        detractors = len([s for s in scores if s <= 6])
+        promoters = sum(bucket['nps_promoters'] for bucket in buckets)
+        passives = sum(bucket['nps_passives'] for bucket in buckets)
+        detractors = sum(bucket['nps_detractors'] for bucket in buckets)
+        total = promoters + passives + detractors
         
         nps_score = ((promoters - detractors) / total) * 100 if total > 0 else 0
         
@@ -346,8 +305,7 @@ async def submit_feedback(
             "comment": feedback.comment,
             "service_aspects": feedback.service_aspects,
             "would_recommend": feedback.would_recommend,
-            "sentiment_score": sentiment_score.value,
-            "sentiment_confidence": sentiment_confidence,
+            "sentiment_label": sentiment_score.value,
             "status": FeedbackStatus.PENDING.value,
             "anonymous": feedback.anonymous,
             "metadata": feedback.metadata,
@@ -367,6 +325,8 @@ async def submit_feedback(
         
         response_data = result.data[0]
         response_data.update({
+            "sentiment_score": sentiment_score.value,
+            "sentiment_confidence": sentiment_confidence,
             "customer_name": customer_info.data[0]['name'] if customer_info.data else None,
             "customer_email": customer_info.data[0]['email'] if customer_info.data and not feedback.anonymous else None,
             "barber_name": barber_info.data[0]['name'] if barber_info and barber_info.data else None
@@ -422,6 +382,8 @@ async def list_feedback(
             barber_info = supabase.table('barbers').select('name').eq('id', feedback['barber_id']).execute() if feedback['barber_id'] else None
             
             feedback.update({
+                # The numeric sentiment_score column is not the label the response reports
+                "sentiment_score": feedback.get('sentiment_label'),
                 "customer_name": customer_info.data[0]['name'] if customer_info.data else None,
                 "customer_email": customer_info.data[0]['email'] if customer_info.data and not feedback['anonymous'] else None,
                 "barber_name": barber_info.data[0]['name'] if barber_info and barber_info.data else None
@@ -568,18 +530,18 @@ async def get_sentiment_analysis(
         if not date_from:
             date_from = date_to - timedelta(days=30)
         
-        # Get feedback with comments
-        feedback_response = supabase.table('customer_feedback')\
-            .select('sentiment_score, comment, created_at')\
-            .eq('barbershop_id', user_context["barbershop_id"])\
-            .gte('created_at', date_from.isoformat())\
-            .lte('created_at', date_to.isoformat())\
-            .not_.is_('comment', 'null')\
-            .execute()
-        
-        feedback_data = feedback_response.data or []
-        
-        if not feedback_data:
+        # Sentiment of feedback with comments, by day
+        sentiment_over_time = []
+        sentiment_counts = {}
+        for bucket in get_feedback_rollups(user_context["barbershop_id"], date_from, date_to):
+            day_counts = {sentiment.value: bucket[f"sentiment_{sentiment.value}"]
+                          for sentiment in SentimentScore if bucket[f"sentiment_{sentiment.value}"]}
+            if day_counts:
+                sentiment_over_time.append({"date": bucket['day'], "sentiment_distribution": day_counts})
+            for sentiment, count in day_counts.items():
+                sentiment_counts[sentiment] = sentiment_counts.get(sentiment, 0) + count
+        
+        if not sentiment_counts:
             return SentimentAnalysis(
                 overall_sentiment=SentimentScore.NEUTRAL,
                 sentiment_distribution={},
@@ -589,14 +551,7 @@ async def get_sentiment_analysis(
                 sentiment_over_time=[]
             )
         
-        # Calculate sentiment distribution
-        sentiment_counts = {}
-        for feedback in feedback_data:
-            sentiment = feedback['sentiment_score']
-            sentiment_counts[sentiment] = sentiment_counts.get(sentiment, 0) + 1
-        
         # Determine overall sentiment
-        total_feedback = len(feedback_data)
         positive_count = sentiment_counts.get('positive', 0) + sentiment_counts.get('very_positive', 0)
         negative_count = sentiment_counts.get('negative', 0) + sentiment_counts.get('very_negative', 0)
         
@@ -613,7 +568,7 @@ async def get_sentiment_analysis(
             positive_keywords=["great", "excellent", "professional", "clean", "friendly"],
             negative_keywords=["slow", "expensive", "rude", "dirty", "disappointing"],
             trending_topics=[],
-            sentiment_over_time=[]
+            sentiment_over_time=sentiment_over_time
         )
     
     except Exception as e:
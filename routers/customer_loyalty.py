@@ -20,6 +20,7 @@ import uuid
 # Import memory manager and services
 from services.memory_manager import memory_manager
 from services.loyalty_program_service import LoyaltyProgramService
+from services.loyalty_expiry_sweeper import LoyaltyExpirySweeper
 
 # Initialize Supabase client
 supabase_url = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
@@ -35,10 +36,22 @@ redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=T
 # Initialize services
 loyalty_service = LoyaltyProgramService(supabase, redis_client)
 
+expiry_sweeper = LoyaltyExpirySweeper(loyalty_service)
+
 # Create router
 router = APIRouter(prefix="/loyalty", tags=["Customer Loyalty"])
 security = HTTPBearer()
 
+@router.on_event("startup")
+async def start_expiry_sweeper():
+    # Disable on all but one replica when running several
+    if os.getenv("LOYALTY_EXPIRY_SWEEPER_ENABLED", "true").lower() == "true":
+        await expiry_sweeper.start()
+
+@router.on_event("shutdown")
+async def stop_expiry_sweeper():
+    await expiry_sweeper.stop()
+
 # ============================================
 # PYDANTIC MODELS
 # ============================================
@@ -465,8 +478,8 @@ async def check_tier_upgrade(
 @router.post("/tiers/upgrade/{customer_id}")
 async def upgrade_customer_tier(
     customer_id: str,
-    new_tier_id: str = Query(...),
     background_tasks: BackgroundTasks,
+    new_tier_id: str = Query(...),
     user_context = Depends(get_current_user_barbershop)
 ):
     """Manually upgrade customer to new tier"""
@@ -592,8 +605,8 @@ async def get_referrals(
 @router.put("/referrals/{referral_id}/status")
 async def update_referral_status(
     referral_id: str,
-    new_status: str = Query(...),
     background_tasks: BackgroundTasks,
+    new_status: str = Query(...),
     user_context = Depends(get_current_user_barbershop)
 ):
     """Update referral status and process rewards if qualified"""
@@ -761,10 +774,10 @@ async def process_birthday_bonuses(
 
 @router.post("/integration/appointment-completed")
 async def handle_appointment_completed(
+    background_tasks: BackgroundTasks,
     appointment_id: str = Query(...),
     customer_id: str = Query(...),
     service_amount: Decimal = Query(...),
-    background_tasks: BackgroundTasks,
     user_context = Depends(get_current_user_barbershop)
 ):
     """Handle appointment completion and award loyalty points"""
@@ -792,10 +805,10 @@ async def handle_appointment_completed(
 
 @router.post("/integration/review-submitted")
 async def handle_review_submitted(
+    background_tasks: BackgroundTasks,
     customer_id: str = Query(...),
     appointment_id: str = Query(...),
     rating: int = Query(..., ge=1, le=5),
-    background_tasks: BackgroundTasks,
     user_context = Depends(get_current_user_barbershop)
 ):
     """Handle review submission and award bonus points"""
@@ -827,9 +840,9 @@ async def handle_review_submitted(
 
 @router.post("/bulk/enroll-customers")
 async def bulk_enroll_customers(
+    background_tasks: BackgroundTasks,
     program_id: str = Query(...),
     customer_ids: List[str] = Query(...),
-    background_tasks: BackgroundTasks,
     user_context = Depends(get_current_user_barbershop)
 ):
     """Bulk enroll customers into loyalty program"""
@@ -856,11 +869,11 @@ async def bulk_enroll_customers(
 
 @router.post("/bulk/award-points")
 async def bulk_award_points(
+    background_tasks: BackgroundTasks,
     customer_ids: List[str] = Query(...),
     points_amount: int = Query(...),
     reason: str = Query(...),
     program_id: Optional[str] = Query(default=None),
-    background_tasks: BackgroundTasks,
     user_context = Depends(get_current_user_barbershop)
 ):
     """Bulk award points to multiple customers"""
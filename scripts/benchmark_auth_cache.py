@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Auth lookup benchmark for 6FB AI Agent System
+Compares p50/p99 of the session + user lookup done by get_current_user
+with and without the in-process auth cache
+"""
+
+import os
+import secrets
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.auth_cache import AuthCache
+
+USERS = 1000
+REQUESTS = 20000
+
+
+def setup_database(path: str):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("""
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            shop_name TEXT,
+            is_active BOOLEAN DEFAULT 1
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE sessions (
+            token TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            expires_at TIMESTAMP NOT NULL
+        )
+    """)
+    tokens = []
+    for i in range(1, USERS + 1):
+        conn.execute("INSERT INTO users (id, email, shop_name) VALUES (?, ?, ?)",
+                     (i, f"user{i}@example.com", f"Shop {i}"))
+        jti = secrets.token_urlsafe(16)
+        conn.execute("INSERT INTO sessions (token, user_id, expires_at) VALUES (?, ?, datetime('now', '+1 day'))",
+                     (jti, i))
+        tokens.append((jti, i))
+    conn.commit()
+    return conn, tokens
+
+
+def lookup(conn, jti: str, user_id: int) -> dict:
+    """Same two queries get_current_user runs on a cache miss"""
+    session = conn.execute(
+        "SELECT user_id FROM sessions WHERE token = ? AND expires_at > datetime('now')", (jti,)
+    ).fetchone()
+    if not session or session["user_id"] != user_id:
+        raise ValueError("revoked")
+    user = conn.execute(
+        "SELECT id, email, shop_name, is_active FROM users WHERE id = ? AND is_active = 1", (user_id,)
+    ).fetchone()
+    return dict(user)
+
+
+def run(conn, tokens, cache=None):
+    timings = []
+    for n in range(REQUESTS):
+        jti, user_id = tokens[n % len(tokens)]
+        start = time.perf_counter()
+        user = cache.get(jti) if cache else None
+        if user is None:
+            user = lookup(conn, jti, user_id)
+            if cache:
+                cache.set(jti, user)
+        timings.append((time.perf_counter() - start) * 1_000_000)
+    timings.sort()
+    return {
+        "p50_us": statistics.median(timings),
+        "p99_us": timings[int(len(timings) * 0.99) - 1],
+    }
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn, tokens = setup_database(os.path.join(tmp, "auth_bench.db"))
+        before = run(conn, tokens)
+        after = run(conn, tokens, AuthCache(ttl_seconds=60))
+        conn.close()
+
+    print(f"auth lookup without cache: p50={before['p50_us']:.1f}us p99={before['p99_us']:.1f}us")
+    print(f"auth lookup with cache:    p50={after['p50_us']:.1f}us p99={after['p99_us']:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
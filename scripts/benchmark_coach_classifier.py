@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Message classification benchmark for the AgenticBusinessCoach
+Compares the previous per-list substring scans against the precompiled
+KeywordClassifier on a corpus of typical owner chat messages
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agentic_coach_design import DEFAULT_COACH_VOCABULARY, KeywordClassifier
+
+ROUNDS = 200
+
+CORPUS = [
+    "I want to increase my revenue but I'm not sure if I should raise prices or focus on getting more customers. What do you think?",
+    "We're struggling with no-shows on Saturdays, bookings are a mess and my barbers are frustrated",
+    "How do I hire a new barber and get them trained quickly without losing clients?",
+    "Thinking about opening a new location next year, what should my plan look like?",
+    "Cash flow crisis - rent is due and we are desperate, need help asap",
+    "What's a good loyalty program to keep clients coming back every 3 weeks?",
+    "ok thanks",
+    "Can you walk me through pricing for beard trims vs fades? Competitors charge $35",
+    "My schedule has big gaps on Tuesday and Wednesday afternoons, how do I fill them?",
+    "Our Google reviews dropped to 4.1 stars after a bad weekend, what should I do about it?",
+    "Is it worth franchising or should we just expand the current shop with two more chairs?",
+    "Staff keep showing up late and it's hurting the workflow in the mornings",
+    "what marketing works best for attracting college students",
+    "Give me a 90 day strategy to hit $40k a month, our goals for next quarter are aggressive",
+    "Sales of retail products are flat, pomade and beard oil mostly sit on the shelf",
+]
+
+MESSAGES = [random.Random(seed).choice(CORPUS) for seed in range(2000)]
+
+
+def legacy_classify(message):
+    """The any(word in message) scans the coach used before KeywordClassifier"""
+    message_lower = message.lower()
+    intents = [intent for intent, words in DEFAULT_COACH_VOCABULARY["intents"].items()
+               if any(word in message_lower for word in words)] or ["general_business_advice"]
+    urgency = "low"
+    for level, words in DEFAULT_COACH_VOCABULARY["urgency"].items():
+        if any(word in message_lower for word in words):
+            urgency = level
+            break
+    return intents, urgency
+
+
+def measure(classify):
+    for message in MESSAGES[:200]:  # warm up
+        classify(message)
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for message in MESSAGES:
+            classify(message)
+        timings.append((time.perf_counter() - start) / len(MESSAGES) * 1_000_000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    classifier = KeywordClassifier()
+    differing = [message for message in CORPUS
+                 if legacy_classify(message) != (classifier.classify(message).intents,
+                                                 classifier.classify(message).urgency)]
+
+    legacy = measure(legacy_classify)
+    compiled = measure(classifier.classify)
+
+    # Vocabulary growth: legacy cost scales with keyword count, the table does not
+    large_vocabulary = {
+        "intents": {f"{intent}_{n}": [f"{word}{n}" for word in words] + words
+                    for n in range(10)
+                    for intent, words in DEFAULT_COACH_VOCABULARY["intents"].items()},
+        "domains": {},
+    }
+    large = KeywordClassifier(large_vocabulary)
+
+    def legacy_large(message):
+        message_lower = message.lower()
+        return [intent for intent, words in large_vocabulary["intents"].items()
+                if any(word in message_lower for word in words)]
+
+    legacy_10x = measure(legacy_large)
+    compiled_10x = measure(large.classify)
+
+    print(f"messages with different classifications: {len(differing)}/{len(CORPUS)}")
+    for message in differing:
+        print(f"  {message!r}")
+    print(f"substring scans:          p50={legacy[0]:.2f}us p99={legacy[1]:.2f}us")
+    print(f"keyword table:            p50={compiled[0]:.2f}us p99={compiled[1]:.2f}us")
+    print(f"substring scans, 10x vocab: p50={legacy_10x[0]:.2f}us p99={legacy_10x[1]:.2f}us")
+    print(f"keyword table, 10x vocab:   p50={compiled_10x[0]:.2f}us p99={compiled_10x[1]:.2f}us")
+
+
+if __name__ == "__main__":
+    main()
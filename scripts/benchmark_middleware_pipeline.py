@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Middleware overhead benchmark for 6FB AI Agent System
+Compares per-request overhead of the previous stacked middleware chain
+against the composed RequestPipelineMiddleware on a trivial endpoint
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+
+from middleware.input_validation import InputValidationMiddleware
+from middleware.rate_limiting import RateLimitMiddleware
+from middleware.request_pipeline import RequestPipelineMiddleware
+from middleware.security_headers import SecurityHeadersMiddleware, SecurityReportingMiddleware
+from services.memory_manager import memory_manager
+
+REQUESTS = 5000
+
+
+def build_bare_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/dashboard/stats")
+    async def stats():
+        return {"ok": True}
+
+    return app
+
+
+def build_legacy_app() -> FastAPI:
+    """The middleware stack fastapi_backend used before the composed pipeline"""
+    app = build_bare_app()
+
+    @app.middleware("http")
+    async def memory_management_middleware(request, call_next):
+        return await call_next(request)
+
+    @app.middleware("http")
+    async def track_metrics(request, call_next):
+        # The chain sampled psutil on every request before stats were background-sampled
+        memory_stats = memory_manager.sample_memory_stats()
+        response = await call_next(request)
+        if memory_stats.memory_pressure > memory_manager.memory_threshold:
+            pass
+        return response
+
+    app.add_middleware(SecurityHeadersMiddleware, environment="production")
+    app.add_middleware(SecurityReportingMiddleware)
+    app.add_middleware(InputValidationMiddleware)
+    app.add_middleware(RateLimitMiddleware, enabled=False)
+    return app
+
+
+def build_pipeline_app() -> FastAPI:
+    app = build_bare_app()
+    app.add_middleware(RequestPipelineMiddleware, environment="production", rate_limit_enabled=False)
+    return app
+
+
+async def call(app, path: str = "/api/v1/dashboard/stats"):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "https", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 5000), "server": ("localhost", 443),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def measure(app):
+    for _ in range(200):  # warm up
+        await call(app)
+    timings = []
+    for _ in range(REQUESTS):
+        start = time.perf_counter()
+        await call(app)
+        timings.append((time.perf_counter() - start) * 1_000_000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+async def main():
+    bare = await measure(build_bare_app())
+    legacy = await measure(build_legacy_app())
+    pipeline = await measure(build_pipeline_app())
+
+    print(f"no middleware:     p50={bare[0]:.1f}us p99={bare[1]:.1f}us")
+    print(f"stacked chain:     p50={legacy[0]:.1f}us p99={legacy[1]:.1f}us "
+          f"(overhead {legacy[0] - bare[0]:.1f}us)")
+    print(f"composed pipeline: p50={pipeline[0]:.1f}us p99={pipeline[1]:.1f}us "
+          f"(overhead {pipeline[0] - bare[0]:.1f}us)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
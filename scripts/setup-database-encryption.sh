@@ -159,8 +159,9 @@ def test_encryption():
             return False
         
         # Test searchable encryption
-        search_hash = encryption.create_search_hash(test_data, "email")
-        if len(search_hash) == 32:  # Expected length
+        search_hash = encryption.create_search_hash(test_data, "email", "users")
+        if (encryption.is_current_search_hash(search_hash) and
+                search_hash == encryption.create_search_hash(test_data.upper(), "email", "users")):
             print("✓ Searchable encryption test passed")
         else:
             print("✗ Searchable encryption test failed")
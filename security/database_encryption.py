@@ -14,6 +14,7 @@ from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from contextlib import asynccontextmanager
 import json
 import hashlib
+import hmac
 
 logger = logging.getLogger(__name__)
 
@@ -25,14 +26,25 @@ class DatabaseEncryption:
     - AES-256-GCM encryption for maximum security
     - Key derivation using PBKDF2 with SHA-256
     - Automatic field-level encryption/decryption
-    - Searchable encrypted fields (for specific use cases)
+    - Searchable encrypted fields via HMAC blind indexes (indexed equality lookups)
+    - Batch encryption/decryption for bulk imports and exports
     - Key rotation support
     """
     
+    # Version prefix for blind index tokens; rows without it predate the HMAC scheme
+    SEARCH_TOKEN_PREFIX = 'bi2:'
+    
     def __init__(self):
         self.encryption_key = self._get_encryption_key()
         self.fernet = Fernet(self.encryption_key)
         
+        # Derived keys are computed once; the per-call derivation dominated searchable encryption
+        key_bytes = base64.b64decode(self.encryption_key)
+        deterministic_key = hashlib.sha256(key_bytes + b'searchable').digest()[:32]
+        self.searchable_fernet = Fernet(base64.urlsafe_b64encode(deterministic_key))
+        self._master_key_bytes = key_bytes
+        self._search_keys: Dict[str, bytes] = {}
+        
         # Fields that should be encrypted
         self.encrypted_fields = {
             'users': [
@@ -63,11 +75,14 @@ class DatabaseEncryption:
             ]
         }
         
-        # Fields that support searchable encryption (using deterministic encryption)
+        # Fields that support searchable encryption (blind index in <field>_search_hash)
         self.searchable_fields = {
             'users': ['email'],  # Need to search by email for login
         }
         
+        # Per-table field plans used by the batch APIs
+        self._field_plans: Dict[str, List[tuple]] = {}
+        
         logger.info("Database encryption initialized with AES-256-GCM")
     
     def _get_encryption_key(self) -> bytes:
@@ -162,32 +177,99 @@ class DatabaseEncryption:
     
     def _encrypt_searchable(self, value: str) -> str:
         """
-        Encrypt value for searchable fields using deterministic encryption
-        Same input always produces same output for search capability
-        """
+        Encrypt value for searchable fields
         
-        # Use HMAC-SHA256 for deterministic encryption
-        key_bytes = base64.b64decode(self.encryption_key)
-        value_hash = hashlib.pbkdf2_hmac('sha256', value.encode(), key_bytes, 10000)
-        
-        # Add some entropy while maintaining determinism
-        deterministic_key = hashlib.sha256(key_bytes + b'searchable').digest()[:32]
-        fernet_det = Fernet(base64.urlsafe_b64encode(deterministic_key))
+        Fernet uses a random IV, so the ciphertext is not deterministic; lookups go
+        through the blind index produced by create_search_hash instead.
+        """
         
-        encrypted = fernet_det.encrypt(value.encode('utf-8'))
+        encrypted = self.searchable_fernet.encrypt(value.encode('utf-8'))
         return base64.b64encode(encrypted).decode('utf-8')
     
     def _decrypt_searchable(self, encrypted_value: str) -> str:
         """Decrypt searchable encrypted value"""
         
-        key_bytes = base64.b64decode(self.encryption_key)
-        deterministic_key = hashlib.sha256(key_bytes + b'searchable').digest()[:32]
-        fernet_det = Fernet(base64.urlsafe_b64encode(deterministic_key))
-        
         encrypted_bytes = base64.b64decode(encrypted_value.encode('utf-8'))
-        decrypted = fernet_det.decrypt(encrypted_bytes)
+        decrypted = self.searchable_fernet.decrypt(encrypted_bytes)
         return decrypted.decode('utf-8')
     
+    def _get_field_plan(self, table: str) -> List[tuple]:
+        """(field, encrypt_fn, decrypt_fn) for every encrypted field of a table, built once"""
+        
+        plan = self._field_plans.get(table)
+        if plan is None:
+            plan = []
+            for field in self.encrypted_fields.get(table, []):
+                if self.is_searchable(table, field):
+                    plan.append((field, self._encrypt_searchable, self._decrypt_searchable))
+                else:
+                    plan.append((field, self._encrypt_standard, self._decrypt_standard))
+            self._field_plans[table] = plan
+        return plan
+    
+    def _encrypt_standard(self, value: str) -> str:
+        return base64.b64encode(self.fernet.encrypt(value.encode('utf-8'))).decode('utf-8')
+    
+    def _decrypt_standard(self, encrypted_value: str) -> str:
+        return self.fernet.decrypt(base64.b64decode(encrypted_value.encode('utf-8'))).decode('utf-8')
+    
+    def encrypt_records(self, records: List[Dict[str, Any]], table: str,
+                        include_search_index: bool = True) -> List[Dict[str, Any]]:
+        """
+        Encrypt a batch of records for bulk inserts and imports
+        
+        The field plan, Fernet instances and blind index keys are resolved once
+        for the whole batch. Search tokens for searchable fields are added as
+        <field>_search_hash when include_search_index is set.
+        """
+        
+        plan = self._get_field_plan(table)
+        searchable = self.searchable_fields.get(table, []) if include_search_index else []
+        if not plan and not searchable:
+            return [record.copy() for record in records]
+        
+        search_keys = [(field, self._get_search_key(table, field)) for field in searchable]
+        encrypted_records = []
+        
+        for record in records:
+            encrypted_record = record.copy()
+            for field, encrypt_fn, _ in plan:
+                value = encrypted_record.get(field)
+                if value:
+                    try:
+                        encrypted_record[field] = encrypt_fn(str(value))
+                    except Exception as e:
+                        logger.error(f"Failed to encrypt {table}.{field}: {e}")
+            for field, search_key in search_keys:
+                value = record.get(field)
+                if value:
+                    encrypted_record[f"{field}_search_hash"] = self._blind_index(search_key, value)
+            encrypted_records.append(encrypted_record)
+        
+        return encrypted_records
+    
+    def decrypt_records(self, records: List[Dict[str, Any]], table: str) -> List[Dict[str, Any]]:
+        """Decrypt a batch of records for bulk exports"""
+        
+        plan = self._get_field_plan(table)
+        if not plan:
+            return [dict(record) for record in records]
+        
+        decrypted_records = []
+        for record in records:
+            decrypted_record = dict(record)
+            for field, _, decrypt_fn in plan:
+                value = decrypted_record.get(field)
+                if value:
+                    try:
+                        decrypted_record[field] = decrypt_fn(value)
+                    except Exception as e:
+                        logger.error(f"Failed to decrypt {table}.{field}: {e}")
+                        # Leave field encrypted rather than failing
+            decrypted_records.append(decrypted_record)
+        
+        return decrypted_records
+    
     def encrypt_record(self, record: Dict[str, Any], table: str) -> Dict[str, Any]:
         """
         Encrypt all sensitive fields in a database record
@@ -250,27 +332,46 @@ class DatabaseEncryption:
         
         return decrypted_record
     
-    def create_search_hash(self, value: str, field: str) -> str:
+    def _get_search_key(self, table: str, field: str) -> bytes:
+        """Per-field blind index key, derived once from the master key and cached"""
+        
+        cache_key = f"{table}.{field}"
+        search_key = self._search_keys.get(cache_key)
+        if search_key is None:
+            search_key = hmac.new(
+                self._master_key_bytes,
+                f"blind-index:{cache_key}".encode('utf-8'),
+                hashlib.sha256
+            ).digest()
+            self._search_keys[cache_key] = search_key
+        return search_key
+    
+    def _blind_index(self, search_key: bytes, value: Any) -> str:
+        """HMAC-SHA256 search token for a normalised (trimmed, case-insensitive) value"""
+        
+        normalized = str(value).strip().lower().encode('utf-8')
+        digest = hmac.new(search_key, normalized, hashlib.sha256).digest()
+        return self.SEARCH_TOKEN_PREFIX + base64.urlsafe_b64encode(digest).decode('utf-8').rstrip('=')
+    
+    def create_search_hash(self, value: str, field: str, table: str) -> str:
         """
-        Create a searchable hash for encrypted fields
-        Used for searching encrypted data without decryption
+        Create the blind index token for a searchable encrypted field
+        
+        Tokens are stored in <field>_search_hash (indexed), so a lookup by value is
+        an indexed equality query on the token rather than a scan and decrypt.
+        The key is per table and field, so the same value in two columns never
+        shares a token.
         """
         
         if not value:
             return ""
         
-        key_bytes = base64.b64decode(self.encryption_key)
-        search_key = hashlib.sha256(key_bytes + field.encode()).digest()
-        
-        # Create consistent hash for searching
-        search_hash = hashlib.pbkdf2_hmac(
-            'sha256', 
-            value.lower().encode(),  # Case-insensitive search
-            search_key, 
-            50000
-        )
+        return self._blind_index(self._get_search_key(table, field), value)
+    
+    def is_current_search_hash(self, search_hash: Optional[str]) -> bool:
+        """Check if a stored token uses the current blind index scheme"""
         
-        return base64.b64encode(search_hash).decode('utf-8')[:32]  # Truncate for indexing
+        return bool(search_hash) and search_hash.startswith(self.SEARCH_TOKEN_PREFIX)
     
     def supports_encryption(self, table: str, field: str) -> bool:
         """Check if a table.field combination supports encryption"""
@@ -323,19 +424,17 @@ class EncryptedDatabaseService:
     async def insert_record(self, table: str, record: Dict[str, Any]) -> Any:
         """Insert record with automatic field encryption"""
         
-        encrypted_record = self.encryption.encrypt_record(record, table)
-        
-        # Add search hashes for searchable encrypted fields
-        if table in self.encryption.searchable_fields:
-            for field in self.encryption.searchable_fields[table]:
-                if field in record and record[field]:
-                    search_field = f"{field}_search_hash"
-                    encrypted_record[search_field] = self.encryption.create_search_hash(
-                        record[field], field
-                    )
-        
+        encrypted_record = self.encryption.encrypt_records([record], table)[0]
         return await self.db.insert(table, encrypted_record)
     
+    async def insert_records(self, table: str, records: List[Dict[str, Any]]) -> Any:
+        """Bulk insert records, encrypting and indexing the whole batch in one pass"""
+        
+        encrypted_records = self.encryption.encrypt_records(records, table)
+        if hasattr(self.db, 'insert_many'):
+            return await self.db.insert_many(table, encrypted_records)
+        return [await self.db.insert(table, record) for record in encrypted_records]
+    
     async def get_record(self, table: str, record_id: Any) -> Optional[Dict[str, Any]]:
         """Get record with automatic field decryption"""
         
@@ -354,28 +453,70 @@ class EncryptedDatabaseService:
         if not self.encryption.is_searchable(table, field):
             raise ValueError(f"Field {table}.{field} does not support searchable encryption")
         
-        search_hash = self.encryption.create_search_hash(value, field)
+        search_hash = self.encryption.create_search_hash(value, field, table)
         search_field = f"{field}_search_hash"
         
+        # Indexed equality lookup on the blind index column
         records = await self.db.query(table, {search_field: search_hash})
         
-        # Decrypt all returned records
-        return [self.encryption.decrypt_record(record, table) for record in records]
+        return self.encryption.decrypt_records(records, table)
     
-    async def update_record(self, table: str, record_id: Any, updates: Dict[str, Any]) -> bool:
-        """Update record with automatic field encryption"""
+    async def export_records(self, table: str, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Fetch and decrypt records in bulk (exports, reports)"""
         
-        encrypted_updates = self.encryption.encrypt_record(updates, table)
+        records = await self.db.query(table, filters or {})
+        return self.encryption.decrypt_records(records, table)
+    
+    async def rebuild_search_index(self, table: str, id_field: str = 'id', batch_size: int = 500) -> int:
+        """
+        Backfill blind index tokens for rows written before the HMAC scheme
+        
+        Reads the table in `batch_size` pages ordered by `id_field` and writes
+        each page's updates with one update_many call when the database
+        supports it. Returns the number of rows updated.
+        """
         
-        # Update search hashes if needed
-        if table in self.encryption.searchable_fields:
-            for field in self.encryption.searchable_fields[table]:
-                if field in updates and updates[field]:
+        searchable = self.encryption.searchable_fields.get(table, [])
+        if not searchable:
+            return 0
+        
+        updated = 0
+        offset = 0
+        while True:
+            # Updates only touch the token columns, so offsets stay stable across pages
+            records = await self.db.query(table, {}, order_by=id_field, limit=batch_size, offset=offset)
+            if not records:
+                break
+            offset += len(records)
+            
+            page_updates = []
+            for record in self.encryption.decrypt_records(records, table):
+                updates = {}
+                for field in searchable:
                     search_field = f"{field}_search_hash"
-                    encrypted_updates[search_field] = self.encryption.create_search_hash(
-                        updates[field], field
-                    )
+                    if record.get(field) and not self.encryption.is_current_search_hash(record.get(search_field)):
+                        updates[search_field] = self.encryption.create_search_hash(record[field], field, table)
+                if updates:
+                    page_updates.append((record[id_field], updates))
+            
+            if page_updates:
+                if hasattr(self.db, 'update_many'):
+                    await self.db.update_many(table, page_updates)
+                else:
+                    for record_id, updates in page_updates:
+                        await self.db.update(table, record_id, updates)
+                updated += len(page_updates)
+            
+            if len(records) < batch_size:
+                break
+        
+        logger.info(f"Rebuilt blind index for {updated} {table} records")
+        return updated
+    
+    async def update_record(self, table: str, record_id: Any, updates: Dict[str, Any]) -> bool:
+        """Update record with automatic field encryption"""
         
+        encrypted_updates = self.encryption.encrypt_records([updates], table)[0]
         return await self.db.update(table, record_id, encrypted_updates)
 
 # Global encryption service instance
@@ -12,10 +12,10 @@ from dataclasses import dataclass
 from enum import Enum
 import re
 
-import openai
-import anthropic
 from urllib.parse import quote
 
+from llm_gateway import LLMGateway
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -74,9 +74,9 @@ class GeneratedContent:
 class AIBlogContentGenerator:
     """AI-powered blog content generation with local SEO"""
     
-    def __init__(self, openai_api_key: str, anthropic_api_key: str):
-        self.openai_client = openai.OpenAI(api_key=openai_api_key)
-        self.anthropic_client = anthropic.Anthropic(api_key=anthropic_api_key)
+    def __init__(self, openai_api_key: str, anthropic_api_key: str, llm_gateway: Optional[LLMGateway] = None):
+        # Provider clients, response cache and rate limits are shared with the other AI services
+        self.llm_gateway = llm_gateway or LLMGateway.shared(openai_api_key, anthropic_api_key)
     
     async def generate_blog_post(self, request: ContentRequest) -> GeneratedContent:
         """Generate comprehensive SEO-optimized blog post"""
@@ -390,17 +390,15 @@ class AIBlogContentGenerator:
     async def _call_openai_gpt(self, prompt: str, max_tokens: int = 1000) -> str:
         """Call OpenAI GPT API"""
         try:
-            response = await asyncio.to_thread(
-                self.openai_client.chat.completions.create,
+            return await self.llm_gateway.complete(
+                "openai",
+                prompt,
                 model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are an expert content marketer and SEO specialist for local businesses, particularly barbershops."},
-                    {"role": "user", "content": prompt}
-                ],
+                system="You are an expert content marketer and SEO specialist for local businesses, particularly barbershops.",
                 max_tokens=max_tokens,
-                temperature=0.7
+                temperature=0.7,
+                caller="ai_blog_generator"
             )
-            return response.choices[0].message.content
         except Exception as e:
             logger.error(f"OpenAI API error: {str(e)}")
             raise
@@ -408,15 +406,13 @@ class AIBlogContentGenerator:
     async def _call_anthropic_claude(self, prompt: str, max_tokens: int = 1000) -> str:
         """Call Anthropic Claude API"""
         try:
-            response = await asyncio.to_thread(
-                self.anthropic_client.messages.create,
+            return await self.llm_gateway.complete(
+                "anthropic",
+                prompt,
                 model="claude-3-sonnet-20240229",
                 max_tokens=max_tokens,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
+                caller="ai_blog_generator"
             )
-            return response.content[0].text
         except Exception as e:
             logger.error(f"Anthropic API error: {str(e)}")
             raise
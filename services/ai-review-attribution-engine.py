@@ -5,20 +5,38 @@ Analyzes Google My Business reviews to identify and credit specific barbers ment
 """
 
 import re
+import os
 import json
 import asyncio
 import logging
+from collections import defaultdict
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any, Callable
 from dataclasses import dataclass
 from enum import Enum
 import difflib
 from textblob import TextBlob
-import openai
-import anthropic
+
+from llm_gateway import LLMGateway
 
 logger = logging.getLogger(__name__)
 
+# Name mention patterns, compiled once for every review
+NAME_PATTERNS = [
+    re.compile(r'\b(?:ask for|see|with|by|from)\s+([A-Z][a-z]+)\b', re.IGNORECASE),
+    re.compile(r'\b([A-Z][a-z]+)\s+(?:cut|trimmed|styled|did|gave)\b', re.IGNORECASE),
+    re.compile(r'\b(?:barber|stylist)\s+([A-Z][a-z]+)\b', re.IGNORECASE),
+    re.compile(r'\b([A-Z][a-z]+)\s+(?:is|was)\s+(?:amazing|great|excellent|fantastic|awesome|perfect)\b', re.IGNORECASE)
+]
+CAPITALIZED_WORD_PATTERN = re.compile(r'\b[A-Z][a-z]+\b')
+
+# Capitalized words that aren't names
+COMMON_WORDS = frozenset({'The', 'This', 'That', 'They', 'Great', 'Amazing', 'Perfect', 'Excellent', 'Good', 'Best', 'Very', 'Really', 'Super', 'Highly'})
+
+EXACT_MATCH_CONFIDENCE = 95.0
+FUZZY_MATCH_MAX_CONFIDENCE = 85.0
+MIN_MATCH_CONFIDENCE = 70.0
+
 class AttributionConfidence(Enum):
     """Confidence levels for barber attribution"""
     LOW = "low"      # 0-40%
@@ -81,15 +99,80 @@ class ReviewAttribution:
     extracted_names: List[str]
     manual_override: bool = False
 
+class StaffNameIndex:
+    """
+    Name lookup for one barbershop's staff, built once and reused per review
+
+    Exact variants resolve through a hash map. Fuzzy candidates come from a
+    trigram index over the variants padded with two spaces on each side:
+    strings sharing no padded trigram have no common substring of length 3
+    and differ in their first and last characters, which caps their
+    SequenceMatcher ratio below 0.8 - under the 70/85 cut-off - so the
+    index never drops a match a full scan would have found.
+    """
+
+    def __init__(self, barbershop_staff: List[BarberProfile]):
+        self.variants: List[Tuple[BarberProfile, str]] = []
+        self.exact: Dict[str, List[int]] = defaultdict(list)
+        self.trigrams: Dict[str, List[int]] = defaultdict(list)
+        for barber in barbershop_staff:
+            for barber_name in barber.all_names:
+                variant_id = len(self.variants)
+                self.variants.append((barber, barber_name))
+                self.exact[barber_name].append(variant_id)
+                for trigram in self._trigrams(barber_name):
+                    self.trigrams[trigram].append(variant_id)
+        self._matches: Dict[str, List[Tuple[BarberProfile, str, float]]] = {}
+
+    @staticmethod
+    def _trigrams(name: str) -> set:
+        padded = f"  {name}  "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def match(self, name: str) -> List[Tuple[BarberProfile, str, float]]:
+        """(barber, matched variant, confidence) for every variant scoring at least 70"""
+        cached = self._matches.get(name)
+        if cached is not None:
+            return cached
+
+        candidates = set(self.exact.get(name, ()))
+        for trigram in self._trigrams(name):
+            candidates.update(self.trigrams.get(trigram, ()))
+
+        matches = []
+        matcher = difflib.SequenceMatcher(None, name)
+        for variant_id in sorted(candidates):
+            barber, barber_name = self.variants[variant_id]
+            if name == barber_name:
+                confidence = EXACT_MATCH_CONFIDENCE
+            else:
+                # Cheap upper bounds first; ratio() is quadratic in name length
+                matcher.set_seq2(barber_name)
+                if matcher.real_quick_ratio() * FUZZY_MATCH_MAX_CONFIDENCE < MIN_MATCH_CONFIDENCE:
+                    continue
+                if matcher.quick_ratio() * FUZZY_MATCH_MAX_CONFIDENCE < MIN_MATCH_CONFIDENCE:
+                    continue
+                confidence = matcher.ratio() * FUZZY_MATCH_MAX_CONFIDENCE
+            if confidence >= MIN_MATCH_CONFIDENCE:
+                matches.append((barber, barber_name, confidence))
+
+        self._matches[name] = matches
+        return matches
+
 class AIReviewAttributionEngine:
     """
     AI-powered engine for attributing Google My Business reviews to specific barbers
     Uses multiple NLP techniques and AI models for accurate attribution
     """
     
-    def __init__(self, openai_api_key: str, anthropic_api_key: str):
-        self.openai_client = openai.OpenAI(api_key=openai_api_key)
-        self.anthropic_client = anthropic.Anthropic(api_key=anthropic_api_key)
+    def __init__(self, openai_api_key: str, anthropic_api_key: str, max_ai_concurrency: Optional[int] = None,
+                 llm_gateway: Optional[LLMGateway] = None):
+        # Provider clients, response cache and rate limits are shared with the other AI services
+        self.llm_gateway = llm_gateway or LLMGateway.shared(openai_api_key, anthropic_api_key)
+        
+        # Caps in-flight AI verification calls across all reviews being analyzed
+        self.max_ai_concurrency = max_ai_concurrency or int(os.getenv('REVIEW_ATTRIBUTION_AI_CONCURRENCY', '5'))
+        self._ai_semaphore = asyncio.Semaphore(self.max_ai_concurrency)
         
         # Common barber-related keywords that increase attribution confidence
         self.barber_context_keywords = [
@@ -104,7 +187,8 @@ class AIReviewAttributionEngine:
             "recommend", "go to", "visited", "met with", "worked with"
         ]
     
-    async def analyze_review(self, review_text: str, review_id: str, barbershop_staff: List[BarberProfile]) -> ReviewAttribution:
+    async def analyze_review(self, review_text: str, review_id: str, barbershop_staff: List[BarberProfile],
+                             name_index: Optional[StaffNameIndex] = None) -> ReviewAttribution:
         """
         Analyze a single review to identify barber mentions and sentiment
         
@@ -112,6 +196,7 @@ class AIReviewAttributionEngine:
             review_text: The customer review text
             review_id: Unique identifier for the review
             barbershop_staff: List of barbers working at this barbershop
+            name_index: Prebuilt StaffNameIndex for barbershop_staff, reused across reviews
             
         Returns:
             ReviewAttribution with barber identification and confidence scoring
@@ -122,7 +207,7 @@ class AIReviewAttributionEngine:
         extracted_names = self._extract_names_from_text(review_text)
         
         # Step 2: Match extracted names against staff database
-        barber_matches = self._match_names_to_barbers(extracted_names, barbershop_staff)
+        barber_matches = self._match_names_to_barbers(extracted_names, barbershop_staff, name_index)
         
         # Step 3: Analyze sentiment
         sentiment, sentiment_score = self._analyze_sentiment(review_text)
@@ -170,63 +255,37 @@ class AIReviewAttributionEngine:
         names = []
         
         # Method 1: Regex patterns for common name mentions
-        name_patterns = [
-            r'\b(?:ask for|see|with|by|from)\s+([A-Z][a-z]+)\b',
-            r'\b([A-Z][a-z]+)\s+(?:cut|trimmed|styled|did|gave)\b',
-            r'\b(?:barber|stylist)\s+([A-Z][a-z]+)\b',
-            r'\b([A-Z][a-z]+)\s+(?:is|was)\s+(?:amazing|great|excellent|fantastic|awesome|perfect)\b'
-        ]
-        
-        for pattern in name_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            names.extend(matches)
+        for pattern in NAME_PATTERNS:
+            names.extend(pattern.findall(text))
         
         # Method 2: Look for capitalized words that might be names
         # Filter out common words that aren't names
-        common_words = {'The', 'This', 'That', 'They', 'Great', 'Amazing', 'Perfect', 'Excellent', 'Good', 'Best', 'Very', 'Really', 'Super', 'Highly'}
-        words = re.findall(r'\b[A-Z][a-z]+\b', text)
-        potential_names = [word for word in words if word not in common_words and len(word) > 2]
+        words = CAPITALIZED_WORD_PATTERN.findall(text)
+        potential_names = [word for word in words if word not in COMMON_WORDS and len(word) > 2]
         
         names.extend(potential_names)
         
         # Remove duplicates and return
         return list(set([name.lower() for name in names]))
     
-    def _match_names_to_barbers(self, extracted_names: List[str], barbershop_staff: List[BarberProfile]) -> List[Dict[str, Any]]:
-        """Match extracted names against barbershop staff using fuzzy matching"""
-        matches = []
+    def _match_names_to_barbers(self, extracted_names: List[str], barbershop_staff: List[BarberProfile],
+                                name_index: Optional[StaffNameIndex] = None) -> List[Dict[str, Any]]:
+        """Match extracted names against barbershop staff using exact and fuzzy lookups"""
+        if name_index is None:
+            name_index = StaffNameIndex(barbershop_staff)
         
-        for name in extracted_names:
-            for barber in barbershop_staff:
-                # Check against all name variations for this barber
-                for barber_name in barber.all_names:
-                    if not barber_name.strip():
-                        continue
-                        
-                    # Exact match gets highest score
-                    if name == barber_name:
-                        confidence = 95.0
-                    else:
-                        # Fuzzy matching for similar names
-                        similarity = difflib.SequenceMatcher(None, name, barber_name).ratio()
-                        confidence = similarity * 85.0  # Max 85% for fuzzy matches
-                    
-                    # Only consider matches above 70% confidence
-                    if confidence >= 70.0:
-                        matches.append({
-                            'barber': barber,
-                            'matched_name': barber_name,
-                            'extracted_name': name,
-                            'confidence': confidence,
-                            'mentioned_phrases': [name]  # Could be expanded to include context
-                        })
-        
-        # Remove duplicates and sort by confidence
+        # Keep the highest-confidence match per barber
         unique_matches = {}
-        for match in matches:
-            barber_id = match['barber'].id
-            if barber_id not in unique_matches or match['confidence'] > unique_matches[barber_id]['confidence']:
-                unique_matches[barber_id] = match
+        for name in extracted_names:
+            for barber, barber_name, confidence in name_index.match(name):
+                if barber.id not in unique_matches or confidence > unique_matches[barber.id]['confidence']:
+                    unique_matches[barber.id] = {
+                        'barber': barber,
+                        'matched_name': barber_name,
+                        'extracted_name': name,
+                        'confidence': confidence,
+                        'mentioned_phrases': [name]  # Could be expanded to include context
+                    }
         
         return sorted(unique_matches.values(), key=lambda x: x['confidence'], reverse=True)
     
@@ -278,11 +337,10 @@ class AIReviewAttributionEngine:
         """
         
         try:
-            # Try Anthropic Claude first
-            response = await self._call_anthropic_claude(prompt)
-            
-            # Parse JSON response
-            result = json.loads(response.strip())
+            # Try Anthropic Claude first, bounded so backfills don't fan out unlimited calls
+            # Only responses that parse as JSON are cached by the gateway
+            async with self._ai_semaphore:
+                result = await self._call_anthropic_claude(prompt, parse=lambda text: json.loads(text.strip()))
             return {
                 'confidence': float(result.get('confidence', 0)),
                 'reasoning': result.get('reasoning', 'AI analysis completed'),
@@ -298,15 +356,20 @@ class AIReviewAttributionEngine:
                 'justified': True
             }
     
-    async def _call_anthropic_claude(self, prompt: str) -> str:
+    async def _call_anthropic_claude(self, prompt: str, parse: Optional[Callable[[str], Any]] = None) -> Any:
         """Call Anthropic Claude for AI analysis"""
         try:
-            response = self.anthropic_client.messages.create(
+            return await self.llm_gateway.complete(
+                "anthropic",
+                prompt,
                 model="claude-3-5-sonnet-20241022",
                 max_tokens=500,
-                messages=[{"role": "user", "content": prompt}]
+                caller="review_attribution",
+                parse=parse,
+                use_cache=True
             )
-            return response.content[0].text
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Anthropic API error: {str(e)}")
             raise
@@ -326,16 +389,20 @@ class AIReviewAttributionEngine:
         """Analyze multiple reviews in batch for efficiency"""
         logger.info(f"Batch analyzing {len(reviews)} reviews for {len(barbershop_staff)} staff members")
         
+        # One name index for the whole batch; repeated names are matched once
+        name_index = StaffNameIndex(barbershop_staff)
+        
         tasks = []
         for review in reviews:
             task = self.analyze_review(
                 review_text=review['text'],
                 review_id=review['id'],
-                barbershop_staff=barbershop_staff
+                barbershop_staff=barbershop_staff,
+                name_index=name_index
             )
             tasks.append(task)
         
-        # Process reviews concurrently
+        # Process reviews concurrently; AI verification is capped by max_ai_concurrency
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # Filter out exceptions and log errors
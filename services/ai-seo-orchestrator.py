@@ -11,11 +11,11 @@ from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 from enum import Enum
 
-import openai
-import anthropic
 from googleapiclient.discovery import build
 from google.oauth2.service_account import Credentials
 
+from llm_gateway import LLMGateway
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -62,9 +62,9 @@ class SEORecommendation:
 class AILocalSEOEngine:
     """AI-powered local SEO research and optimization"""
     
-    def __init__(self, openai_api_key: str, anthropic_api_key: str):
-        self.openai_client = openai.OpenAI(api_key=openai_api_key)
-        self.anthropic_client = anthropic.Anthropic(api_key=anthropic_api_key)
+    def __init__(self, openai_api_key: str, anthropic_api_key: str, llm_gateway: Optional[LLMGateway] = None):
+        # Provider clients, response cache and rate limits are shared with the other AI services
+        self.llm_gateway = llm_gateway or LLMGateway.shared(openai_api_key, anthropic_api_key)
     
     async def research_local_keywords(self, profile: BarbershopProfile) -> Dict[str, Any]:
         """Generate comprehensive local keyword research"""
@@ -169,17 +169,15 @@ class AILocalSEOEngine:
     async def _call_openai_gpt(self, prompt: str, max_tokens: int = 1000) -> str:
         """Call OpenAI GPT API"""
         try:
-            response = await asyncio.to_thread(
-                self.openai_client.chat.completions.create,
+            return await self.llm_gateway.complete(
+                "openai",
+                prompt,
                 model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are an expert SEO specialist focused on local businesses."},
-                    {"role": "user", "content": prompt}
-                ],
+                system="You are an expert SEO specialist focused on local businesses.",
                 max_tokens=max_tokens,
-                temperature=0.7
+                temperature=0.7,
+                caller="ai_seo_orchestrator"
             )
-            return response.choices[0].message.content
         except Exception as e:
             logger.error(f"OpenAI API error: {str(e)}")
             raise
@@ -187,15 +185,13 @@ class AILocalSEOEngine:
     async def _call_anthropic_claude(self, prompt: str, max_tokens: int = 1000) -> str:
         """Call Anthropic Claude API"""
         try:
-            response = await asyncio.to_thread(
-                self.anthropic_client.messages.create,
+            return await self.llm_gateway.complete(
+                "anthropic",
+                prompt,
                 model="claude-3-sonnet-20240229",
                 max_tokens=max_tokens,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
+                caller="ai_seo_orchestrator"
             )
-            return response.content[0].text
         except Exception as e:
             logger.error(f"Anthropic API error: {str(e)}")
             raise
@@ -204,9 +200,10 @@ class AILocalSEOEngine:
 class GoogleMyBusinessAutomation:
     """Automate Google My Business posts and management"""
     
-    def __init__(self, credentials_path: str):
+    def __init__(self, credentials_path: str, ai_engine: Optional[AILocalSEOEngine] = None):
         self.credentials = Credentials.from_service_account_file(credentials_path)
         self.service = build('mybusiness', 'v4', credentials=self.credentials)
+        self.ai_engine = ai_engine or AILocalSEOEngine("", "")  # API keys would be injected
     
     async def generate_weekly_posts(self, profile: BarbershopProfile) -> List[Dict[str, Any]]:
         """Generate AI-powered weekly GMB posts"""
@@ -237,12 +234,7 @@ class GoogleMyBusinessAutomation:
             """
             
             # Use AI to generate posts
-            ai_engine = AILocalSEOEngine(
-                openai_api_key="",  # Would be injected
-                anthropic_api_key=""
-            )
-            
-            response = await ai_engine._call_anthropic_claude(prompt)
+            response = await self.ai_engine._call_anthropic_claude(prompt)
             posts = json.loads(response)
             
             return posts
@@ -289,8 +281,7 @@ class GoogleMyBusinessAutomation:
                 - Keep it professional and brief
                 """
             
-            ai_engine = AILocalSEOEngine("", "")  # API keys would be injected
-            response = await ai_engine._call_anthropic_claude(prompt)
+            response = await self.ai_engine._call_anthropic_claude(prompt)
             
             return response.strip().replace('"', '')
             
@@ -395,7 +386,8 @@ class AISEOOrchestrator:
             config["anthropic_api_key"]
         )
         self.gmb_automation = GoogleMyBusinessAutomation(
-            config["google_credentials_path"]
+            config["google_credentials_path"],
+            ai_engine=self.seo_engine
         )
         self.technical_seo = TechnicalSEOAutomation()
     
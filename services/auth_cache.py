@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Authentication Cache Service for 6FB AI Agent System
+Short-lived in-process cache of verified JWT sessions so authenticated requests
+skip the session revocation check and user lookup on the hot path
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Sentinel stored for tokens known to be revoked or expired (negative cache)
+REVOKED = object()
+
+
+@dataclass
+class CachedSession:
+    """Cache entry for a verified session"""
+    user_id: int
+    user: Optional[dict]  # None for negative entries
+    expires_at: float
+
+
+class RevocationBloomFilter:
+    """
+    Bloom filter of revoked JWT IDs, optionally shared between replicas via Redis.
+
+    Lookups only read the local bit arrays. When a Redis client is configured,
+    revocations are written through with SETBIT and the local copy is refreshed
+    from Redis every `sync_interval` seconds, so replicas converge without a
+    database round trip per request. A positive answer may be a false positive
+    and must be confirmed against the sessions table.
+
+    Revocations go into the generation for the current `rotation_interval`
+    window (aligned to the epoch, so replicas agree on it) and lookups check
+    the current and previous generations. With the interval set to the access
+    token lifetime, every revocation is kept until the token could no longer
+    be used anyway, and older generations are dropped instead of filling up.
+    """
+
+    def __init__(self, size_bits: int = 1 << 20, num_hashes: int = 7,
+                 redis_client=None, redis_key: str = "auth:revoked_jti_bloom",
+                 sync_interval: float = 5.0, rotation_interval: float = 86400.0):
+        self.size_bits = size_bits
+        self.num_hashes = num_hashes
+        self.redis_client = redis_client
+        self.redis_key = redis_key
+        self.sync_interval = sync_interval
+        self.rotation_interval = rotation_interval
+        self._num_bytes = (size_bits + 7) // 8
+        self._generations: Dict[int, bytearray] = {}
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+
+    def _positions(self, jti: str):
+        """Double hashing (Kirsch-Mitzenmacher) over a single SHA-256 digest"""
+        digest = hashlib.sha256(jti.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        return [(h1 + i * h2) % self.size_bits for i in range(self.num_hashes)]
+
+    def _live_generations(self):
+        """Current and previous generation numbers"""
+        current = int(time.time() // self.rotation_interval)
+        return current, current - 1
+
+    def _generation_key(self, generation: int) -> str:
+        return f"{self.redis_key}:{generation}"
+
+    def _bits_for(self, generation: int) -> bytearray:
+        """Bit array for a live generation, dropping expired ones (caller holds the lock)"""
+        bits = self._generations.get(generation)
+        if bits is None:
+            oldest = self._live_generations()[1]
+            for expired in [g for g in self._generations if g < oldest]:
+                del self._generations[expired]
+            bits = self._generations[generation] = bytearray(self._num_bytes)
+        return bits
+
+    def add(self, jti: str):
+        """Mark a JWT ID as revoked locally and in the shared filter"""
+        positions = self._positions(jti)
+        generation = self._live_generations()[0]
+        with self._lock:
+            bits = self._bits_for(generation)
+            for pos in positions:
+                # Same bit order as Redis SETBIT (bit 0 is the MSB of byte 0)
+                bits[pos >> 3] |= 0x80 >> (pos & 7)
+
+        if self.redis_client:
+            try:
+                key = self._generation_key(generation)
+                pipe = self.redis_client.pipeline()
+                for pos in positions:
+                    pipe.setbit(key, pos, 1)
+                pipe.expire(key, int(2 * self.rotation_interval))
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to publish revocation to shared bloom filter: {e}")
+
+    def might_contain(self, jti: str) -> bool:
+        """Return True if the JWT ID may have been revoked"""
+        self._maybe_sync()
+        positions = self._positions(jti)
+        for generation in self._live_generations():
+            bits = self._generations.get(generation)
+            if bits is not None and all(bits[pos >> 3] & (0x80 >> (pos & 7)) for pos in positions):
+                return True
+        return False
+
+    def _maybe_sync(self):
+        """Merge the shared Redis bitmaps into the local copies on a fixed cadence"""
+        if not self.redis_client:
+            return
+
+        now = time.time()
+        if now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+
+        generations = self._live_generations()
+        try:
+            remotes = self.redis_client.mget([self._generation_key(g) for g in generations])
+        except Exception as e:
+            logger.warning(f"Failed to sync shared bloom filter: {e}")
+            return
+
+        for generation, remote in zip(generations, remotes):
+            if not remote:
+                continue
+            # Redis strings stop at the highest set byte; OR as big integers rather than per byte
+            remote_bits = int.from_bytes(remote[:self._num_bytes], "big") << (8 * max(0, self._num_bytes - len(remote)))
+            with self._lock:
+                bits = self._bits_for(generation)
+                merged = int.from_bytes(bits, "big") | remote_bits
+                self._generations[generation] = bytearray(merged.to_bytes(self._num_bytes, "big"))
+
+    def clear(self):
+        """Reset the local bit arrays"""
+        with self._lock:
+            self._generations = {}
+
+
+class AuthCache:
+    """
+    TTL + LRU cache of verified sessions keyed by JWT ID (jti).
+
+    Positive entries hold the user payload returned by get_current_user.
+    Negative entries remember revoked or expired tokens so repeated requests
+    with a dead token do not reach the database either.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, negative_ttl_seconds: float = 300.0,
+                 max_entries: int = 10000,
+                 bloom_filter: Optional[RevocationBloomFilter] = None):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self.bloom_filter = bloom_filter
+        self._entries: "OrderedDict[str, CachedSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, jti: str):
+        """
+        Return the cached user dict, REVOKED for negative entries,
+        or None when the database must be consulted
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(jti)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= now:
+                del self._entries[jti]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(jti)
+
+        if entry.user is None:
+            self.hits += 1
+            return REVOKED
+
+        # Another replica may have revoked this token since it was cached
+        if self.bloom_filter and self.bloom_filter.might_contain(jti):
+            self.invalidate(jti)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry.user
+
+    def set(self, jti: str, user: dict, token_exp: Optional[float] = None):
+        """Cache a verified session, never beyond the token's own expiry"""
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        self._store(jti, CachedSession(user["id"], user, expires_at))
+
+    def set_revoked(self, jti: str, user_id: int = 0):
+        """Negative-cache a token that failed the session check"""
+        self._store(jti, CachedSession(user_id, None, time.time() + self.negative_ttl_seconds))
+
+    def _store(self, jti: str, entry: CachedSession):
+        with self._lock:
+            self._entries[jti] = entry
+            self._entries.move_to_end(jti)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def revoke(self, jti: str, user_id: int = 0):
+        """Record an explicit revocation (logout) locally and in the shared filter"""
+        self.set_revoked(jti, user_id)
+        if self.bloom_filter:
+            self.bloom_filter.add(jti)
+
+    def invalidate(self, jti: str):
+        """Drop a single cached session"""
+        with self._lock:
+            self._entries.pop(jti, None)
+
+    def invalidate_user(self, user_id: int) -> int:
+        """Drop every cached session for a user (password change, deactivation, revoke-all)"""
+        with self._lock:
+            stale = [jti for jti, entry in self._entries.items() if entry.user_id == user_id]
+            for jti in stale:
+                del self._entries[jti]
+        return len(stale)
+
+    def clear(self):
+        """Drop all cached sessions"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """Cache statistics for monitoring endpoints"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "ttl_seconds": self.ttl_seconds,
+            "shared_revocation_filter": bool(self.bloom_filter and self.bloom_filter.redis_client)
+        }
+
+
+def _create_shared_bloom_filter() -> Optional[RevocationBloomFilter]:
+    """Build the revocation filter, shared through Redis when AUTH_REVOCATION_REDIS_URL is set"""
+    redis_url = os.getenv("AUTH_REVOCATION_REDIS_URL")
+    redis_client = None
+    if redis_url:
+        try:
+            import redis
+            redis_client = redis.Redis.from_url(redis_url)
+            redis_client.ping()
+        except Exception as e:
+            logger.warning(f"Shared revocation filter disabled, Redis unavailable: {e}")
+            redis_client = None
+    # Generations rotate at the access token lifetime (JWT_ACCESS_TOKEN_EXPIRE_HOURS)
+    return RevocationBloomFilter(
+        redis_client=redis_client,
+        rotation_interval=float(os.getenv("AUTH_REVOCATION_ROTATION_SECONDS", str(24 * 3600)))
+    )
+
+
+# Global auth cache instance
+auth_cache = AuthCache(
+    ttl_seconds=float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30")),
+    negative_ttl_seconds=float(os.getenv("AUTH_CACHE_NEGATIVE_TTL_SECONDS", "300")),
+    max_entries=int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000")),
+    bloom_filter=_create_shared_bloom_filter()
+)
@@ -9,7 +9,7 @@ import asyncio
 import json
 import uuid
 from datetime import datetime, timedelta, date
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Union, Iterable, Iterator, Tuple
 import logging
 from dataclasses import dataclass
 import re
@@ -36,6 +36,96 @@ class CampaignTemplate:
     variables: List[str]
     triggers: Dict[str, Any]
 
+PLACEHOLDER_PATTERN = re.compile(r'\{\{(\w+)\}\}')
+
+# Placeholders that differ per recipient; all others are the same for a whole execution
+CUSTOMER_PLACEHOLDERS = ('customer_first_name', 'customer_last_name', 'customer_email', 'birth_month')
+
+class CampaignRenderer:
+    """
+    Campaign templates compiled once per execution and barbershop
+
+    Each template is split into literal text and customer placeholder slots.
+    Barbershop, link and date placeholders are filled in at compile time, so
+    rendering for a customer only joins the literals with that customer's
+    values. Unknown placeholders are left as written.
+    """
+
+    def __init__(self, templates: Dict[str, str], barbershop: Dict[str, Any], now: Optional[datetime] = None):
+        now = now or datetime.now()
+        context = {
+            'barbershop_name': barbershop.get('name') or 'Our Barbershop',
+            'barbershop_address': barbershop.get('address') or '',
+            'barbershop_phone': barbershop.get('phone') or '',
+            # Dynamic links (you'd implement these based on your frontend routing)
+            'booking_link': f"https://yourdomain.com/book?shop={barbershop.get('id', '')}",
+            'app_download_link': "https://yourdomain.com/download",
+            'current_date': now.strftime('%B %d, %Y'),
+            'current_year': str(now.year)
+        }
+
+        self.templates = {key: self._compile(text or '', context) for key, text in templates.items()}
+        self.slots = {slot for _, slots in self.templates.values() for slot in slots}
+
+    @staticmethod
+    def _compile(text: str, context: Dict[str, str]):
+        """(literal parts, slot names), with one more part than slots"""
+        parts = []
+        slots = []
+        literal = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            literal.append(text[position:match.start()])
+            name = match.group(1)
+            if name in context:
+                literal.append(context[name])
+            elif name in CUSTOMER_PLACEHOLDERS:
+                parts.append(''.join(literal))
+                slots.append(name)
+                literal = []
+            else:
+                literal.append(match.group(0))
+            position = match.end()
+        literal.append(text[position:])
+        parts.append(''.join(literal))
+        return parts, slots
+
+    def _customer_values(self, customer: Dict[str, Any]) -> Dict[str, str]:
+        values = {
+            'customer_first_name': customer.get('first_name') or 'Valued Customer',
+            'customer_last_name': customer.get('last_name') or '',
+            'customer_email': customer.get('email') or ''
+        }
+        if 'birth_month' in self.slots:
+            # Left as a placeholder for customers without a birthday, as before
+            values['birth_month'] = '{{birth_month}}'
+            if customer.get('date_of_birth'):
+                try:
+                    values['birth_month'] = str(datetime.strptime(customer['date_of_birth'], '%Y-%m-%d').month).zfill(2)
+                except ValueError as e:
+                    logger.error(f"Error personalizing content: {str(e)}")
+        return values
+
+    def render(self, customer: Dict[str, Any]) -> Dict[str, str]:
+        """Every template rendered for one customer, by template key"""
+        values = self._customer_values(customer)
+        rendered = {}
+        for key, (parts, slots) in self.templates.items():
+            if not slots:
+                rendered[key] = parts[0]
+                continue
+            pieces = [parts[0]]
+            for slot, part in zip(slots, parts[1:]):
+                pieces.append(values[slot])
+                pieces.append(part)
+            rendered[key] = ''.join(pieces)
+        return rendered
+
+    def render_batch(self, customers: Iterable[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], Dict[str, str]]]:
+        """Lazily yield (customer, rendered templates) for each customer"""
+        for customer in customers:
+            yield customer, self.render(customer)
+
 class CampaignManagementService:
     def __init__(self):
         # Initialize Supabase client
@@ -496,11 +586,16 @@ class SMSServiceWrapper:
                 .eq('id', execution_id)\
                 .execute()
             
+            # Barbershop details and templates are resolved once for the whole execution
+            barbershop = self._get_barbershop_context(barbershop_id)
+            channels = campaign.get('channels', {})
+            renderer = self._build_campaign_renderer(campaign, barbershop)
+            
             # Send messages to customers
             sent_count = 0
             delivered_count = 0
             
-            for customer in customers:
+            for customer, messages in renderer.render_batch(customers):
                 try:
                     # Check frequency cap
                     if await self._check_frequency_cap(
@@ -511,15 +606,14 @@ class SMSServiceWrapper:
                         continue  # Skip this customer due to frequency cap
                     
                     # Send messages through configured channels
-                    channels = campaign.get('channels', {})
-                    
-                    for channel_type, channel_config in channels.items():
+                    for channel_type in channels:
                         if channel_type == 'email' and customer.get('email'):
                             success = await self._send_email_message(
                                 customer=customer,
                                 campaign=campaign,
                                 execution=execution,
-                                channel_config=channel_config,
+                                subject=messages['email_subject'],
+                                content=messages['email_content'],
                                 barbershop_id=barbershop_id
                             )
                             if success:
@@ -531,7 +625,7 @@ class SMSServiceWrapper:
                                 customer=customer,
                                 campaign=campaign,
                                 execution=execution,
-                                channel_config=channel_config,
+                                content=messages['sms_content'],
                                 barbershop_id=barbershop_id
                             )
                             if success:
@@ -672,31 +766,9 @@ class SMSServiceWrapper:
             return False
 
     async def _send_email_message(self, customer: Dict[str, Any], campaign: Dict[str, Any], 
-                                 execution: Dict[str, Any], channel_config: Dict[str, Any], barbershop_id: str) -> bool:
-        """Send email message to customer"""
+                                 execution: Dict[str, Any], subject: str, content: str, barbershop_id: str) -> bool:
+        """Send a personalized email message to customer"""
         try:
-            # Get barbershop details for personalization
-            barbershop_result = self.supabase.table('barbershops')\
-                .select('name, address, phone')\
-                .eq('id', barbershop_id)\
-                .single()\
-                .execute()
-            
-            barbershop = barbershop_result.data if barbershop_result.data else {}
-            
-            # Personalize content
-            subject = self._personalize_content(
-                channel_config.get('subject', campaign['campaign_name']),
-                customer,
-                barbershop
-            )
-            
-            content = self._personalize_content(
-                channel_config.get('message', ''),
-                customer,
-                barbershop
-            )
-            
             # Send email
             message_id = await self.email_service.send_campaign_email(
                 to_email=customer['email'],
@@ -738,25 +810,9 @@ class SMSServiceWrapper:
             return False
 
     async def _send_sms_message(self, customer: Dict[str, Any], campaign: Dict[str, Any], 
-                               execution: Dict[str, Any], channel_config: Dict[str, Any], barbershop_id: str) -> bool:
-        """Send SMS message to customer"""
+                               execution: Dict[str, Any], content: str, barbershop_id: str) -> bool:
+        """Send a personalized SMS message to customer"""
         try:
-            # Get barbershop details for personalization
-            barbershop_result = self.supabase.table('barbershops')\
-                .select('name, address, phone')\
-                .eq('id', barbershop_id)\
-                .single()\
-                .execute()
-            
-            barbershop = barbershop_result.data if barbershop_result.data else {}
-            
-            # Personalize content
-            content = self._personalize_content(
-                channel_config.get('message', ''),
-                customer,
-                barbershop
-            )
-            
             # Send SMS
             message_id = await self.sms_service.send_campaign_sms(
                 to_phone=customer['phone'],
@@ -794,37 +850,29 @@ class SMSServiceWrapper:
             logger.error(f"Error sending SMS to {customer['phone']}: {str(e)}")
             return False
 
+    def _get_barbershop_context(self, barbershop_id: str) -> Dict[str, Any]:
+        """Barbershop details used for personalization"""
+        barbershop_result = self.supabase.table('barbershops')\
+            .select('id, name, address, phone')\
+            .eq('id', barbershop_id)\
+            .single()\
+            .execute()
+        return barbershop_result.data if barbershop_result.data else {}
+
+    def _build_campaign_renderer(self, campaign: Dict[str, Any], barbershop: Dict[str, Any]) -> CampaignRenderer:
+        """Compile the campaign's email and SMS templates for one execution"""
+        channels = campaign.get('channels', {})
+        email_config = channels.get('email') or {}
+        sms_config = channels.get('sms') or {}
+        return CampaignRenderer({
+            'email_subject': email_config.get('subject', campaign['campaign_name']),
+            'email_content': email_config.get('message', ''),
+            'sms_content': sms_config.get('message', '')
+        }, barbershop)
+
     def _personalize_content(self, content: str, customer: Dict[str, Any], barbershop: Dict[str, Any]) -> str:
-        """Personalize campaign content with customer and barbershop data"""
-        try:
-            # Customer personalization
-            content = content.replace('{{customer_first_name}}', customer.get('first_name', 'Valued Customer'))
-            content = content.replace('{{customer_last_name}}', customer.get('last_name', ''))
-            content = content.replace('{{customer_email}}', customer.get('email', ''))
-            
-            # Barbershop personalization
-            content = content.replace('{{barbershop_name}}', barbershop.get('name', 'Our Barbershop'))
-            content = content.replace('{{barbershop_address}}', barbershop.get('address', ''))
-            content = content.replace('{{barbershop_phone}}', barbershop.get('phone', ''))
-            
-            # Dynamic links (you'd implement these based on your frontend routing)
-            content = content.replace('{{booking_link}}', f"https://yourdomain.com/book?shop={barbershop.get('id', '')}")
-            content = content.replace('{{app_download_link}}', "https://yourdomain.com/download")
-            
-            # Date/time personalization
-            content = content.replace('{{current_date}}', datetime.now().strftime('%B %d, %Y'))
-            content = content.replace('{{current_year}}', str(datetime.now().year))
-            
-            # Birthday specific
-            if customer.get('date_of_birth'):
-                birth_date = datetime.strptime(customer['date_of_birth'], '%Y-%m-%d')
-                content = content.replace('{{birth_month}}', str(birth_date.month).zfill(2))
-            
-            return content
-            
-        except Exception as e:
-            logger.error(f"Error personalizing content: {str(e)}")
-            return content
+        """Personalize one piece of campaign content with customer and barbershop data"""
+        return CampaignRenderer({'content': content}, barbershop).render(customer)['content']
 
     async def _record_communication(self, barbershop_id: str, customer_id: str, campaign_execution_id: str,
                                    channel: str, subject: Optional[str], content: str, 
@@ -1270,13 +1318,7 @@ class SMSServiceWrapper:
                 raise Exception("Campaign not found")
             
             # Get barbershop details
-            barbershop_result = self.supabase.table('barbershops')\
-                .select('name, address, phone')\
-                .eq('id', barbershop_id)\
-                .single()\
-                .execute()
-            
-            barbershop = barbershop_result.data if barbershop_result.data else {}
+            barbershop = self._get_barbershop_context(barbershop_id)
             
             # Create test customer data
             test_customer = {
@@ -7,20 +7,71 @@ import asyncio
 import json
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
 import aiohttp
 import re
 from urllib.parse import urlparse, urljoin
 
-import openai
-import anthropic
+from llm_gateway import LLMGateway
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-run fields that change every time without changing what a prompt asks about
+VOLATILE_PROMPT_FIELDS = {"id", "competitor_id", "analyzed_at", "discovery_date"}
+
+
+def _stable_prompt_data(value: Any) -> Any:
+    """JSON-ready prompt input with per-run ids and timestamps removed, so unchanged inputs hash the same"""
+    if isinstance(value, dict):
+        return {k: _stable_prompt_data(v) for k, v in value.items() if k not in VOLATILE_PROMPT_FIELDS}
+    if isinstance(value, list):
+        return [_stable_prompt_data(v) for v in value]
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+class AnalysisDAG:
+    """
+    Minimal dependency-ordered async step runner
+
+    Each step is an async function that receives the results of the steps it
+    depends on, in order, and starts as soon as they have all finished, so
+    independent steps run concurrently. A failing step fails the run.
+    """
+    
+    def __init__(self):
+        self._steps: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+    
+    def add(self, name: str, func: Callable[..., Awaitable[Any]], *depends_on: str) -> 'AnalysisDAG':
+        missing = [dep for dep in depends_on if dep not in self._steps]
+        if missing:
+            raise ValueError(f"Step {name} depends on unknown steps: {missing}")
+        self._steps[name] = (func, depends_on)
+        return self
+    
+    async def run(self) -> Dict[str, Any]:
+        tasks: Dict[str, asyncio.Task] = {}
+        
+        async def run_step(name: str):
+            func, depends_on = self._steps[name]
+            inputs = [await tasks[dep] for dep in depends_on]
+            return await func(*inputs)
+        
+        # Steps are added after their dependencies, so every task exists before any step runs
+        for name in self._steps:
+            tasks[name] = asyncio.create_task(run_step(name))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return {name: task.result() for name, task in tasks.items()}
+
 
 class CompetitorType(Enum):
     DIRECT = "direct"  # Same services, same area
@@ -93,8 +144,8 @@ class OpportunityAlert:
 class CompetitorDiscovery:
     """Discover and identify local competitors"""
     
-    def __init__(self, openai_api_key: str):
-        self.openai_client = openai.OpenAI(api_key=openai_api_key)
+    def __init__(self, openai_api_key: str, llm_gateway: Optional[LLMGateway] = None):
+        self.llm_gateway = llm_gateway or LLMGateway.shared(openai_api_key=openai_api_key)
     
     async def discover_local_competitors(
         self, 
@@ -155,10 +206,9 @@ class CompetitorDiscovery:
         Return 15-20 search terms as JSON array.
         """
         
-        response = await self._call_openai(prompt)
         try:
-            return json.loads(response)
-        except:
+            return await self._call_openai(prompt, parse=json.loads)
+        except ValueError:
             return [f"{business_type} {location}", f"best {business_type} {location}"]
     
     async def _get_demo_competitors(self, location: str) -> List[Dict]:
@@ -203,20 +253,22 @@ class CompetitorDiscovery:
         timestamp = str(int(datetime.utcnow().timestamp()))
         return f"{clean_name}-{timestamp}"
     
-    async def _call_openai(self, prompt: str) -> str:
-        """Call OpenAI API"""
+    async def _call_openai(self, prompt: str, parse: Optional[Callable[[str], Any]] = None) -> Any:
+        """Call OpenAI API, through the shared LLM gateway"""
         try:
-            response = await asyncio.to_thread(
-                self.openai_client.chat.completions.create,
+            return await self.llm_gateway.complete(
+                "openai",
+                prompt,
                 model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a competitive analysis expert for local businesses."},
-                    {"role": "user", "content": prompt}
-                ],
+                system="You are a competitive analysis expert for local businesses.",
                 max_tokens=1000,
-                temperature=0.7
+                temperature=0.7,
+                caller="competitor_analysis.discovery",
+                parse=parse,
+                use_cache=True
             )
-            return response.choices[0].message.content
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"OpenAI API error: {str(e)}")
             raise
@@ -225,9 +277,8 @@ class CompetitorDiscovery:
 class CompetitorMonitoring:
     """Monitor competitor performance and metrics"""
     
-    def __init__(self, openai_api_key: str, anthropic_api_key: str):
-        self.openai_client = openai.OpenAI(api_key=openai_api_key)
-        self.anthropic_client = anthropic.Anthropic(api_key=anthropic_api_key)
+    def __init__(self, openai_api_key: str, anthropic_api_key: str, llm_gateway: Optional[LLMGateway] = None):
+        self.llm_gateway = llm_gateway or LLMGateway.shared(openai_api_key, anthropic_api_key)
     
     async def analyze_competitor_website(self, competitor: Competitor) -> Dict[str, Any]:
         """Analyze competitor website for SEO and content insights"""
@@ -349,8 +400,7 @@ class CompetitorMonitoring:
         Format as JSON.
         """
         
-        response = await self._call_anthropic(prompt)
-        return json.loads(response)
+        return await self._call_anthropic(prompt, parse=json.loads)
     
     async def _analyze_content_strategy(self, competitor: Competitor) -> Dict[str, Any]:
         """Analyze competitor content strategy using AI"""
@@ -377,21 +427,22 @@ class CompetitorMonitoring:
         Format as JSON with realistic data.
         """
         
-        response = await self._call_anthropic(prompt)
-        return json.loads(response)
+        return await self._call_anthropic(prompt, parse=json.loads)
     
-    async def _call_anthropic(self, prompt: str) -> str:
-        """Call Anthropic Claude API"""
+    async def _call_anthropic(self, prompt: str, parse: Optional[Callable[[str], Any]] = None) -> Any:
+        """Call Anthropic Claude API, through the shared LLM gateway"""
         try:
-            response = await asyncio.to_thread(
-                self.anthropic_client.messages.create,
+            return await self.llm_gateway.complete(
+                "anthropic",
+                prompt,
                 model="claude-3-sonnet-20240229",
                 max_tokens=2000,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
+                caller="competitor_analysis.monitoring",
+                parse=parse,
+                use_cache=True
             )
-            return response.content[0].text
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Anthropic API error: {str(e)}")
             raise
@@ -400,8 +451,8 @@ class CompetitorMonitoring:
 class OpportunityIdentifier:
     """Identify competitive opportunities using AI"""
     
-    def __init__(self, openai_api_key: str):
-        self.openai_client = openai.OpenAI(api_key=openai_api_key)
+    def __init__(self, openai_api_key: str, llm_gateway: Optional[LLMGateway] = None):
+        self.llm_gateway = llm_gateway or LLMGateway.shared(openai_api_key=openai_api_key)
     
     async def identify_opportunities(
         self,
@@ -450,7 +501,7 @@ class OpportunityIdentifier:
         Analyze content opportunities for {our_profile['name']} compared to competitors.
         
         Our profile: {json.dumps(our_profile, indent=2)}
-        Competitor data: {json.dumps(competitor_data, indent=2)}
+        Competitor data: {json.dumps(_stable_prompt_data(competitor_data), indent=2)}
         
         Identify 3-5 specific content opportunities where we can outperform competitors:
         
@@ -470,9 +521,8 @@ class OpportunityIdentifier:
         Format as JSON array of opportunities.
         """
         
-        response = await self._call_openai(prompt)
         try:
-            content_opps = json.loads(response)
+            content_opps = await self._call_openai(prompt, parse=json.loads)
             opportunities = []
             
             for opp in content_opps:
@@ -590,32 +640,50 @@ class OpportunityIdentifier:
         
         return opportunities
     
-    async def _call_openai(self, prompt: str) -> str:
-        """Call OpenAI API"""
+    async def _call_openai(self, prompt: str, parse: Optional[Callable[[str], Any]] = None) -> Any:
+        """Call OpenAI API, through the shared LLM gateway"""
         try:
-            response = await asyncio.to_thread(
-                self.openai_client.chat.completions.create,
+            return await self.llm_gateway.complete(
+                "openai",
+                prompt,
                 model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a competitive analysis expert specializing in local SEO and content marketing for service businesses."},
-                    {"role": "user", "content": prompt}
-                ],
+                system="You are a competitive analysis expert specializing in local SEO and content marketing for service businesses.",
                 max_tokens=2000,
-                temperature=0.7
+                temperature=0.7,
+                caller="competitor_analysis.opportunities",
+                parse=parse,
+                use_cache=True
             )
-            return response.choices[0].message.content
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"OpenAI API error: {str(e)}")
             raise
 
 
 class CompetitiveAnalysisOrchestrator:
-    """Main orchestrator for competitive analysis system"""
+    """
+    Main orchestrator for competitive analysis system
     
-    def __init__(self, openai_api_key: str, anthropic_api_key: str):
-        self.discovery = CompetitorDiscovery(openai_api_key)
-        self.monitoring = CompetitorMonitoring(openai_api_key, anthropic_api_key)
-        self.opportunity_identifier = OpportunityIdentifier(openai_api_key)
+    A run is a small DAG: discovery, then every competitor's website and
+    content analyses concurrently alongside keyword tracking, then
+    opportunities and recommendations. LLM calls go through the shared
+    LLM gateway, whose response cache and in-flight coalescing make a
+    repeat run for unchanged competitors mostly cache hits.
+    """
+    
+    def __init__(self, openai_api_key: str, anthropic_api_key: str, llm_gateway: Optional[LLMGateway] = None):
+        self.llm_gateway = llm_gateway or LLMGateway.shared(openai_api_key, anthropic_api_key)
+        
+        self.discovery = CompetitorDiscovery(openai_api_key, self.llm_gateway)
+        self.monitoring = CompetitorMonitoring(openai_api_key, anthropic_api_key, self.llm_gateway)
+        self.opportunity_identifier = OpportunityIdentifier(openai_api_key, self.llm_gateway)
+    
+    async def run_analyses(self, business_profiles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run comprehensive analyses for several shops concurrently under the gateway's limits"""
+        reports = await asyncio.gather(*(self.run_comprehensive_analysis(profile) for profile in business_profiles))
+        logger.info(f"LLM gateway after {len(business_profiles)} analyses: {self.llm_gateway.get_metrics()}")
+        return list(reports)
     
     async def run_comprehensive_analysis(
         self,
@@ -624,41 +692,34 @@ class CompetitiveAnalysisOrchestrator:
         """Run comprehensive competitive analysis"""
         try:
             location = f"{business_profile['city']}, {business_profile['state']}"
+            keywords = business_profile.get("target_keywords", [])
             
-            # Discover competitors
-            logger.info("Discovering local competitors...")
-            competitors = await self.discovery.discover_local_competitors(
-                location, "barbershop"
-            )
+            async def discover():
+                logger.info("Discovering local competitors...")
+                return await self.discovery.discover_local_competitors(location, "barbershop")
             
-            # Analyze each competitor
-            logger.info(f"Analyzing {len(competitors)} competitors...")
-            competitor_analyses = []
-            for competitor in competitors:
-                analysis = await self.monitoring.analyze_competitor_website(competitor)
-                content_analysis = await self.monitoring.monitor_competitor_content(competitor)
-                
-                competitor_analyses.append({
-                    "competitor": asdict(competitor),
-                    "website_analysis": analysis,
-                    "content_analysis": content_analysis
-                })
-                
-                # Add delay to be respectful to APIs
-                await asyncio.sleep(1)
+            async def analyze_competitors(competitors: List[Competitor]):
+                logger.info(f"Analyzing {len(competitors)} competitors...")
+                return list(await asyncio.gather(*(self._analyze_competitor(c) for c in competitors)))
             
-            # Track keyword rankings
-            logger.info("Tracking keyword rankings...")
-            keywords = business_profile.get("target_keywords", [])
-            rankings = await self.monitoring.track_keyword_rankings(
-                competitors, keywords, location
-            )
+            async def track_rankings(competitors: List[Competitor]):
+                logger.info("Tracking keyword rankings...")
+                return await self.monitoring.track_keyword_rankings(competitors, keywords, location)
             
-            # Identify opportunities
-            logger.info("Identifying competitive opportunities...")
-            opportunities = await self.opportunity_identifier.identify_opportunities(
-                business_profile, competitor_analyses
-            )
+            async def find_opportunities(competitor_analyses: List[Dict[str, Any]]):
+                logger.info("Identifying competitive opportunities...")
+                return await self.opportunity_identifier.identify_opportunities(business_profile, competitor_analyses)
+            
+            dag = AnalysisDAG()
+            dag.add("competitors", discover)
+            dag.add("competitor_analyses", analyze_competitors, "competitors")
+            dag.add("keyword_rankings", track_rankings, "competitors")
+            dag.add("opportunities", find_opportunities, "competitor_analyses")
+            dag.add("recommendations", self._generate_summary_recommendations, "competitors", "opportunities")
+            results = await dag.run()
+            
+            competitors = results["competitors"]
+            opportunities = results["opportunities"]
             
             # Compile comprehensive report
             analysis_report = {
@@ -666,8 +727,8 @@ class CompetitiveAnalysisOrchestrator:
                 "analyzed_at": datetime.utcnow().isoformat(),
                 "location": location,
                 "competitors_analyzed": len(competitors),
-                "competitors": competitor_analyses,
-                "keyword_rankings": rankings,
+                "competitors": results["competitor_analyses"],
+                "keyword_rankings": results["keyword_rankings"],
                 "opportunities": [asdict(opp) for opp in opportunities],
                 "summary": {
                     "total_competitors": len(competitors),
@@ -676,9 +737,7 @@ class CompetitiveAnalysisOrchestrator:
                     "high_priority_opportunities": len([o for o in opportunities if o.priority == "high"]),
                     "keywords_tracked": len(keywords)
                 },
-                "recommendations": await self._generate_summary_recommendations(
-                    competitors, opportunities
-                )
+                "recommendations": results["recommendations"]
             }
             
             return analysis_report
@@ -687,6 +746,18 @@ class CompetitiveAnalysisOrchestrator:
             logger.error(f"Error in comprehensive analysis: {str(e)}")
             return {"error": str(e)}
     
+    async def _analyze_competitor(self, competitor: Competitor) -> Dict[str, Any]:
+        """Website and content analyses for one competitor, run concurrently"""
+        analysis, content_analysis = await asyncio.gather(
+            self.monitoring.analyze_competitor_website(competitor),
+            self.monitoring.monitor_competitor_content(competitor)
+        )
+        return {
+            "competitor": asdict(competitor),
+            "website_analysis": analysis,
+            "content_analysis": content_analysis
+        }
+    
     async def _generate_summary_recommendations(
         self, 
         competitors: List[Competitor], 
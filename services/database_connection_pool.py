@@ -325,6 +325,30 @@ class DatabaseConnectionManager:
                 logger.error(f"Transaction rolled back: {e}")
                 raise
 
+@contextmanager
+def write_transaction(database_path: str, timeout: float = 30.0):
+    """
+    Exclusive connection for one multi-statement write
+
+    Pooled connections are handed to several threads at once, so a commit or
+    rollback on one can end another caller's transaction. Writes that must be
+    atomic open their own connection, take the write lock up front with
+    BEGIN IMMEDIATE, commit when the block exits normally and roll back if
+    it raises.
+    """
+    conn = sqlite3.connect(database_path, timeout=timeout, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    finally:
+        conn.close()
+
 # Global connection pool instance
 _connection_pool = None
 _pool_lock = Lock()
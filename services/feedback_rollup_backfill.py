@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Customer Feedback Rollup Backfill for 6FB AI Agent System
+Rescores stored sentiment on existing feedback with the tokenised lexicon and
+rebuilds the customer_feedback_daily_rollups buckets the NPS and sentiment
+endpoints read from
+"""
+
+import argparse
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from services.feedback_sentiment import score_sentiment
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 500
+
+
+class FeedbackRollupBackfill:
+    """
+    One-off (and safe to re-run) backfill for feedback rollups
+
+    Feedback with a comment is read in id order, PAGE_SIZE rows at a time,
+    and only rows whose sentiment_label changes are updated.
+    Rollups are then rebuilt from customer_feedback in the database, so
+    buckets are correct even for feedback written before the rollup trigger
+    existed.
+    """
+
+    def __init__(self, supabase_client, page_size: int = PAGE_SIZE):
+        self.supabase = supabase_client
+        self.page_size = page_size
+
+    def run(self, barbershop_id: Optional[str] = None, dry_run: bool = False) -> Dict[str, Any]:
+        scanned = 0
+        rescored = 0
+        cursor = None
+
+        while True:
+            query = self.supabase.table('customer_feedback')\
+                .select('id, comment, sentiment_label')\
+                .not_.is_('comment', 'null')
+            if barbershop_id:
+                query = query.eq('barbershop_id', barbershop_id)
+            if cursor:
+                query = query.gt('id', cursor)
+            page = query.order('id').limit(self.page_size).execute().data or []
+            if not page:
+                break
+
+            for feedback in page:
+                label, _ = score_sentiment(feedback['comment'])
+                if feedback.get('sentiment_label') == label:
+                    continue
+                rescored += 1
+                if not dry_run:
+                    self.supabase.table('customer_feedback')\
+                        .update({"sentiment_label": label})\
+                        .eq('id', feedback['id'])\
+                        .execute()
+
+            scanned += len(page)
+            cursor = page[-1]['id']
+            logger.info(f"Scanned {scanned} feedback rows, {rescored} rescored")
+            if len(page) < self.page_size:
+                break
+
+        buckets = 0
+        if not dry_run:
+            result = self.supabase.rpc('rebuild_customer_feedback_daily_rollups',
+                                       {"p_barbershop_id": barbershop_id}).execute()
+            buckets = result.data or 0
+
+        logger.info(f"Feedback backfill {'(dry run) ' if dry_run else ''}complete: "
+                    f"{scanned} scanned, {rescored} rescored, {buckets} daily buckets")
+        return {"scanned": scanned, "rescored": rescored, "buckets": buckets, "dry_run": dry_run}
+
+
+def main():
+    """Run the backfill standalone"""
+    from supabase import create_client
+
+    parser = argparse.ArgumentParser(description="Backfill feedback sentiment and daily NPS/sentiment rollups")
+    parser.add_argument('--barbershop-id', help="Limit the backfill to one barbershop")
+    parser.add_argument('--dry-run', action='store_true', help="Count rows that would be rescored without writing")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    supabase = create_client(os.environ["NEXT_PUBLIC_SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"])
+    FeedbackRollupBackfill(supabase).run(barbershop_id=args.barbershop_id, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Feedback Sentiment Scoring
+Lexicon-based sentiment for customer feedback comments, scored once when
+feedback is submitted (or backfilled) and stored with the feedback row
+"""
+
+import re
+from functools import lru_cache
+from typing import Optional, Tuple
+
+POSITIVE_KEYWORDS = (
+    "excellent", "amazing", "fantastic", "outstanding", "perfect", "love", "great",
+    "wonderful", "awesome", "brilliant", "superb", "exceptional", "pleased", "satisfied",
+    "happy", "thrilled", "impressed", "recommend", "professional", "clean", "friendly"
+)
+
+NEGATIVE_KEYWORDS = (
+    "terrible", "awful", "horrible", "disgusting", "worst", "hate", "disappointed",
+    "unsatisfied", "unprofessional", "dirty", "rude", "slow", "expensive", "bad",
+    "poor", "unacceptable", "frustrated", "angry", "upset", "complaint"
+)
+
+# Inflections that still count as the keyword ("loved", "recommends", "complaints")
+KEYWORD_SUFFIXES = ("", "s", "d", "ed", "ing", "ly", "er", "est")
+
+TOKEN_PATTERN = re.compile(r"[a-z]+")
+
+_LEXICON = {**{word: 1 for word in POSITIVE_KEYWORDS}, **{word: -1 for word in NEGATIVE_KEYWORDS}}
+_LONGEST_SUFFIX = max(len(suffix) for suffix in KEYWORD_SUFFIXES)
+
+
+@lru_cache(maxsize=8192)
+def _match_token(token: str) -> Optional[Tuple[str, int]]:
+    """(keyword, polarity) for a token that is a keyword or one of its inflections"""
+    for cut in range(min(_LONGEST_SUFFIX, len(token) - 1) + 1):
+        stem = token[:len(token) - cut]
+        if stem in _LEXICON and token[len(stem):] in KEYWORD_SUFFIXES:
+            return stem, _LEXICON[stem]
+    return None
+
+
+def score_sentiment(text: Optional[str]) -> Tuple[str, float]:
+    """
+    Sentiment label and confidence for a feedback comment
+
+    The text is tokenised once and each distinct keyword counts once, so
+    "unprofessional" no longer also counts as "professional" and "badge"
+    is not "bad". Labels are the customer_feedback sentiment_label values:
+    very_positive, positive, neutral, negative, very_negative.
+    """
+    if not text:
+        return "neutral", 0.5
+
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    positive = set()
+    negative = set()
+    for token in tokens:
+        match = _match_token(token)
+        if match:
+            (positive if match[1] > 0 else negative).add(match[0])
+
+    positive_count = len(positive)
+    negative_count = len(negative)
+    total_words = max(len(text.split()), 1)
+
+    if positive_count > negative_count:
+        if positive_count >= 3 or positive_count / total_words > 0.1:
+            return "very_positive", min(0.8 + (positive_count * 0.05), 0.95)
+        return "positive", 0.6 + (positive_count * 0.05)
+    if negative_count > positive_count:
+        if negative_count >= 3 or negative_count / total_words > 0.1:
+            return "very_negative", max(0.2 - (negative_count * 0.05), 0.05)
+        return "negative", 0.4 - (negative_count * 0.05)
+    return "neutral", 0.5
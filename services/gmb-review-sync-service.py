@@ -7,17 +7,21 @@ Handles synchronization of reviews, automated responses, and real-time processin
 import asyncio
 import logging
 import json
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import aiohttp
 import asyncpg
 import os
 from dataclasses import dataclass
 
-from ai_review_attribution_engine import AIReviewAttributionEngine, BarberProfile
+from ai_review_attribution_engine import AIReviewAttributionEngine, BarberProfile, StaffNameIndex
 
 logger = logging.getLogger(__name__)
 
+# Reviews per multi-row insert
+REVIEW_BATCH_SIZE = 100
+
 @dataclass
 class GMBAccount:
     """GMB account configuration"""
@@ -49,11 +53,23 @@ class GMBReviewSyncService:
     def __init__(self, database_url: str, openai_api_key: str, anthropic_api_key: str):
         self.database_url = database_url
         self.db_pool = None
+        self.db_pool_size = int(os.getenv('GMB_SYNC_DB_POOL_SIZE', '10'))
+        
+        # Limits shared by every account being synced: accounts in flight, pool
+        # connections held by the review pipeline (leaving room for sync logs and
+        # token refreshes), and concurrent LLM-backed attribution/response calls
+        self.max_concurrent_accounts = int(os.getenv('GMB_SYNC_MAX_CONCURRENT_ACCOUNTS', '4'))
+        self.db_concurrency = int(os.getenv('GMB_SYNC_DB_CONCURRENCY', str(max(1, self.db_pool_size - 2))))
+        self.llm_concurrency = int(os.getenv('GMB_SYNC_LLM_CONCURRENCY', '5'))
+        self._account_semaphore = asyncio.Semaphore(self.max_concurrent_accounts)
+        self._db_semaphore = asyncio.Semaphore(self.db_concurrency)
+        self._llm_semaphore = asyncio.Semaphore(self.llm_concurrency)
         
         # Initialize AI attribution engine
         self.attribution_engine = AIReviewAttributionEngine(
             openai_api_key=openai_api_key,
-            anthropic_api_key=anthropic_api_key
+            anthropic_api_key=anthropic_api_key,
+            max_ai_concurrency=self.llm_concurrency
         )
         
         # GMB API configuration
@@ -64,7 +80,7 @@ class GMBReviewSyncService:
         self.db_pool = await asyncpg.create_pool(
             self.database_url,
             min_size=2,
-            max_size=10
+            max_size=self.db_pool_size
         )
         logger.info("GMB Review Sync Service initialized")
     
@@ -74,11 +90,12 @@ class GMBReviewSyncService:
             accounts = await self._get_active_gmb_accounts()
             logger.info(f"Starting sync for {len(accounts)} GMB accounts")
             
-            # Process accounts concurrently
-            tasks = [self.sync_account_reviews(account) for account in accounts]
+            # Process accounts concurrently, at most max_concurrent_accounts at a time
+            tasks = [self._sync_account_bounded(account) for account in accounts]
             results = await asyncio.gather(*tasks, return_exceptions=True)
             
-            success_count = sum(1 for result in results if not isinstance(result, Exception))
+            success_count = sum(1 for result in results
+                                if not isinstance(result, Exception) and result.get('status') != 'error')
             error_count = len(results) - success_count
             
             logger.info(f"Sync completed: {success_count} successful, {error_count} errors")
@@ -86,6 +103,10 @@ class GMBReviewSyncService:
         except Exception as e:
             logger.error(f"Error in sync_all_accounts: {e}")
     
+    async def _sync_account_bounded(self, account: GMBAccount) -> Dict[str, Any]:
+        async with self._account_semaphore:
+            return await self.sync_account_reviews(account)
+    
     async def sync_account_reviews(self, account: GMBAccount) -> Dict[str, Any]:
         """Sync reviews for a specific GMB account"""
         sync_id = None
@@ -105,38 +126,7 @@ class GMBReviewSyncService:
                 return {'status': 'no_new_reviews', 'account_id': account.id}
             
             # Process reviews with AI attribution
-            processed_count = 0
-            success_count = 0
-            error_count = 0
-            
-            for review_data in new_reviews:
-                try:
-                    # Save review to database
-                    review_id = await self._save_review(account.id, review_data)
-                    
-                    # Get barbershop staff for attribution
-                    staff = await self._get_barbershop_staff(account.barbershop_id)
-                    
-                    # Perform AI attribution analysis
-                    attribution = await self.attribution_engine.analyze_review(
-                        review_text=review_data.review_text,
-                        review_id=review_id,
-                        barbershop_staff=staff
-                    )
-                    
-                    # Save attribution results
-                    await self._save_review_attribution(attribution)
-                    
-                    # Generate automated response if enabled
-                    await self._generate_automated_response(account, review_data, attribution)
-                    
-                    success_count += 1
-                    processed_count += 1
-                    
-                except Exception as review_error:
-                    logger.error(f"Error processing review {review_data.google_review_id}: {review_error}")
-                    error_count += 1
-                    processed_count += 1
+            processed_count, success_count, error_count = await self._process_reviews(account, new_reviews)
             
             # Update sync log
             await self._complete_sync_log(sync_id, 'completed', processed_count, success_count, error_count)
@@ -165,6 +155,91 @@ class GMBReviewSyncService:
                 'error': str(e)
             }
     
+    async def _process_reviews(self, account: GMBAccount, reviews: List[GMBReview]) -> Tuple[int, int, int]:
+        """
+        Save, attribute and respond to an account's new reviews in stages
+        
+        Staff and their name index are loaded once for the account. Reviews and
+        attributions are written in batches, and attribution and response calls
+        run concurrently under the shared LLM limit. Every database access in
+        the pipeline goes through _db_connection, so the connections it holds,
+        including those taken while an LLM slot is held, stay within the shared
+        DB limit. A review that fails at any stage is counted as an error and
+        skips the later stages.
+        
+        Returns:
+            (processed, successful, errors)
+        """
+        staff = await self._get_barbershop_staff(account.barbershop_id)
+        name_index = StaffNameIndex(staff)
+        
+        # Stage 1: save reviews
+        review_ids: Dict[str, str] = {}
+        for start in range(0, len(reviews), REVIEW_BATCH_SIZE):
+            chunk = reviews[start:start + REVIEW_BATCH_SIZE]
+            try:
+                review_ids.update(await self._save_reviews(account.id, chunk))
+            except Exception as e:
+                logger.error(f"Error saving {len(chunk)} reviews for account {account.id}: {e}")
+        saved = [review for review in reviews if review.google_review_id in review_ids]
+        
+        # Stage 2: attribute
+        async def attribute(review: GMBReview):
+            return await self.attribution_engine.analyze_review(
+                review_text=review.review_text,
+                review_id=review_ids[review.google_review_id],
+                barbershop_staff=staff,
+                name_index=name_index
+            )
+        
+        attributions = await self._run_bounded(attribute, saved, self._llm_semaphore)
+        attributed = []
+        for review, attribution in zip(saved, attributions):
+            if isinstance(attribution, Exception):
+                logger.error(f"Error attributing review {review.google_review_id}: {attribution}")
+            else:
+                attributed.append((review, attribution))
+        
+        # Stage 3: save attributions
+        stored = []
+        for start in range(0, len(attributed), REVIEW_BATCH_SIZE):
+            chunk = attributed[start:start + REVIEW_BATCH_SIZE]
+            try:
+                await self._save_review_attributions([attribution for _, attribution in chunk])
+                stored.extend(chunk)
+            except Exception as e:
+                logger.error(f"Error saving {len(chunk)} attributions for account {account.id}: {e}")
+        
+        # Stage 4: respond
+        async def respond(item: Tuple[GMBReview, Any]):
+            review, attribution = item
+            await self._generate_automated_response(account, review, attribution)
+        
+        responses = await self._run_bounded(respond, stored, self._llm_semaphore)
+        success_count = 0
+        for (review, _), response in zip(stored, responses):
+            if isinstance(response, Exception):
+                logger.error(f"Error responding to review {review.google_review_id}: {response}")
+            else:
+                success_count += 1
+        
+        return len(reviews), success_count, len(reviews) - success_count
+    
+    @asynccontextmanager
+    async def _db_connection(self):
+        """Pool connection for the review pipeline, counted against the shared DB limit"""
+        async with self._db_semaphore:
+            async with self.db_pool.acquire() as conn:
+                yield conn
+    
+    async def _run_bounded(self, worker, items: List[Any], semaphore: asyncio.Semaphore) -> List[Any]:
+        """Run worker over items concurrently within semaphore; exceptions are returned in place"""
+        async def run(item):
+            async with semaphore:
+                return await worker(item)
+        
+        return await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+    
     async def _get_active_gmb_accounts(self) -> List[GMBAccount]:
         """Get all active GMB accounts that need syncing"""
         async with self.db_pool.acquire() as conn:
@@ -296,29 +371,40 @@ class GMBReviewSyncService:
         except:
             return datetime.now()
     
-    async def _save_review(self, account_id: str, review: GMBReview) -> str:
-        """Save review to database"""
-        async with self.db_pool.acquire() as conn:
-            row = await conn.fetchrow("""
+    async def _save_reviews(self, account_id: str, reviews: List[GMBReview]) -> Dict[str, str]:
+        """Save reviews to database in one statement, returning review ids by google_review_id"""
+        # ON CONFLICT cannot touch the same row twice in one statement; the latest copy wins
+        unique_reviews = list({review.google_review_id: review for review in reviews}.values())
+        
+        async with self._db_connection() as conn:
+            rows = await conn.fetch("""
                 INSERT INTO gmb_reviews (
                     gmb_account_id, google_review_id, reviewer_name, reviewer_profile_photo_url,
                     review_text, star_rating, review_date, review_url
-                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                )
+                SELECT $1::uuid, * FROM unnest(
+                    $2::varchar[], $3::varchar[], $4::text[], $5::text[], $6::int[], $7::timestamptz[], $8::text[]
+                )
                 ON CONFLICT (google_review_id) DO UPDATE SET
                     review_text = EXCLUDED.review_text,
                     star_rating = EXCLUDED.star_rating,
                     updated_at = NOW()
-                RETURNING id
-            """, 
-            account_id, review.google_review_id, review.reviewer_name,
-            review.reviewer_profile_photo_url, review.review_text, 
-            review.star_rating, review.review_date, review.review_url)
+                RETURNING id, google_review_id
+            """,
+            account_id,
+            [review.google_review_id for review in unique_reviews],
+            [review.reviewer_name for review in unique_reviews],
+            [review.reviewer_profile_photo_url for review in unique_reviews],
+            [review.review_text for review in unique_reviews],
+            [review.star_rating for review in unique_reviews],
+            [review.review_date for review in unique_reviews],
+            [review.review_url for review in unique_reviews])
             
-            return str(row['id'])
+            return {row['google_review_id']: str(row['id']) for row in rows}
     
     async def _get_barbershop_staff(self, barbershop_id: str) -> List[BarberProfile]:
         """Get barbershop staff for attribution matching"""
-        async with self.db_pool.acquire() as conn:
+        async with self._db_connection() as conn:
             rows = await conn.fetch("""
                 SELECT bs.id, bs.first_name, bs.last_name, 
                        array_agg(DISTINCT bna.alias_name) FILTER (WHERE bna.alias_name IS NOT NULL) as aliases
@@ -339,10 +425,10 @@ class GMBReviewSyncService:
                 for row in rows
             ]
     
-    async def _save_review_attribution(self, attribution):
-        """Save AI attribution results to database"""
-        async with self.db_pool.acquire() as conn:
-            await conn.execute("""
+    async def _save_review_attributions(self, attributions: List[Any]):
+        """Save AI attribution results to database in one batched round trip"""
+        async with self._db_connection() as conn:
+            await conn.executemany("""
                 INSERT INTO gmb_review_attributions (
                     review_id, barber_id, confidence_level, confidence_score,
                     sentiment, sentiment_score, mentioned_phrases, extracted_names, ai_reasoning
@@ -357,13 +443,21 @@ class GMBReviewSyncService:
                     extracted_names = EXCLUDED.extracted_names,
                     ai_reasoning = EXCLUDED.ai_reasoning,
                     updated_at = NOW()
-            """,
-            attribution.review_id, attribution.barber_id, attribution.confidence.value,
-            attribution.confidence_score, attribution.sentiment.value, attribution.sentiment_score,
-            attribution.mentioned_phrases, attribution.extracted_names, attribution.reasoning)
+            """, [
+                (attribution.review_id, attribution.barber_id, attribution.confidence.value,
+                 attribution.confidence_score, attribution.sentiment.value, attribution.sentiment_score,
+                 attribution.mentioned_phrases, attribution.extracted_names, attribution.reasoning)
+                for attribution in attributions
+            ])
     
     async def _generate_automated_response(self, account: GMBAccount, review: GMBReview, attribution):
-        """Generate and queue automated response to review"""
+        """
+        Generate and queue automated response to review
+        
+        Runs while holding an LLM slot; database reads and writes here must use
+        _db_connection rather than the pool directly, so stage 4 cannot take
+        connections beyond the shared DB limit.
+        """
         # This would generate AI responses and queue them for approval/posting
         # Implementation depends on business rules for auto-response
         pass
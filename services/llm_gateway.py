@@ -0,0 +1,341 @@
+"""
+LLM Gateway
+Shared async entry point for provider calls from the SEO, blog, competitor
+and review services: pooled provider clients, single-flight coalescing of
+identical in-flight requests, a persistent response cache, per-provider
+rate limits and per-caller latency/cost metrics
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from llm_response_cache import LLMResponseCache
+
+# AI Provider imports (with fallbacks)
+try:
+    import openai
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+try:
+    import anthropic
+    ANTHROPIC_AVAILABLE = True
+except ImportError:
+    ANTHROPIC_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# USD per 1K (input, output) tokens, for cost estimates in the metrics
+MODEL_PRICING = {
+    "gpt-4": (0.03, 0.06),
+    "claude-3-sonnet-20240229": (0.003, 0.015),
+    "claude-3-5-sonnet-20241022": (0.003, 0.015),
+}
+
+
+@dataclass
+class LLMCompletion:
+    """Provider response text and token usage"""
+    text: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+class OpenAIProvider:
+    """OpenAI chat completions over one pooled async client"""
+
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str]):
+        if not OPENAI_AVAILABLE:
+            raise RuntimeError("openai package is not installed")
+        self.api_key = api_key
+        self._client = None
+
+    @property
+    def client(self):
+        # Created on first use, then shared by every call through the gateway
+        if self._client is None:
+            self._client = openai.AsyncOpenAI(api_key=self.api_key)
+        return self._client
+
+    async def complete(self, request: Dict[str, Any]) -> LLMCompletion:
+        messages = []
+        if request.get("system"):
+            messages.append({"role": "system", "content": request["system"]})
+        messages.append({"role": "user", "content": request["prompt"]})
+
+        kwargs = {"model": request["model"], "messages": messages, "max_tokens": request["max_tokens"]}
+        if request.get("temperature") is not None:
+            kwargs["temperature"] = request["temperature"]
+
+        response = await self.client.chat.completions.create(**kwargs)
+        usage = getattr(response, "usage", None)
+        return LLMCompletion(
+            text=response.choices[0].message.content,
+            input_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            output_tokens=getattr(usage, "completion_tokens", 0) or 0
+        )
+
+
+class AnthropicProvider:
+    """Anthropic messages over one pooled async client"""
+
+    name = "anthropic"
+
+    def __init__(self, api_key: Optional[str]):
+        if not ANTHROPIC_AVAILABLE:
+            raise RuntimeError("anthropic package is not installed")
+        self.api_key = api_key
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = anthropic.AsyncAnthropic(api_key=self.api_key)
+        return self._client
+
+    async def complete(self, request: Dict[str, Any]) -> LLMCompletion:
+        kwargs = {
+            "model": request["model"],
+            "max_tokens": request["max_tokens"],
+            "messages": [{"role": "user", "content": request["prompt"]}]
+        }
+        if request.get("system"):
+            kwargs["system"] = request["system"]
+        if request.get("temperature") is not None:
+            kwargs["temperature"] = request["temperature"]
+
+        response = await self.client.messages.create(**kwargs)
+        usage = getattr(response, "usage", None)
+        return LLMCompletion(
+            text=response.content[0].text,
+            input_tokens=getattr(usage, "input_tokens", 0) or 0,
+            output_tokens=getattr(usage, "output_tokens", 0) or 0
+        )
+
+
+class FakeLLMProvider:
+    """
+    In-process provider for tests and local runs
+
+    `responses` is either a callable taking the request dict, or a mapping
+    from prompt substring to reply where the first match wins; anything
+    else gets `default`. Every request reaching the provider is recorded in
+    `requests`, so tests can assert on what was (or wasn't) sent.
+    """
+
+    def __init__(self, responses: Any = None, default: str = "{}", latency: float = 0.0, name: str = "fake"):
+        self.name = name
+        self.responses = responses
+        self.default = default
+        self.latency = latency
+        self.requests = []
+
+    async def complete(self, request: Dict[str, Any]) -> LLMCompletion:
+        self.requests.append(request)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if callable(self.responses):
+            text = self.responses(request)
+        else:
+            text = next((reply for fragment, reply in (self.responses or {}).items() if fragment in request["prompt"]),
+                        self.default)
+        return LLMCompletion(text=text, input_tokens=len(request["prompt"].split()), output_tokens=len(text.split()))
+
+
+class TokenBucket:
+    """Requests-per-minute limiter allowing bursts of up to `capacity` requests"""
+
+    def __init__(self, requests_per_minute: float, capacity: Optional[float] = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = capacity or max(1.0, requests_per_minute / 6)  # ten seconds' worth
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LLMGateway:
+    """
+    Shared gateway for LLM completions
+
+    A request is the provider, model, prompt, system prompt, max_tokens and
+    temperature; its hash is the cache and coalescing key. complete()
+    answers from the response cache when it can, joins an identical request
+    that is already in flight rather than sending a second one, and
+    otherwise waits for the provider's token bucket and concurrency slot.
+    With `parse`, the parsed result is returned and only responses that
+    parse are cached. Caching is opt-in per call (`use_cache=True`) for
+    deterministic or analytical callers; generated content should come out
+    fresh each time. Metrics are kept per `caller` name.
+    """
+
+    _shared: Dict[Tuple[Optional[str], Optional[str]], 'LLMGateway'] = {}
+
+    def __init__(self, providers: Dict[str, Any], cache: Optional[LLMResponseCache] = None,
+                 requests_per_minute: Optional[Dict[str, float]] = None, max_concurrency: Optional[int] = None):
+        self.providers = providers
+        self.cache = cache
+        self._buckets = {name: TokenBucket(rpm) for name, rpm in (requests_per_minute or {}).items() if rpm}
+        self._semaphores = {name: asyncio.Semaphore(max_concurrency) for name in providers} if max_concurrency else {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.metrics: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def from_env(cls, openai_api_key: Optional[str] = None, anthropic_api_key: Optional[str] = None) -> 'LLMGateway':
+        """
+        Gateway for the installed provider SDKs, configured from
+        LLM_GATEWAY_CACHE_PATH (empty disables the cache), LLM_GATEWAY_CACHE_TTL,
+        LLM_GATEWAY_OPENAI_RPM, LLM_GATEWAY_ANTHROPIC_RPM and LLM_GATEWAY_MAX_CONCURRENCY
+        """
+        providers = {}
+        if OPENAI_AVAILABLE:
+            providers["openai"] = OpenAIProvider(openai_api_key)
+        if ANTHROPIC_AVAILABLE:
+            providers["anthropic"] = AnthropicProvider(anthropic_api_key)
+
+        cache_path = os.getenv("LLM_GATEWAY_CACHE_PATH", "llm_response_cache.db")
+        cache = LLMResponseCache(cache_path, float(os.getenv("LLM_GATEWAY_CACHE_TTL", str(14 * 86400)))) if cache_path else None
+
+        return cls(
+            providers,
+            cache=cache,
+            requests_per_minute={
+                "openai": float(os.getenv("LLM_GATEWAY_OPENAI_RPM", "500")),
+                "anthropic": float(os.getenv("LLM_GATEWAY_ANTHROPIC_RPM", "50"))
+            },
+            max_concurrency=int(os.getenv("LLM_GATEWAY_MAX_CONCURRENCY", "8"))
+        )
+
+    @classmethod
+    def shared(cls, openai_api_key: Optional[str] = None, anthropic_api_key: Optional[str] = None) -> 'LLMGateway':
+        """Process-wide gateway per API key pair, so services built with the same keys share clients, cache and limits"""
+        key = (openai_api_key, anthropic_api_key)
+        if key not in cls._shared:
+            cls._shared[key] = cls.from_env(openai_api_key, anthropic_api_key)
+        return cls._shared[key]
+
+    async def complete(self, provider: str, prompt: str, *, model: str, max_tokens: int = 1000,
+                       system: Optional[str] = None, temperature: Optional[float] = None,
+                       caller: str = "default", parse: Optional[Callable[[str], Any]] = None,
+                       use_cache: bool = False) -> Any:
+        request = {"model": model, "prompt": prompt, "system": system,
+                   "max_tokens": max_tokens, "temperature": temperature}
+        key = LLMResponseCache.make_key(provider, request)
+        metrics = self._caller_metrics(caller)
+        metrics["calls"] += 1
+        started = time.monotonic()
+
+        try:
+            if use_cache and self.cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    try:
+                        result = parse(cached) if parse else cached
+                        metrics["cache_hits"] += 1
+                        return result
+                    except ValueError:
+                        pass  # Unparseable entry; fetch a fresh response
+
+            coalesced = False
+            while key in self._in_flight:
+                in_flight = self._in_flight[key]
+                if not coalesced:
+                    metrics["coalesced"] += 1
+                    coalesced = True
+                try:
+                    text = await asyncio.shield(in_flight)
+                except asyncio.CancelledError:
+                    if not in_flight.cancelled():
+                        raise  # This caller was cancelled, not the leader
+                    continue  # Join whichever follower took over, or take over below
+                return parse(text) if parse else text
+
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            try:
+                completion = await self._call_provider(provider, request)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                future.exception()  # Followers re-raise it; don't warn when there are none
+                raise
+            finally:
+                self._in_flight.pop(key, None)
+            future.set_result(completion.text)
+
+            metrics["provider_calls"] += 1
+            metrics["input_tokens"] += completion.input_tokens
+            metrics["output_tokens"] += completion.output_tokens
+            input_price, output_price = MODEL_PRICING.get(model, (0.0, 0.0))
+            metrics["cost_usd"] += (completion.input_tokens * input_price + completion.output_tokens * output_price) / 1000
+
+            result = parse(completion.text) if parse else completion.text
+            if use_cache and self.cache:
+                self.cache.set(key, completion.text)
+            return result
+
+        except Exception:
+            metrics["errors"] += 1
+            raise
+        finally:
+            latency_ms = (time.monotonic() - started) * 1000
+            metrics["total_latency_ms"] += latency_ms
+            metrics["max_latency_ms"] = max(metrics["max_latency_ms"], latency_ms)
+
+    async def _call_provider(self, provider: str, request: Dict[str, Any]) -> LLMCompletion:
+        if provider not in self.providers:
+            raise RuntimeError(f"LLM provider {provider} is not configured")
+
+        bucket = self._buckets.get(provider)
+        if bucket:
+            await bucket.acquire()
+
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            return await self.providers[provider].complete(request)
+        async with semaphore:
+            return await self.providers[provider].complete(request)
+
+    def _caller_metrics(self, caller: str) -> Dict[str, float]:
+        if caller not in self.metrics:
+            self.metrics[caller] = {
+                "calls": 0, "cache_hits": 0, "coalesced": 0, "provider_calls": 0, "errors": 0,
+                "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+                "total_latency_ms": 0.0, "max_latency_ms": 0.0
+            }
+        return self.metrics[caller]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        callers = {}
+        for caller, metrics in self.metrics.items():
+            callers[caller] = {
+                **metrics,
+                "cost_usd": round(metrics["cost_usd"], 4),
+                "avg_latency_ms": round(metrics["total_latency_ms"] / metrics["calls"], 2) if metrics["calls"] else 0.0
+            }
+        return {
+            "callers": callers,
+            "in_flight": len(self._in_flight),
+            "cache": self.cache.get_stats() if self.cache else None
+        }
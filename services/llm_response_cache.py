@@ -0,0 +1,112 @@
+"""
+LLM Response Cache
+On-disk cache of LLM responses keyed by a content hash of the provider,
+model, prompt and call parameters, with per-entry expiry
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    Content-addressed LLM response cache backed by SQLite
+
+    Identical requests hash to the same key, so a prompt whose inputs have
+    not changed is answered from disk until `ttl_seconds` after it was
+    stored. Entries are plain response text; callers decide what is worth
+    caching (for example, only responses that parsed). Cache errors are
+    logged and treated as misses so a broken cache never fails a call.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 14 * 86400.0):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @staticmethod
+    def make_key(provider: str, request: Dict[str, Any]) -> str:
+        """Hash of everything that determines the response"""
+        payload = json.dumps({"provider": provider, "request": request}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            try:
+                row = self._connection().execute(
+                    "SELECT response FROM llm_responses WHERE cache_key = ? AND expires_at > ?",
+                    (key, time.time())
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache read failed: {e}")
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, response: str, ttl_seconds: Optional[float] = None):
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (cache_key, response, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, response, now, expires_at)
+                )
+                conn.commit()
+                self.writes += 1
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache write failed: {e}")
+
+    def purge_expired(self) -> int:
+        """Delete expired entries; returns how many were removed"""
+        with self._lock:
+            try:
+                conn = self._connection()
+                removed = conn.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (time.time(),)).rowcount
+                conn.commit()
+                return removed
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache purge failed: {e}")
+                return 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    cache_key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_expires_at ON llm_responses(expires_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
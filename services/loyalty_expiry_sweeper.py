@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Loyalty Points Expiry Sweeper for 6FB AI Agent System
+Expires due loyalty points in bounded chunks across all barbershops, resuming
+from a persisted (expires_at, id) cursor so a backlog is drained over several
+runs instead of in one spike
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from services.loyalty_program_service import LoyaltyProgramService
+
+logger = logging.getLogger(__name__)
+
+SWEEP_NAME = "loyalty_points_expiry"
+
+
+class LoyaltyExpirySweeper:
+    """
+    Scheduled expiry of loyalty points
+
+    Each run processes at most `max_chunks_per_run` chunks of `chunk_size`
+    due rows, in expires_at order, using idx_loyalty_points_expiry_due. Every
+    chunk becomes one bulk ledger write per barbershop, then the cursor is
+    saved to loyalty_expiry_sweep_state, so a restart resumes where the last
+    chunk finished. Rows whose reversal fails (for example, the customer left
+    the program) stay unexpired behind the cursor and are logged rather than
+    retried every run. A chunk whose ledger write failed is not passed: the
+    run ends with the cursor before it, so the next run retries it (rows
+    already expired drop out of the due query, and reversals already written
+    are skipped by their idempotency key).
+
+    Run one sweeper per deployment (LOYALTY_EXPIRY_SWEEPER_ENABLED); the
+    loyalty router starts it on app startup.
+    """
+
+    def __init__(self, loyalty_service: LoyaltyProgramService):
+        self.loyalty_service = loyalty_service
+        self.supabase = loyalty_service.supabase
+        self.sweep_interval = int(os.getenv('LOYALTY_EXPIRY_SWEEP_INTERVAL', '900'))  # seconds
+        self.chunk_size = int(os.getenv('LOYALTY_EXPIRY_CHUNK_SIZE', '500'))
+        self.max_chunks_per_run = int(os.getenv('LOYALTY_EXPIRY_MAX_CHUNKS_PER_RUN', '10'))
+        self.is_running = False
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event = asyncio.Event()
+
+        self.stats = {
+            'runs': 0,
+            'rows_processed': 0,
+            'points_expired': 0,
+            'failed': 0,
+            'last_run_at': None,
+            'backlog_remaining': False
+        }
+
+    async def start(self):
+        """Start the periodic sweep loop"""
+        if self.is_running:
+            logger.warning("Loyalty expiry sweeper is already running")
+            return
+
+        self.is_running = True
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._sweep_loop())
+        logger.info(f"Loyalty expiry sweeper started (every {self.sweep_interval}s, "
+                    f"up to {self.chunk_size * self.max_chunks_per_run} rows per run)")
+
+    async def stop(self):
+        """Stop the sweep loop, waiting for an in-flight chunk to finish"""
+        if not self.is_running:
+            return
+
+        # Cancelling mid-chunk could leave reversals written for rows not yet
+        # marked expired, so the run is asked to end after its current chunk
+        self.is_running = False
+        self._stop_event.set()
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        logger.info("Loyalty expiry sweeper stopped")
+
+    async def _sweep_loop(self):
+        while self.is_running:
+            try:
+                await self.sweep_once()
+                delay = self.sweep_interval
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Loyalty expiry sweep failed: {e}")
+                delay = 60  # Wait before retrying
+
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def sweep_once(self) -> Dict[str, Any]:
+        """Process up to max_chunks_per_run chunks of due points"""
+        now = datetime.utcnow().isoformat()
+        state = self._load_state()
+        cursor = (state["last_expires_at"], state["last_point_id"]) if state.get("last_point_id") else None
+
+        rows_processed = 0
+        points_expired = 0
+        failed = 0
+        chunks = 0
+        backlog_remaining = False
+
+        while chunks < self.max_chunks_per_run and not self._stop_event.is_set():
+            due_points = await self.loyalty_service.fetch_due_points(now, cursor=cursor, limit=self.chunk_size)
+            if not due_points:
+                break
+
+            # Ledger writes are per barbershop; a chunk usually spans only a few
+            by_barbershop: Dict[str, list] = {}
+            for point in due_points:
+                by_barbershop.setdefault(point["barbershop_id"], []).append(point)
+
+            write_failed = False
+            for barbershop_id, points in by_barbershop.items():
+                result = await self.loyalty_service.expire_points_batch(barbershop_id, points)
+                points_expired += result["total_expired_points"]
+                if any(failure.get("retryable") for failure in result["failed"]):
+                    write_failed = True
+                    continue
+                failed += len(result["failed"])
+                for failure in result["failed"]:
+                    logger.warning(f"Could not expire points for customer {failure['customer_id']} "
+                                   f"in barbershop {barbershop_id}: {failure['reason']}")
+
+            if write_failed:
+                logger.error("Ledger write failed while expiring points; retrying the chunk next run")
+                backlog_remaining = True
+                break
+
+            cursor = (due_points[-1]["expires_at"], due_points[-1]["id"])
+            rows_processed += len(due_points)
+            chunks += 1
+            self._save_state(cursor, state.get("rows_processed", 0) + rows_processed)
+
+            if len(due_points) < self.chunk_size:
+                break
+        else:
+            backlog_remaining = True
+
+        self.stats['runs'] += 1
+        self.stats['rows_processed'] += rows_processed
+        self.stats['points_expired'] += points_expired
+        self.stats['failed'] += failed
+        self.stats['last_run_at'] = now
+        self.stats['backlog_remaining'] = backlog_remaining
+
+        if rows_processed:
+            logger.info(f"Expired {points_expired} points from {rows_processed} ledger rows"
+                        f"{' (backlog remaining)' if backlog_remaining else ''}")
+
+        return {
+            "rows_processed": rows_processed,
+            "points_expired": points_expired,
+            "failed": failed,
+            "backlog_remaining": backlog_remaining
+        }
+
+    def _load_state(self) -> Dict[str, Any]:
+        result = self.supabase.table("loyalty_expiry_sweep_state").select("*").eq("sweep_name", SWEEP_NAME).execute()
+        return result.data[0] if result.data else {}
+
+    def _save_state(self, cursor: tuple, rows_processed: int):
+        self.supabase.table("loyalty_expiry_sweep_state").upsert({
+            "sweep_name": SWEEP_NAME,
+            "last_expires_at": cursor[0],
+            "last_point_id": cursor[1],
+            "rows_processed": rows_processed
+        }).execute()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'is_running': self.is_running,
+            'sweep_interval_seconds': self.sweep_interval,
+            'max_rows_per_run': self.chunk_size * self.max_chunks_per_run,
+            **self.stats
+        }
+
+
+async def main():
+    """Run the sweeper standalone"""
+    import redis
+    from supabase import create_client
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    supabase = create_client(os.environ["NEXT_PUBLIC_SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"])
+    redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+    sweeper = LoyaltyExpirySweeper(LoyaltyProgramService(supabase, redis_client))
+
+    try:
+        await sweeper.start()
+        while sweeper.is_running:
+            await asyncio.sleep(1)
+    except KeyboardInterrupt:
+        logger.info("Received interrupt signal")
+    finally:
+        await sweeper.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
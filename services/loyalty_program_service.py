@@ -5,12 +5,14 @@ Handles points, tiers, rewards, referrals, and gamification
 """
 
 import asyncio
+import bisect
+import calendar
 import json
 import logging
 import uuid
 from datetime import datetime, timedelta, date
 from decimal import Decimal
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Tuple, Union
 import redis
 from supabase import Client
 
@@ -18,6 +20,90 @@ from supabase import Client
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rows per bulk insert and ids per in_() filter, to keep PostgREST requests bounded
+LEDGER_BATCH_SIZE = 500
+
+# Leaderboard sorted sets: the all-time board is rebuilt from enrollments at least
+# daily to correct drift; period boards live a little longer than their period
+LEADERBOARD_PERIODS = ("all_time", "yearly", "monthly", "weekly")
+LEADERBOARD_TTL = {"all_time": 86400, "yearly": 400 * 86400, "monthly": 62 * 86400, "weekly": 14 * 86400}
+LEADERBOARD_ALL_PROGRAMS = "all"
+
+# ZINCRBY each (increment, member) pair in ARGV only if the board already exists
+LEADERBOARD_INCREMENT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for i = 1, #ARGV, 2 do
+    redis.call('ZINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+return 1
+"""
+
+def _chunks(items: List[Any], size: int = LEDGER_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class TierLadder:
+    """
+    A program's active tiers compiled for upgrade checks
+
+    Visit and spending requirements are laid out as breakpoint lists in tier
+    level order. When requirements never decrease with level, the tiers a
+    customer qualifies for form a prefix and the highest one is found with two
+    bisects; otherwise the tiers are scanned from the top. A missing criterion
+    never blocks a tier.
+    """
+    
+    __slots__ = ("tiers", "_levels", "_by_name", "_by_level", "_visits", "_spending", "_monotonic")
+    
+    def __init__(self, tiers: List[Dict[str, Any]]):
+        self.tiers = sorted(tiers, key=lambda t: t["tier_level"])
+        self._levels = [t["tier_level"] for t in self.tiers]
+        self._by_name = {t["tier_name"]: t for t in self.tiers}
+        self._by_level = {t["tier_level"]: t for t in self.tiers}
+        self._visits = [self._requirement(t, "visits_required") for t in self.tiers]
+        self._spending = [self._requirement(t, "spending_required") for t in self.tiers]
+        self._monotonic = all(a <= b for a, b in zip(self._visits, self._visits[1:])) and \
+            all(a <= b for a, b in zip(self._spending, self._spending[1:]))
+    
+    @staticmethod
+    def _requirement(tier: Dict[str, Any], criterion: str) -> float:
+        value = (tier.get("qualification_criteria") or {}).get(criterion)
+        return float("-inf") if value is None else value
+    
+    def tier_named(self, tier_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self._by_name.get(tier_name) if tier_name else None
+    
+    def tier_at_level(self, tier_level: int) -> Optional[Dict[str, Any]]:
+        return self._by_level.get(tier_level)
+    
+    def level_of(self, tier_name: Optional[str]) -> int:
+        """Level of the named tier, 0 for no tier or an unknown one"""
+        tier = self.tier_named(tier_name)
+        return tier["tier_level"] if tier else 0
+    
+    def has_tier_above(self, tier_level: int) -> bool:
+        return bool(self._levels) and self._levels[-1] > tier_level
+    
+    def highest_qualifying(self, analytics: Dict[str, Any], above_level: int = 0) -> Optional[Dict[str, Any]]:
+        """Highest tier above `above_level` whose requirements the analytics meet"""
+        visits = analytics.get("total_visits", 0)
+        spent = analytics.get("total_spent", 0)
+        
+        if self._monotonic:
+            index = min(bisect.bisect_right(self._visits, visits), bisect.bisect_right(self._spending, spent)) - 1
+            if index >= 0 and self._levels[index] > above_level:
+                return self.tiers[index]
+            return None
+        
+        for index in range(len(self.tiers) - 1, -1, -1):
+            if self._levels[index] <= above_level:
+                break
+            if self._visits[index] <= visits and self._spending[index] <= spent:
+                return self.tiers[index]
+        return None
+
 class LoyaltyProgramService:
     """Service for managing loyalty programs, points, tiers, and rewards"""
     
@@ -25,6 +111,8 @@ class LoyaltyProgramService:
         self.supabase = supabase_client
         self.redis = redis_client
         self.cache_ttl = 3600  # 1 hour cache TTL
+        # Compiled ladders keyed by tier cache key, reused while the cached tiers are unchanged
+        self._tier_ladders: Dict[str, Tuple[Any, TierLadder]] = {}
         
     # ============================================
     # LOYALTY PROGRAM MANAGEMENT
@@ -181,11 +269,14 @@ class LoyaltyProgramService:
             
             transaction = result.data[0]
             
+            # Keep leaderboards current
+            self._record_leaderboard_points([transaction])
+            
             # Check for tier upgrade
-            tier_upgrade_info = await self._check_and_process_tier_upgrade(customer_id, loyalty_program_id, barbershop_id)
+            tier_upgrade_info = await self._check_and_process_tier_upgrade(customer_id, loyalty_program_id, barbershop_id, enrollment)
             
             # Clear customer cache
-            await self._clear_customer_cache(customer_id, barbershop_id)
+            await self._clear_customer_cache(customer_id, barbershop_id, [loyalty_program_id])
             
             return {
                 "transaction_id": transaction["id"],
@@ -331,26 +422,13 @@ class LoyaltyProgramService:
             # Get customer analytics
             analytics = await self._get_customer_analytics(customer_id, barbershop_id)
             
-            # Get available tiers
-            tiers = await self.get_loyalty_tiers(barbershop_id, enrollment["loyalty_program_id"])
-            
             # Find current tier level
-            current_tier_level = 0
-            if enrollment.get("current_tier"):
-                current_tier = next((t for t in tiers if t["tier_name"] == enrollment["current_tier"]), None)
-                if current_tier:
-                    current_tier_level = current_tier["tier_level"]
-            
-            # Check eligibility for higher tiers
-            eligible_tiers = []
-            for tier in tiers:
-                if tier["tier_level"] > current_tier_level:
-                    if await self._meets_tier_requirements(tier, analytics):
-                        eligible_tiers.append(tier)
+            ladder = await self._get_tier_ladder(barbershop_id, enrollment["loyalty_program_id"])
+            current_tier_level = ladder.level_of(enrollment.get("current_tier"))
             
             # Get the highest eligible tier
-            if eligible_tiers:
-                next_tier = max(eligible_tiers, key=lambda t: t["tier_level"])
+            next_tier = ladder.highest_qualifying(analytics, above_level=current_tier_level)
+            if next_tier:
                 return {
                     "eligible": True,
                     "next_tier": next_tier,
@@ -359,7 +437,7 @@ class LoyaltyProgramService:
                 }
             
             # Check progress to next tier
-            next_tier = next((t for t in tiers if t["tier_level"] == current_tier_level + 1), None)
+            next_tier = ladder.tier_at_level(current_tier_level + 1)
             if next_tier:
                 progress = await self._calculate_tier_requirement_progress(next_tier, analytics)
                 return {
@@ -406,7 +484,7 @@ class LoyaltyProgramService:
             await self._create_tier_upgrade_milestone(customer_id, barbershop_id, tier["tier_name"])
             
             # Clear cache
-            await self._clear_customer_cache(customer_id, barbershop_id)
+            await self._clear_customer_cache(customer_id, barbershop_id, [tier["loyalty_program_id"]])
             
             logger.info(f"Upgraded customer {customer_id} to tier {tier['tier_name']}")
             
@@ -678,41 +756,43 @@ class LoyaltyProgramService:
     # ============================================
     
     async def get_leaderboard(self, barbershop_id: str, program_id: Optional[str] = None, period: str = "all_time", limit: int = 10) -> List[Dict[str, Any]]:
-        """Get customer leaderboard"""
+        """
+        Get customer leaderboard
+        
+        Ranks come from a Redis sorted set per barbershop, program and period
+        that every points transaction updates, so a request costs O(log n + k)
+        plus one lookup for the names and tiers of the k customers shown.
+        all_time ranks by current balance; yearly/monthly/weekly rank by points
+        earned in the current period.
+        """
         try:
-            # Build base query
-            query = self.supabase.table("loyalty_program_enrollments").select("""
-                customer_id,
-                current_points,
-                lifetime_points_earned,
-                current_tier,
-                customers!inner(first_name, last_name)
-            """).eq("barbershop_id", barbershop_id).eq("is_active", True)
+            if period not in LEADERBOARD_PERIODS:
+                raise ValueError(f"Unknown leaderboard period: {period}")
             
-            if program_id:
-                query = query.eq("loyalty_program_id", program_id)
+            key = self._leaderboard_key(barbershop_id, program_id or LEADERBOARD_ALL_PROGRAMS, period, datetime.utcnow())
+            if not self.redis.exists(key):
+                await self.rebuild_leaderboard(barbershop_id, program_id, period)
             
-            # Apply period filter for points earned
-            if period != "all_time":
-                # This would require additional logic to filter by time period
-                pass
+            top = [(member, score) for member, score in self.redis.zrevrange(key, 0, limit - 1, withscores=True) if member]
+            if not top:
+                return []
             
-            # Execute query and sort by points
-            result = query.execute()
-            enrollments = result.data or []
+            customer_ids = [customer_id for customer_id, _ in top]
+            customers_result = self.supabase.table("customers").select("id, first_name, last_name").in_("id", customer_ids).execute()
+            customers = {c["id"]: c for c in customers_result.data or []}
             
-            # Sort by total points and add position
-            sorted_enrollments = sorted(enrollments, key=lambda e: e["current_points"], reverse=True)
+            enrollments = await self._load_enrollments(barbershop_id, customer_ids, [program_id] if program_id else None)
+            tiers = {customer_id: enrollment.get("current_tier") for (customer_id, _), enrollment in enrollments.items()}
             
             # Format leaderboard entries
             leaderboard = []
-            for i, enrollment in enumerate(sorted_enrollments[:limit]):
-                customer = enrollment["customers"]
+            for i, (customer_id, score) in enumerate(top):
+                customer = customers.get(customer_id, {})
                 entry = {
-                    "customer_id": enrollment["customer_id"],
-                    "customer_name": f"{customer['first_name']} {customer['last_name']}",
-                    "total_points": enrollment["current_points"],
-                    "tier": enrollment.get("current_tier"),
+                    "customer_id": customer_id,
+                    "customer_name": f"{customer.get('first_name', '')} {customer.get('last_name', '')}".strip(),
+                    "total_points": int(score),
+                    "tier": tiers.get(customer_id),
                     "position": i + 1,
                     "badge": self._get_position_badge(i + 1)
                 }
@@ -724,6 +804,53 @@ class LoyaltyProgramService:
             logger.error(f"Error getting leaderboard: {str(e)}")
             raise e
     
+    async def rebuild_leaderboard(self, barbershop_id: str, program_id: Optional[str] = None, period: str = "all_time"):
+        """
+        Rebuild one leaderboard sorted set from the database
+        
+        Rows are read in LEDGER_BATCH_SIZE pages by id so a yearly board over
+        a busy shop never pulls its whole ledger in one response.
+        """
+        now = datetime.utcnow()
+        scores: Dict[str, int] = {}
+        
+        if period == "all_time":
+            table, columns, score_column = "loyalty_program_enrollments", "id, customer_id, current_points", "current_points"
+        else:
+            table, columns, score_column = "loyalty_points", "id, customer_id, points_amount", "points_amount"
+        
+        last_id = None
+        while True:
+            query = self.supabase.table(table).select(columns).eq("barbershop_id", barbershop_id)
+            if period == "all_time":
+                query = query.eq("is_active", True)
+            else:
+                query = query.in_("transaction_type", ["earned", "bonus"]).gte("created_at", self._leaderboard_period_start(period, now).isoformat())
+            if program_id:
+                query = query.eq("loyalty_program_id", program_id)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            
+            rows = query.order("id").limit(LEDGER_BATCH_SIZE).execute().data or []
+            for row in rows:
+                scores[row["customer_id"]] = scores.get(row["customer_id"], 0) + (row[score_column] or 0)
+            if len(rows) < LEDGER_BATCH_SIZE:
+                break
+            last_id = rows[-1]["id"]
+        
+        key = self._leaderboard_key(barbershop_id, program_id or LEADERBOARD_ALL_PROGRAMS, period, now)
+        staging_key = f"{key}:rebuild:{uuid.uuid4().hex[:8]}"
+        
+        pipe = self.redis.pipeline()
+        if scores:
+            pipe.zadd(staging_key, scores)
+        else:
+            # Placeholder member so an empty board still counts as built
+            pipe.zadd(staging_key, {"": float("-inf")})
+        pipe.rename(staging_key, key)
+        pipe.expire(key, LEADERBOARD_TTL[period])
+        pipe.execute()
+    
     async def get_customer_achievements(self, customer_id: str, barbershop_id: str, program_id: Optional[str] = None) -> Dict[str, Any]:
         """Get customer achievements and badges"""
         try:
@@ -805,47 +932,36 @@ class LoyaltyProgramService:
     # ============================================
     
     async def process_expired_points(self, barbershop_id: str, dry_run: bool = True) -> Dict[str, Any]:
-        """Process expired loyalty points"""
+        """Process expired loyalty points for one barbershop, a chunk at a time"""
         try:
-            # Find expired points
-            expired_points_result = self.supabase.table("loyalty_points").select("*").eq("barbershop_id", barbershop_id).eq("is_expired", False).lt("expires_at", datetime.utcnow().isoformat()).execute()
+            now = datetime.utcnow().isoformat()
+            cursor = None
+            expired_points_count = 0
+            processed_count = 0
+            total_expired_points = 0
             
-            expired_points = expired_points_result.data or []
+            while True:
+                due_points = await self.fetch_due_points(now, cursor=cursor, barbershop_id=barbershop_id)
+                if not due_points:
+                    break
+                cursor = (due_points[-1]["expires_at"], due_points[-1]["id"])
+                expired_points_count += len(due_points)
+                
+                if dry_run:
+                    total_expired_points += sum(p["points_amount"] for p in due_points if p["points_amount"] > 0)
+                    continue
+                
+                result = await self.expire_points_batch(barbershop_id, due_points)
+                processed_count += result["processed_count"]
+                total_expired_points += result["total_expired_points"]
             
             if dry_run:
                 return {
                     "dry_run": True,
-                    "expired_points_count": len(expired_points),
-                    "total_points_to_expire": sum(p["points_amount"] for p in expired_points if p["points_amount"] > 0)
+                    "expired_points_count": expired_points_count,
+                    "total_points_to_expire": total_expired_points
                 }
             
-            # Process each expired point transaction
-            processed_count = 0
-            total_expired_points = 0
-            
-            for point_transaction in expired_points:
-                if point_transaction["points_amount"] > 0:  # Only process earned points
-                    # Create expiration transaction
-                    await self.process_points_transaction(
-                        barbershop_id=barbershop_id,
-                        transaction_data={
-                            "customer_id": point_transaction["customer_id"],
-                            "loyalty_program_id": point_transaction["loyalty_program_id"],
-                            "transaction_type": "expired",
-                            "points_amount": -point_transaction["points_amount"],
-                            "source_type": "point_expiration",
-                            "source_id": point_transaction["id"],
-                            "description": f"Points expired from transaction {point_transaction['id']}"
-                        },
-                        processed_by_user_id="system"
-                    )
-                    
-                    # Mark original transaction as expired
-                    self.supabase.table("loyalty_points").update({"is_expired": True}).eq("id", point_transaction["id"]).execute()
-                    
-                    processed_count += 1
-                    total_expired_points += point_transaction["points_amount"]
-            
             return {
                 "dry_run": False,
                 "processed_count": processed_count,
@@ -856,6 +972,66 @@ class LoyaltyProgramService:
             logger.error(f"Error processing expired points: {str(e)}")
             raise e
     
+    async def fetch_due_points(self, due_before: str, cursor: Optional[tuple] = None, barbershop_id: Optional[str] = None, limit: int = LEDGER_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """
+        Unexpired points rows with expires_at before `due_before`, oldest first
+        
+        Pages by the (expires_at, id) keyset after `cursor`, which the partial
+        index idx_loyalty_points_expiry_due serves directly.
+        """
+        query = self.supabase.table("loyalty_points").select("*").eq("is_expired", False).lt("expires_at", due_before)
+        if barbershop_id:
+            query = query.eq("barbershop_id", barbershop_id)
+        if cursor:
+            expires_at, point_id = cursor
+            # Timestamps contain PostgREST-reserved characters, so they are quoted
+            query = query.or_(f'expires_at.gt."{expires_at}",and(expires_at.eq."{expires_at}",id.gt.{point_id})')
+        
+        result = query.order("expires_at").order("id").limit(limit).execute()
+        return result.data or []
+    
+    async def expire_points_batch(self, barbershop_id: str, due_points: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Reverse a chunk of expired earnings with one ledger write and mark them expired
+        
+        Each reversal carries the idempotency key expire:<point id>, so a row
+        whose reversal was written but which was never marked expired is only
+        marked on the next run, not reversed again.
+        """
+        earned_points = [p for p in due_points if p["points_amount"] > 0]
+        batch = await self.apply_points_batch(
+            barbershop_id,
+            [{
+                "customer_id": point_transaction["customer_id"],
+                "loyalty_program_id": point_transaction["loyalty_program_id"],
+                "transaction_type": "expired",
+                "points_amount": -point_transaction["points_amount"],
+                "source_type": "point_expiration",
+                "source_id": point_transaction["id"],
+                "description": f"Points expired from transaction {point_transaction['id']}",
+                "idempotency_key": f"expire:{point_transaction['id']}"
+            } for point_transaction in earned_points],
+            processed_by_user_id="system"
+        )
+        
+        # Mark the original transactions that were reversed, now or on an earlier run, as expired
+        reversed_ids = [record["source_id"] for record in batch["applied"]]
+        reversed_ids.extend(skipped["idempotency_key"].split(":", 1)[1] for skipped in batch["skipped"])
+        customer_by_point = {p["id"]: p["customer_id"] for p in earned_points}
+        failed = list(batch["failed"])
+        for chunk in _chunks(reversed_ids):
+            try:
+                self.supabase.table("loyalty_points").update({"is_expired": True}).in_("id", chunk).execute()
+            except Exception as e:
+                logger.error(f"Error marking expired points: {str(e)}")
+                failed.extend({"customer_id": customer_by_point.get(point_id), "reason": str(e), "retryable": True} for point_id in chunk)
+        
+        return {
+            "processed_count": len(batch["applied"]),
+            "total_expired_points": -sum(record["points_amount"] for record in batch["applied"]),
+            "failed": failed
+        }
+    
     async def calculate_tier_upgrades(self, barbershop_id: str, program_id: Optional[str] = None, dry_run: bool = True) -> Dict[str, Any]:
         """Calculate and process tier upgrades for eligible customers"""
         try:
@@ -867,48 +1043,30 @@ class LoyaltyProgramService:
             enrollments_result = query.execute()
             enrollments = enrollments_result.data or []
             
-            eligible_upgrades = []
-            
-            # Check each customer for tier upgrade eligibility
-            for enrollment in enrollments:
-                upgrade_info = await self.check_tier_upgrade_eligibility(
-                    enrollment["customer_id"],
-                    barbershop_id,
-                    enrollment["loyalty_program_id"]
-                )
-                
-                if upgrade_info.get("eligible"):
-                    eligible_upgrades.append({
-                        "customer_id": enrollment["customer_id"],
-                        "current_tier": enrollment.get("current_tier"),
-                        "new_tier": upgrade_info["next_tier"],
-                        "enrollment_id": enrollment["id"]
-                    })
+            # One ladder per program, evaluated against every enrollment
+            eligible_upgrades = await self._find_tier_upgrades(barbershop_id, enrollments)
             
             if dry_run:
                 return {
                     "dry_run": True,
                     "eligible_customers": len(eligible_upgrades),
-                    "upgrades": eligible_upgrades
+                    "upgrades": [{
+                        "customer_id": enrollment["customer_id"],
+                        "current_tier": enrollment.get("current_tier"),
+                        "new_tier": tier,
+                        "enrollment_id": enrollment["id"]
+                    } for enrollment, tier in eligible_upgrades]
                 }
             
             # Process upgrades
-            upgraded_customers = []
-            for upgrade in eligible_upgrades:
-                try:
-                    result = await self.upgrade_customer_tier(
-                        upgrade["customer_id"],
-                        upgrade["new_tier"]["id"],
-                        barbershop_id,
-                        "system"
-                    )
-                    if result["success"]:
-                        upgraded_customers.append({
-                            "customer_id": upgrade["customer_id"],
-                            "new_tier": result["new_tier_name"]
-                        })
-                except Exception as e:
-                    logger.error(f"Failed to upgrade customer {upgrade['customer_id']}: {str(e)}")
+            upgraded_customers = await self._write_tier_upgrades(barbershop_id, eligible_upgrades)
+            
+            # Cached balances carry the tier, so drop them for everyone upgraded
+            programs_by_customer: Dict[str, List[str]] = {}
+            for enrollment, _ in eligible_upgrades:
+                programs_by_customer.setdefault(enrollment["customer_id"], []).append(enrollment["loyalty_program_id"])
+            for upgrade in upgraded_customers:
+                await self._clear_customer_cache(upgrade["customer_id"], barbershop_id, programs_by_customer[upgrade["customer_id"]])
             
             return {
                 "dry_run": False,
@@ -924,22 +1082,9 @@ class LoyaltyProgramService:
     async def process_birthday_bonuses(self, barbershop_id: str, program_id: Optional[str] = None, dry_run: bool = True) -> Dict[str, Any]:
         """Process birthday bonus points for customers"""
         try:
-            # Get customers with birthdays today
+            # Get customers with birthdays today from the (birth_month, birth_day) index
             today = date.today()
-            
-            # Query customers with today's birthday
-            customers_result = self.supabase.table("customers").select("id, user_id, date_of_birth").eq("barbershop_id", barbershop_id).execute()
-            customers = customers_result.data or []
-            
-            birthday_customers = []
-            for customer in customers:
-                if customer.get("date_of_birth"):
-                    try:
-                        birth_date = datetime.fromisoformat(customer["date_of_birth"]).date()
-                        if birth_date.month == today.month and birth_date.day == today.day:
-                            birthday_customers.append(customer)
-                    except:
-                        continue
+            birthday_customers = await self._get_birthday_customers(barbershop_id, today)
             
             if dry_run:
                 return {
@@ -948,46 +1093,50 @@ class LoyaltyProgramService:
                     "birthday_customers": [c["id"] for c in birthday_customers]
                 }
             
-            # Process birthday bonuses
-            processed_bonuses = []
+            # Process birthday bonuses for every enrolled birthday customer at once
+            enrollments = await self._load_enrollments(
+                barbershop_id,
+                customer_ids=[c["id"] for c in birthday_customers],
+                program_ids=[program_id] if program_id else None
+            )
+            enrollment_by_customer = {}
+            for enrollment in enrollments.values():
+                enrollment_by_customer.setdefault(enrollment["customer_id"], enrollment)
+            
+            programs = await self._load_programs(barbershop_id, list({e["loyalty_program_id"] for e in enrollment_by_customer.values()}))
+            
+            transactions = []
             for customer in birthday_customers:
-                # Check if customer is enrolled in loyalty program
-                enrollment_query = self.supabase.table("loyalty_program_enrollments").select("*").eq("customer_id", customer["id"]).eq("barbershop_id", barbershop_id).eq("is_active", True)
-                if program_id:
-                    enrollment_query = enrollment_query.eq("loyalty_program_id", program_id)
+                enrollment = enrollment_by_customer.get(customer["id"])
+                if not enrollment:
+                    continue
                 
-                enrollment_result = enrollment_query.execute()
-                if enrollment_result.data:
-                    # Get loyalty program details
-                    enrollment = enrollment_result.data[0]
-                    program = await self.get_loyalty_program(enrollment["loyalty_program_id"], barbershop_id)
-                    
-                    # Calculate birthday bonus
-                    bonus_points = program.get("earning_rules", {}).get("bonus_multipliers", {}).get("birthday_bonus", 100)
-                    
-                    # Award birthday bonus
-                    await self.process_points_transaction(
-                        barbershop_id=barbershop_id,
-                        transaction_data={
-                            "customer_id": customer["id"],
-                            "loyalty_program_id": enrollment["loyalty_program_id"],
-                            "transaction_type": "bonus",
-                            "points_amount": bonus_points,
-                            "source_type": "birthday_bonus",
-                            "description": "Happy Birthday bonus points!"
-                        },
-                        processed_by_user_id="system"
-                    )
-                    
-                    processed_bonuses.append({
-                        "customer_id": customer["id"],
-                        "bonus_points": bonus_points
-                    })
+                # Calculate birthday bonus
+                program = programs.get(enrollment["loyalty_program_id"]) or {}
+                bonus_points = program.get("earning_rules", {}).get("bonus_multipliers", {}).get("birthday_bonus", 100)
+                
+                transactions.append({
+                    "customer_id": customer["id"],
+                    "loyalty_program_id": enrollment["loyalty_program_id"],
+                    "transaction_type": "bonus",
+                    "points_amount": bonus_points,
+                    "source_type": "birthday_bonus",
+                    "description": "Happy Birthday bonus points!",
+                    # One birthday bonus per customer, program and year, however often the job runs
+                    "idempotency_key": f"birthday_bonus:{customer['id']}:{enrollment['loyalty_program_id']}:{today.year}"
+                })
+            
+            batch = await self.apply_points_batch(barbershop_id, transactions, "system", enrollments)
+            processed_bonuses = [
+                {"customer_id": record["customer_id"], "bonus_points": record["points_amount"]}
+                for record in batch["applied"]
+            ]
             
             return {
                 "dry_run": False,
                 "birthday_customers_count": len(birthday_customers),
                 "bonuses_processed": len(processed_bonuses),
+                "already_awarded": len(batch["skipped"]),
                 "birthday_customers": processed_bonuses
             }
             
@@ -1030,8 +1179,8 @@ class LoyaltyProgramService:
                 tier_multiplier = 1.0
                 if enrollment.get("current_tier"):
                     # Get tier benefits
-                    tiers = await self.get_loyalty_tiers(barbershop_id, enrollment["loyalty_program_id"])
-                    customer_tier = next((t for t in tiers if t["tier_name"] == enrollment["current_tier"]), None)
+                    ladder = await self._get_tier_ladder(barbershop_id, enrollment["loyalty_program_id"])
+                    customer_tier = ladder.tier_named(enrollment["current_tier"])
                     if customer_tier:
                         tier_benefits = customer_tier.get("benefits", {})
                         tier_multiplier = tier_benefits.get("point_multiplier", 1.0)
@@ -1138,47 +1287,171 @@ class LoyaltyProgramService:
     # BULK OPERATIONS
     # ============================================
     
+    async def apply_points_batch(self, barbershop_id: str, transactions: List[Dict[str, Any]], processed_by_user_id: str, enrollments: Optional[Dict[tuple, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Apply many points transactions with a fixed number of round trips
+        
+        Takes the same transaction_data dicts as process_points_transaction.
+        Enrollments and programs are loaded once for the whole batch, running
+        balances and expirations are computed in memory, and the ledger rows
+        are bulk inserted; the loyalty_points trigger moves each enrollment's
+        current_points inside the same statement. Tier upgrades are evaluated
+        once over every enrollment the batch touched.
+        
+        `enrollments` ({(customer_id, program_id): enrollment}) can be passed
+        by callers that already loaded them. Transactions carrying an
+        `idempotency_key` that is already in the ledger (or repeated within
+        the batch) are returned under "skipped" instead of being applied.
+        Failures caused by a ledger write error (rather than the transaction
+        itself) are marked "retryable".
+        """
+        transactions, skipped = await self._drop_duplicate_transactions(transactions)
+        
+        if enrollments is None:
+            enrollments = await self._load_enrollments(
+                barbershop_id,
+                customer_ids=list({t["customer_id"] for t in transactions}),
+                program_ids=list({t["loyalty_program_id"] for t in transactions})
+            )
+        
+        programs = await self._load_programs(barbershop_id, list({t["loyalty_program_id"] for t in transactions}))
+        
+        # Running balances so several rows for one customer chain correctly. They only
+        # advance on confirmed inserts: the loyalty_points trigger trusts balance_before,
+        # so rows from a failed chunk must never leak into a later chunk's balances.
+        balances = {key: enrollment.get("current_points", 0) for key, enrollment in enrollments.items()}
+        halted = set()
+        now = datetime.utcnow()
+        
+        candidates = []
+        failed = []
+        for transaction_data in transactions:
+            key = (transaction_data["customer_id"], transaction_data["loyalty_program_id"])
+            if key not in enrollments:
+                failed.append({"customer_id": key[0], "reason": "Customer not enrolled in loyalty program"})
+                continue
+            candidates.append((key, transaction_data))
+        
+        applied = []
+        for chunk in _chunks(candidates):
+            chunk_balances = {}
+            records = []
+            for key, transaction_data in chunk:
+                if key in halted:
+                    # Later rows would chain off a balance that was never written
+                    failed.append({"customer_id": key[0], "reason": "An earlier points transaction for this customer failed", "retryable": True})
+                    continue
+                
+                current_balance = chunk_balances.get(key, balances[key])
+                points_amount = transaction_data["points_amount"]
+                if transaction_data["transaction_type"] == "redeemed" and current_balance < abs(points_amount):
+                    failed.append({"customer_id": key[0], "reason": "Insufficient points balance"})
+                    continue
+                
+                record = {
+                    "id": str(uuid.uuid4()),
+                    "barbershop_id": barbershop_id,
+                    **transaction_data,
+                    "balance_before": current_balance,
+                    "balance_after": current_balance + points_amount,
+                    "processed_by_user_id": processed_by_user_id,
+                    "created_at": now.isoformat()
+                }
+                
+                program = programs.get(key[1])
+                if transaction_data["transaction_type"] in ["earned", "bonus"] and program and program.get("points_expiration_months"):
+                    record["expires_at"] = (now + timedelta(days=program["points_expiration_months"] * 30)).isoformat()
+                
+                chunk_balances[key] = record["balance_after"]
+                records.append(record)
+            
+            if not records:
+                continue
+            
+            try:
+                result = self.supabase.table("loyalty_points").insert(records).execute()
+                if not result.data:
+                    raise Exception("Failed to create points transactions")
+                applied.extend(result.data)
+                balances.update(chunk_balances)
+            except Exception as e:
+                logger.error(f"Error inserting points batch: {str(e)}")
+                halted.update(chunk_balances)
+                failed.extend({"customer_id": record["customer_id"], "reason": str(e), "retryable": True} for record in records)
+        
+        applied_keys = {(record["customer_id"], record["loyalty_program_id"]) for record in applied}
+        for key in applied_keys:
+            enrollments[key]["current_points"] = balances[key]
+        
+        self._record_leaderboard_points(applied)
+        
+        # The ledger rows are already written, so an error here must not fail the batch
+        # and invite the caller to apply it again
+        try:
+            tier_upgrades = await self._apply_batch_tier_upgrades(barbershop_id, [enrollments[key] for key in applied_keys])
+        except Exception as e:
+            logger.error(f"Error evaluating tier upgrades for points batch: {str(e)}")
+            tier_upgrades = []
+        
+        programs_by_customer: Dict[str, List[str]] = {}
+        for customer_id, program_id in applied_keys:
+            programs_by_customer.setdefault(customer_id, []).append(program_id)
+        for customer_id, program_ids in programs_by_customer.items():
+            await self._clear_customer_cache(customer_id, barbershop_id, program_ids)
+        
+        return {
+            "applied": applied,
+            "failed": failed,
+            "skipped": skipped,
+            "tier_upgrades": tier_upgrades
+        }
+    
     async def bulk_enroll_customers(self, program_id: str, customer_ids: List[str], barbershop_id: str) -> Dict[str, Any]:
         """Bulk enroll customers into loyalty program"""
         try:
             successfully_enrolled = []
             failed_enrollments = []
             
+            # One lookup for everyone already enrolled, instead of one per customer
+            already_enrolled = set()
+            for chunk in _chunks(list(customer_ids)):
+                existing_result = self.supabase.table("loyalty_program_enrollments").select("customer_id").eq("loyalty_program_id", program_id).in_("customer_id", chunk).execute()
+                already_enrolled.update(row["customer_id"] for row in existing_result.data or [])
+            
+            now = datetime.utcnow().isoformat()
+            enrollment_records = []
             for customer_id in customer_ids:
+                if customer_id in already_enrolled:
+                    failed_enrollments.append({"customer_id": customer_id, "reason": "Already enrolled"})
+                    continue
+                already_enrolled.add(customer_id)
+                
+                enrollment_records.append({
+                    "id": str(uuid.uuid4()),
+                    "barbershop_id": barbershop_id,
+                    "customer_id": customer_id,
+                    "loyalty_program_id": program_id,
+                    "enrolled_at": now,
+                    "enrollment_method": "bulk_manual",
+                    "status": "active",
+                    "current_points": 0,
+                    "lifetime_points_earned": 0,
+                    "lifetime_points_redeemed": 0,
+                    "member_since": date.today().isoformat(),
+                    "is_active": True,
+                    "created_at": now,
+                    "updated_at": now
+                })
+            
+            for chunk in _chunks(enrollment_records):
                 try:
-                    # Check if customer already enrolled
-                    existing_result = self.supabase.table("loyalty_program_enrollments").select("id").eq("customer_id", customer_id).eq("loyalty_program_id", program_id).execute()
-                    
-                    if existing_result.data:
-                        failed_enrollments.append({"customer_id": customer_id, "reason": "Already enrolled"})
-                        continue
-                    
-                    # Create enrollment
-                    enrollment_record = {
-                        "id": str(uuid.uuid4()),
-                        "barbershop_id": barbershop_id,
-                        "customer_id": customer_id,
-                        "loyalty_program_id": program_id,
-                        "enrolled_at": datetime.utcnow().isoformat(),
-                        "enrollment_method": "bulk_manual",
-                        "status": "active",
-                        "current_points": 0,
-                        "lifetime_points_earned": 0,
-                        "lifetime_points_redeemed": 0,
-                        "member_since": date.today().isoformat(),
-                        "is_active": True,
-                        "created_at": datetime.utcnow().isoformat(),
-                        "updated_at": datetime.utcnow().isoformat()
-                    }
-                    
-                    result = self.supabase.table("loyalty_program_enrollments").insert(enrollment_record).execute()
+                    result = self.supabase.table("loyalty_program_enrollments").insert(chunk).execute()
                     if result.data:
-                        successfully_enrolled.append(customer_id)
+                        successfully_enrolled.extend(row["customer_id"] for row in result.data)
                     else:
-                        failed_enrollments.append({"customer_id": customer_id, "reason": "Database insertion failed"})
-                        
+                        failed_enrollments.extend({"customer_id": record["customer_id"], "reason": "Database insertion failed"} for record in chunk)
                 except Exception as e:
-                    failed_enrollments.append({"customer_id": customer_id, "reason": str(e)})
+                    failed_enrollments.extend({"customer_id": record["customer_id"], "reason": str(e)} for record in chunk)
             
             return {
                 "total_requested": len(customer_ids),
@@ -1195,41 +1468,33 @@ class LoyaltyProgramService:
     async def bulk_award_points(self, customer_ids: List[str], points_amount: int, reason: str, program_id: Optional[str], barbershop_id: str, processed_by_user_id: str) -> Dict[str, Any]:
         """Bulk award points to multiple customers"""
         try:
-            successfully_awarded = []
-            failed_awards = []
+            enrollments = await self._load_enrollments(barbershop_id, customer_ids=list(customer_ids), program_ids=[program_id] if program_id else None)
+            
+            # Without a program, award to the customer's first active enrollment
+            enrollment_by_customer = {}
+            for enrollment in enrollments.values():
+                enrollment_by_customer.setdefault(enrollment["customer_id"], enrollment)
             
+            transactions = []
+            failed_awards = []
             for customer_id in customer_ids:
-                try:
-                    # Get customer enrollment
-                    query = self.supabase.table("loyalty_program_enrollments").select("*").eq("customer_id", customer_id).eq("barbershop_id", barbershop_id).eq("is_active", True)
-                    if program_id:
-                        query = query.eq("loyalty_program_id", program_id)
-                    
-                    enrollment_result = query.execute()
-                    if not enrollment_result.data:
-                        failed_awards.append({"customer_id": customer_id, "reason": "Not enrolled in loyalty program"})
-                        continue
-                    
-                    enrollment = enrollment_result.data[0]
-                    
-                    # Award points
-                    await self.process_points_transaction(
-                        barbershop_id=barbershop_id,
-                        transaction_data={
-                            "customer_id": customer_id,
-                            "loyalty_program_id": enrollment["loyalty_program_id"],
-                            "transaction_type": "bonus",
-                            "points_amount": points_amount,
-                            "source_type": "bulk_award",
-                            "description": reason
-                        },
-                        processed_by_user_id=processed_by_user_id
-                    )
-                    
-                    successfully_awarded.append(customer_id)
-                    
-                except Exception as e:
-                    failed_awards.append({"customer_id": customer_id, "reason": str(e)})
+                enrollment = enrollment_by_customer.get(customer_id)
+                if not enrollment:
+                    failed_awards.append({"customer_id": customer_id, "reason": "Not enrolled in loyalty program"})
+                    continue
+                
+                transactions.append({
+                    "customer_id": customer_id,
+                    "loyalty_program_id": enrollment["loyalty_program_id"],
+                    "transaction_type": "bonus",
+                    "points_amount": points_amount,
+                    "source_type": "bulk_award",
+                    "description": reason
+                })
+            
+            batch = await self.apply_points_batch(barbershop_id, transactions, processed_by_user_id, enrollments)
+            failed_awards.extend(batch["failed"])
+            successfully_awarded = [record["customer_id"] for record in batch["applied"]]
             
             return {
                 "total_requested": len(customer_ids),
@@ -1355,6 +1620,161 @@ class LoyaltyProgramService:
             return result.data[0] if program_id else result.data[-1]  # Get latest if no specific program
         return None
     
+    async def _load_enrollments(self, barbershop_id: str, customer_ids: List[str], program_ids: Optional[List[str]] = None) -> Dict[tuple, Dict[str, Any]]:
+        """Active enrollments for many customers, keyed by (customer_id, program_id)"""
+        enrollments = {}
+        for chunk in _chunks(customer_ids):
+            query = self.supabase.table("loyalty_program_enrollments").select("*").eq("barbershop_id", barbershop_id).eq("is_active", True).in_("customer_id", chunk)
+            if program_ids:
+                query = query.in_("loyalty_program_id", program_ids)
+            
+            for enrollment in query.execute().data or []:
+                enrollments[(enrollment["customer_id"], enrollment["loyalty_program_id"])] = enrollment
+        return enrollments
+    
+    async def _drop_duplicate_transactions(self, transactions: List[Dict[str, Any]]) -> tuple:
+        """Split off transactions whose idempotency_key was already applied"""
+        keys = [t["idempotency_key"] for t in transactions if t.get("idempotency_key")]
+        if not keys:
+            return transactions, []
+        
+        seen = set()
+        for chunk in _chunks(list(set(keys))):
+            result = self.supabase.table("loyalty_points").select("idempotency_key").in_("idempotency_key", chunk).execute()
+            seen.update(row["idempotency_key"] for row in result.data or [])
+        
+        fresh, skipped = [], []
+        for transaction_data in transactions:
+            key = transaction_data.get("idempotency_key")
+            if key and key in seen:
+                skipped.append({"customer_id": transaction_data["customer_id"], "idempotency_key": key})
+                continue
+            if key:
+                seen.add(key)
+            fresh.append(transaction_data)
+        return fresh, skipped
+    
+    async def _load_programs(self, barbershop_id: str, program_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Loyalty programs by id in one query"""
+        if not program_ids:
+            return {}
+        result = self.supabase.table("loyalty_programs").select("*").eq("barbershop_id", barbershop_id).in_("id", program_ids).execute()
+        return {program["id"]: program for program in result.data or []}
+    
+    def _tier_cache_key(self, barbershop_id: str, program_id: str) -> str:
+        return f"loyalty_tiers:{barbershop_id}:{program_id}"
+    
+    async def _get_tier_ladder(self, barbershop_id: str, program_id: str) -> TierLadder:
+        """Compiled active tiers for one program"""
+        return (await self._get_tier_ladders(barbershop_id, [program_id]))[program_id]
+    
+    async def _get_tier_ladders(self, barbershop_id: str, program_ids: List[str]) -> Dict[str, TierLadder]:
+        """
+        Compiled active tiers by program
+        
+        Tiers are cached in Redis until create_loyalty_tier or
+        update_loyalty_program clears them, so every worker sees the change;
+        programs missing from the cache are loaded in one query. Ladders are
+        recompiled only when the cached tiers differ from the ones they were
+        built from.
+        """
+        program_ids = list(dict.fromkeys(program_ids))
+        cache_keys = [self._tier_cache_key(barbershop_id, program_id) for program_id in program_ids]
+        cached = dict(zip(program_ids, self.redis.mget(cache_keys))) if cache_keys else {}
+        
+        missing = [program_id for program_id in program_ids if cached[program_id] is None]
+        if missing:
+            tiers_by_program: Dict[str, List[Dict[str, Any]]] = {program_id: [] for program_id in missing}
+            for chunk in _chunks(missing):
+                result = self.supabase.table("loyalty_tiers").select("*").eq("barbershop_id", barbershop_id).eq("is_active", True).in_("loyalty_program_id", chunk).execute()
+                for tier in result.data or []:
+                    tiers_by_program[tier["loyalty_program_id"]].append(tier)
+            for program_id, tiers in tiers_by_program.items():
+                cached[program_id] = json.dumps(tiers, default=str)
+                self.redis.setex(self._tier_cache_key(barbershop_id, program_id), self.cache_ttl, cached[program_id])
+        
+        ladders = {}
+        for program_id, cache_key in zip(program_ids, cache_keys):
+            compiled = self._tier_ladders.get(cache_key)
+            if not compiled or compiled[0] != cached[program_id]:
+                compiled = (cached[program_id], TierLadder(json.loads(cached[program_id])))
+                self._tier_ladders[cache_key] = compiled
+            ladders[program_id] = compiled[1]
+        return ladders
+    
+    async def _apply_batch_tier_upgrades(self, barbershop_id: str, enrollments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Evaluate and apply tier upgrades for a set of enrollments in one pass"""
+        return await self._write_tier_upgrades(barbershop_id, await self._find_tier_upgrades(barbershop_id, enrollments))
+    
+    async def _find_tier_upgrades(self, barbershop_id: str, enrollments: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(enrollment, new tier) for each enrollment that qualifies for a higher tier"""
+        if not enrollments:
+            return []
+        
+        ladders = await self._get_tier_ladders(barbershop_id, [e["loyalty_program_id"] for e in enrollments])
+        upgrades = []
+        for enrollment in enrollments:
+            ladder = ladders[enrollment["loyalty_program_id"]]
+            current_tier_level = ladder.level_of(enrollment.get("current_tier"))
+            # Customers already at the top tier need no analytics lookup
+            if not ladder.has_tier_above(current_tier_level):
+                continue
+            
+            analytics = await self._get_customer_analytics(enrollment["customer_id"], barbershop_id)
+            new_tier = ladder.highest_qualifying(analytics, above_level=current_tier_level)
+            if new_tier:
+                upgrades.append((enrollment, new_tier))
+        return upgrades
+    
+    async def _write_tier_upgrades(self, barbershop_id: str, upgrades: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Apply upgrades with one enrollment update and one milestone insert per tier and chunk"""
+        upgrades_by_tier: Dict[str, List[Dict[str, Any]]] = {}
+        tier_by_id = {}
+        for enrollment, tier in upgrades:
+            tier_by_id[tier["id"]] = tier
+            upgrades_by_tier.setdefault(tier["id"], []).append(enrollment)
+        
+        upgraded = []
+        now = datetime.utcnow().isoformat()
+        for tier_id, tier_enrollments in upgrades_by_tier.items():
+            tier = tier_by_id[tier_id]
+            try:
+                for chunk in _chunks(tier_enrollments):
+                    self.supabase.table("loyalty_program_enrollments").update({
+                        "current_tier": tier["tier_name"],
+                        "tier_progress": 0,  # Reset progress for new tier
+                        "updated_at": now
+                    }).in_("id", [e["id"] for e in chunk]).execute()
+                    
+                    self.supabase.table("customer_milestones").insert([
+                        self._tier_upgrade_milestone_record(e["customer_id"], barbershop_id, tier["tier_name"])
+                        for e in chunk
+                    ]).execute()
+            except Exception as e:
+                logger.error(f"Failed to apply batch tier upgrade to {tier['tier_name']}: {str(e)}")
+                continue
+            
+            for enrollment in tier_enrollments:
+                enrollment["current_tier"] = tier["tier_name"]
+                upgraded.append({"customer_id": enrollment["customer_id"], "new_tier": tier["tier_name"]})
+        
+        if upgraded:
+            logger.info(f"Upgraded {len(upgraded)} customers to new tiers in barbershop {barbershop_id}")
+        return upgraded
+    
+    async def _get_birthday_customers(self, barbershop_id: str, today: date) -> List[Dict[str, Any]]:
+        """Customers whose birthday is today, via idx_customers_birthday"""
+        birthdays = [(today.month, today.day)]
+        # Feb 29 birthdays are celebrated on Feb 28 in non-leap years
+        if (today.month, today.day) == (2, 28) and not calendar.isleap(today.year):
+            birthdays.append((2, 29))
+        
+        customers = []
+        for month, day in birthdays:
+            result = self.supabase.table("customers").select("id, user_id, date_of_birth").eq("barbershop_id", barbershop_id).eq("birth_month", month).eq("birth_day", day).execute()
+            customers.extend(result.data or [])
+        return customers
+    
     async def _get_customer_analytics(self, customer_id: str, barbershop_id: str) -> Dict[str, Any]:
         """Get customer analytics for tier calculations"""
         # This would typically pull from customer_analytics_summary table
@@ -1367,24 +1787,6 @@ class LoyaltyProgramService:
             "average_rating": 4.8
         }
     
-    async def _meets_tier_requirements(self, tier: Dict[str, Any], analytics: Dict[str, Any]) -> bool:
-        """Check if customer meets tier requirements"""
-        criteria = tier.get("qualification_criteria", {})
-        
-        # Check points requirement
-        if "points_required" in criteria:
-            # Would need to check actual points balance
-            pass
-        
-        # Check other criteria
-        if "visits_required" in criteria and analytics.get("total_visits", 0) < criteria["visits_required"]:
-            return False
-        
-        if "spending_required" in criteria and analytics.get("total_spent", 0) < criteria["spending_required"]:
-            return False
-        
-        return True
-    
     async def _calculate_tier_progress(self, customer_id: str, program_id: str, barbershop_id: str) -> Dict[str, Any]:
         """Calculate customer's progress toward next tier"""
         # Get customer's current points and tier
@@ -1395,18 +1797,12 @@ class LoyaltyProgramService:
         current_points = enrollment.get("current_points", 0)
         current_tier = enrollment.get("current_tier")
         
-        # Get tiers for this program
-        tiers = await self.get_loyalty_tiers(barbershop_id, program_id)
-        
         # Find current tier level
-        current_tier_level = 0
-        if current_tier:
-            tier_obj = next((t for t in tiers if t["tier_name"] == current_tier), None)
-            if tier_obj:
-                current_tier_level = tier_obj["tier_level"]
+        ladder = await self._get_tier_ladder(barbershop_id, program_id)
+        current_tier_level = ladder.level_of(current_tier)
         
         # Find next tier
-        next_tier = next((t for t in tiers if t["tier_level"] == current_tier_level + 1), None)
+        next_tier = ladder.tier_at_level(current_tier_level + 1)
         if not next_tier:
             return {"tier_progress": 100, "next_tier_threshold": None}
         
@@ -1415,7 +1811,7 @@ class LoyaltyProgramService:
         current_tier_points = 0
         
         if current_tier_level > 0:
-            current_tier_obj = next((t for t in tiers if t["tier_level"] == current_tier_level), None)
+            current_tier_obj = ladder.tier_at_level(current_tier_level)
             if current_tier_obj:
                 current_tier_points = current_tier_obj.get("qualification_criteria", {}).get("points_required", 0)
         
@@ -1463,27 +1859,31 @@ class LoyaltyProgramService:
         
         return progress
     
-    async def _check_and_process_tier_upgrade(self, customer_id: str, program_id: str, barbershop_id: str) -> Dict[str, Any]:
+    async def _check_and_process_tier_upgrade(self, customer_id: str, program_id: str, barbershop_id: str, enrollment: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Check and automatically process tier upgrades"""
-        upgrade_info = await self.check_tier_upgrade_eligibility(customer_id, barbershop_id, program_id)
+        if enrollment is None:
+            enrollment = await self._get_customer_enrollment(customer_id, program_id, barbershop_id)
+            if not enrollment:
+                return {"upgraded": False}
         
-        if upgrade_info.get("eligible"):
-            try:
-                result = await self.upgrade_customer_tier(
-                    customer_id,
-                    upgrade_info["next_tier"]["id"],
-                    barbershop_id,
-                    "system"
-                )
-                return {"upgraded": True, "new_tier_name": result["new_tier_name"]}
-            except Exception as e:
-                logger.error(f"Failed to auto-upgrade customer tier: {str(e)}")
+        try:
+            upgraded = await self._apply_batch_tier_upgrades(barbershop_id, [enrollment])
+        except Exception as e:
+            logger.error(f"Failed to auto-upgrade customer tier: {str(e)}")
+            return {"upgraded": False}
         
+        if upgraded:
+            return {"upgraded": True, "new_tier_name": upgraded[0]["new_tier"]}
         return {"upgraded": False}
     
     async def _create_tier_upgrade_milestone(self, customer_id: str, barbershop_id: str, tier_name: str):
         """Create milestone for tier upgrade"""
-        milestone_record = {
+        milestone_record = self._tier_upgrade_milestone_record(customer_id, barbershop_id, tier_name)
+        self.supabase.table("customer_milestones").insert(milestone_record).execute()
+    
+    def _tier_upgrade_milestone_record(self, customer_id: str, barbershop_id: str, tier_name: str) -> Dict[str, Any]:
+        """Milestone row for a tier upgrade"""
+        return {
             "id": str(uuid.uuid4()),
             "barbershop_id": barbershop_id,
             "customer_id": customer_id,
@@ -1497,8 +1897,6 @@ class LoyaltyProgramService:
             "created_at": datetime.utcnow().isoformat(),
             "updated_at": datetime.utcnow().isoformat()
         }
-        
-        self.supabase.table("customer_milestones").insert(milestone_record).execute()
     
     def _determine_reward_type(self, reward_string: str) -> str:
         """Determine reward type from reward string"""
@@ -1584,6 +1982,62 @@ class LoyaltyProgramService:
                 processed_by_user_id="system"
             )
     
+    def _leaderboard_key(self, barbershop_id: str, program_scope: str, period: str, when: datetime) -> str:
+        """Sorted set key; period boards are bucketed by the period they cover"""
+        if period == "weekly":
+            iso_year, iso_week, _ = when.isocalendar()
+            bucket = f"{iso_year}-W{iso_week:02d}"
+        elif period == "monthly":
+            bucket = when.strftime("%Y-%m")
+        elif period == "yearly":
+            bucket = when.strftime("%Y")
+        else:
+            bucket = "all"
+        return f"loyalty_leaderboard:{barbershop_id}:{program_scope}:{period}:{bucket}"
+    
+    def _leaderboard_period_start(self, period: str, when: datetime) -> datetime:
+        day_start = when.replace(hour=0, minute=0, second=0, microsecond=0)
+        if period == "weekly":
+            return day_start - timedelta(days=day_start.weekday())
+        if period == "monthly":
+            return day_start.replace(day=1)
+        return day_start.replace(month=1, day=1)
+    
+    def _record_leaderboard_points(self, transactions: List[Dict[str, Any]]):
+        """
+        Apply ledger rows to the leaderboards that are already built
+        
+        Boards that don't exist are left alone and built from the database on
+        the next read, so an increment never creates a partial board.
+        """
+        if not transactions:
+            return
+        try:
+            now = datetime.utcnow()
+            increments: Dict[str, Dict[str, int]] = {}
+            for transaction in transactions:
+                customer_id = transaction["customer_id"]
+                points = transaction["points_amount"]
+                earned = points > 0 and transaction.get("transaction_type") in ("earned", "bonus")
+                for program_scope in (transaction["loyalty_program_id"], LEADERBOARD_ALL_PROGRAMS):
+                    for period in LEADERBOARD_PERIODS:
+                        if period != "all_time" and not earned:
+                            continue
+                        key = self._leaderboard_key(transaction["barbershop_id"], program_scope, period, now)
+                        member_increments = increments.setdefault(key, {})
+                        member_increments[customer_id] = member_increments.get(customer_id, 0) + points
+            
+            # The existence check and increments run as one script per board, so
+            # a board expiring in between can't be recreated without its TTL
+            pipe = self.redis.pipeline()
+            for key, member_increments in increments.items():
+                args = [value for customer_id, points in member_increments.items() for value in (points, customer_id)]
+                pipe.eval(LEADERBOARD_INCREMENT_SCRIPT, 1, key, *args)
+            pipe.execute()
+        except Exception as e:
+            # Boards self-correct on their next rebuild; never fail the transaction
+            logger.warning(f"Failed to update loyalty leaderboards: {str(e)}")
+    
     def _get_position_badge(self, position: int) -> Optional[str]:
         """Get badge for leaderboard position"""
         if position == 1:
@@ -1662,10 +2116,25 @@ class LoyaltyProgramService:
         """Clear program-related cache"""
         if program_id:
             self.redis.delete(f"loyalty_program:{program_id}")
+            tier_cache_key = self._tier_cache_key(barbershop_id, program_id)
+            self.redis.delete(tier_cache_key)
+            self._tier_ladders.pop(tier_cache_key, None)
         # Clear other related cache keys as needed
     
-    async def _clear_customer_cache(self, customer_id: str, barbershop_id: str):
-        """Clear customer-related cache"""
-        pattern = f"customer_balance:{customer_id}:{barbershop_id}*"
-        # Would implement cache clearing logic based on Redis pattern matching
-        pass
\ No newline at end of file
+    async def _clear_customer_cache(self, customer_id: str, barbershop_id: str, program_ids: Optional[List[str]] = None):
+        """
+        Clear customer-related cache
+        
+        Drops the shop-wide balance entry plus the per-program entries for
+        `program_ids`; without them every entry is found by pattern scan.
+        """
+        base_key = f"customer_balance:{customer_id}:{barbershop_id}"
+        try:
+            if program_ids is None:
+                keys = list(self.redis.scan_iter(match=f"{base_key}*"))
+            else:
+                keys = [base_key] + [f"{base_key}:{program_id}" for program_id in program_ids]
+            if keys:
+                self.redis.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Failed to clear balance cache for customer {customer_id}: {str(e)}")
\ No newline at end of file
@@ -41,6 +41,19 @@ class MemoryManager:
         self.memory_threshold = 0.85  # Trigger cleanup at 85% memory usage
         self.critical_threshold = 0.95  # Emergency cleanup at 95%
         
+        # Hysteresis: pressure states only clear once usage drops this far below the threshold,
+        # and repeated GC / emergency cleanup within a state are spaced by a cooldown
+        self.hysteresis = 0.05
+        self.pressure_state = "normal"  # normal | high | critical
+        self.gc_cooldown = 30.0
+        self.emergency_cooldown = 120.0
+        self.last_gc = 0.0
+        self.last_emergency_cleanup = 0.0
+        
+        # Background sampling: request paths read the latest snapshot instead of calling psutil
+        self.sample_interval = float(os.getenv('MEMORY_SAMPLE_INTERVAL', '2.0'))
+        self.refresh_memory_stats()
+        
         # OAuth callback memory tracking
         self.oauth_sessions = {}
         self.oauth_cleanup_interval = 300  # 5 minutes
@@ -50,8 +63,8 @@ class MemoryManager:
         
         logger.info("🧠 Memory Manager initialized for production stability")
     
-    def get_memory_stats(self) -> MemoryStats:
-        """Get current memory statistics"""
+    def sample_memory_stats(self) -> MemoryStats:
+        """Read current memory statistics from psutil (background sampler only)"""
         try:
             # System memory
             memory = psutil.virtual_memory()
@@ -77,19 +90,65 @@ class MemoryManager:
             logger.error(f"Error getting memory stats: {e}")
             return MemoryStats(0, 0, 0, 0, 0, 0)
     
+    def process_memory_mb(self) -> float:
+        """Current process RSS in MB, read from psutil without a full sample"""
+        try:
+            return self.process.memory_info().rss / (1024**2)
+        except Exception as e:
+            logger.error(f"Error reading process memory: {e}")
+            return 0.0
+    
+    def get_memory_stats(self) -> MemoryStats:
+        """Latest sampled memory statistics (a single attribute read, safe on request paths)"""
+        return self._snapshot
+    
+    def refresh_memory_stats(self) -> MemoryStats:
+        """Take a new sample, publish it as the current snapshot and update the pressure state"""
+        stats = self.sample_memory_stats()
+        # Publish by rebinding the attribute so readers always see a complete snapshot
+        self._snapshot = stats
+        self._snapshot_time = time.time()
+        self._update_pressure_state(stats.memory_pressure)
+        return stats
+    
+    def _update_pressure_state(self, memory_pressure: float) -> str:
+        """Move between normal/high/critical with hysteresis so states don't flap at the threshold"""
+        state = self.pressure_state
+        
+        if memory_pressure > self.critical_threshold:
+            state = "critical"
+        elif memory_pressure > self.memory_threshold:
+            # Leaving critical requires dropping clearly below the critical threshold
+            if state != "critical" or memory_pressure < self.critical_threshold - self.hysteresis:
+                state = "high"
+        elif memory_pressure < self.memory_threshold - self.hysteresis:
+            state = "normal"
+        elif state == "critical":
+            state = "high"
+        
+        if state != self.pressure_state:
+            logger.info(f"Memory pressure state {self.pressure_state} -> {state} ({memory_pressure:.1%})")
+            self.pressure_state = state
+        return state
+    
     def is_memory_pressure(self) -> bool:
         """Check if system is under memory pressure"""
-        stats = self.get_memory_stats()
-        return stats.memory_pressure > self.memory_threshold
+        return self.pressure_state != "normal"
     
     def is_critical_memory_pressure(self) -> bool:
         """Check if system is under critical memory pressure"""
-        stats = self.get_memory_stats()
-        return stats.memory_pressure > self.critical_threshold
+        return self.pressure_state == "critical"
+    
+    def collect_if_under_pressure(self) -> int:
+        """Garbage collect when under pressure, at most once per gc_cooldown"""
+        if self.pressure_state == "normal" or time.time() - self.last_gc < self.gc_cooldown:
+            return 0
+        return self.force_garbage_collection()
     
     def force_garbage_collection(self) -> int:
         """Force garbage collection and return objects collected"""
         logger.info("🗑️ Forcing garbage collection due to memory pressure")
+        self.last_gc = time.time()
         
         collected = 0
         for generation in range(gc.get_count()):
@@ -156,6 +215,7 @@ class MemoryManager:
     def emergency_cleanup(self):
         """Emergency cleanup when system is under critical memory pressure"""
         logger.warning("🚨 EMERGENCY: Critical memory pressure detected - performing emergency cleanup")
+        self.last_emergency_cleanup = time.time()
         
         try:
             # 1. Force garbage collection
@@ -193,26 +253,30 @@ class MemoryManager:
         logger.info("⏹️ Memory monitoring stopped")
     
     def _monitoring_loop(self):
-        """Background monitoring loop"""
+        """Background sampling loop: publishes snapshots and reacts to pressure state changes"""
         while self.monitoring_active:
             try:
-                # Check memory pressure every 30 seconds
-                stats = self.get_memory_stats()
+                previous_state = self.pressure_state
+                stats = self.refresh_memory_stats()
+                current_time = time.time()
                 
-                if stats.memory_pressure > self.critical_threshold:
-                    logger.warning(f"🚨 CRITICAL memory pressure: {stats.memory_pressure:.1%}")
-                    self.emergency_cleanup()
-                elif stats.memory_pressure > self.memory_threshold:
-                    logger.warning(f"⚠️ High memory pressure: {stats.memory_pressure:.1%}")
-                    self.force_garbage_collection()
+                if self.pressure_state == "critical":
+                    # Clean up on entering critical, then only after the cooldown
+                    if (previous_state != "critical" or
+                            current_time - self.last_emergency_cleanup > self.emergency_cooldown):
+                        logger.warning(f"🚨 CRITICAL memory pressure: {stats.memory_pressure:.1%}")
+                        self.emergency_cleanup()
+                elif self.pressure_state == "high":
+                    if previous_state == "normal" or current_time - self.last_gc > self.gc_cooldown:
+                        logger.warning(f"⚠️ High memory pressure: {stats.memory_pressure:.1%}")
+                        self.force_garbage_collection()
                 
                 # Regular cleanup every 5 minutes
-                current_time = time.time()
                 if current_time - self.last_cleanup > 300:  # 5 minutes
                     self.clear_internal_caches()
                     self.last_cleanup = current_time
                 
-                time.sleep(30)  # Check every 30 seconds
+                time.sleep(self.sample_interval)
                 
             except Exception as e:
                 logger.error(f"Error in memory monitoring loop: {e}")
@@ -223,12 +287,13 @@ class MemoryManager:
         """Context manager for memory-sensitive operations like OAuth"""
         logger.debug(f"🔒 Starting memory-limited operation: {operation_name}")
         
-        # Check memory before starting
+        # Check memory before starting (GC is rate-limited by the cooldown)
         if self.is_critical_memory_pressure():
             logger.warning(f"⚠️ High memory pressure before {operation_name}, performing cleanup")
-            self.force_garbage_collection()
+            self.collect_if_under_pressure()
         
-        start_memory = self.get_memory_stats().process_memory
+        # RSS is read directly: the shared snapshot is usually the same sample at both ends
+        start_memory = self.process_memory_mb()
         start_time = time.time()
         
         try:
@@ -236,7 +301,7 @@ class MemoryManager:
         finally:
             # Cleanup after operation
             end_time = time.time()
-            end_memory = self.get_memory_stats().process_memory
+            end_memory = self.process_memory_mb()
             
             memory_delta = end_memory - start_memory
             duration = end_time - start_time
@@ -247,8 +312,8 @@ class MemoryManager:
                 f"Memory change: {memory_delta:+.1f}MB"
             )
             
-            # Force cleanup if operation used significant memory
-            if memory_delta > 50:  # 50MB threshold
+            # Force cleanup if RSS grew significantly during the operation
+            if memory_delta > 50 and time.time() - self.last_gc > self.gc_cooldown:  # 50MB threshold
                 logger.info(f"🧹 {operation_name} used {memory_delta:.1f}MB, cleaning up")
                 self.force_garbage_collection()
 
@@ -259,7 +324,7 @@ memory_manager = MemoryManager()
 memory_manager.start_monitoring()
 
 def get_memory_stats() -> MemoryStats:
-    """Get current memory statistics"""
+    """Get the latest sampled memory statistics"""
     return memory_manager.get_memory_stats()
 
 def memory_limited_oauth_operation():
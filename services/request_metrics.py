@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Request Metrics Labelling for 6FB AI Agent System
+Keeps Prometheus request metrics bounded: label by matched route template,
+cap the number of distinct label sets, and keep slow-request samples so
+outliers stay traceable without a time series per raw path
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Label used for requests that did not match any route (404s, scanners)
+UNMATCHED_ROUTE = "unmatched"
+
+# Label used once the distinct label set budget is exhausted
+OVERFLOW_ROUTE = "other"
+
+
+def resolve_route_template(scope: Dict) -> str:
+    """
+    Return the matched route template (e.g. /api/v1/ai/performance/component/{name})
+
+    The router records the matched route in the ASGI scope, so this is only
+    meaningful once the application has handled the request.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if template:
+        return template
+
+    # Mounts extend root_path beyond the application's own (proxy) prefix;
+    # only that extension identifies a mounted sub-application
+    root_path = scope.get("root_path", "")
+    app_root_path = scope.get("app_root_path", "")
+    if root_path.startswith(app_root_path) and len(root_path) > len(app_root_path):
+        return f"{root_path[len(app_root_path):]}/*"
+
+    return UNMATCHED_ROUTE
+
+
+class BoundedLabelSet:
+    """
+    Admits at most `max_label_sets` distinct endpoint labels.
+
+    Endpoints seen before are always admitted; new endpoints beyond the budget
+    are folded into the overflow endpoint so series count stays bounded even if
+    route resolution is bypassed. Method and status have small fixed domains,
+    so they don't count against the budget; a known endpoint returning a new
+    status is never relabelled.
+    """
+
+    def __init__(self, max_label_sets: int = 500):
+        self.max_label_sets = max_label_sets
+        self._seen = set()
+        self._lock = threading.Lock()
+        self.overflowed = 0
+
+    def admit(self, endpoint: str) -> str:
+        """Return the endpoint label to record for this request"""
+        if endpoint in self._seen:
+            return endpoint
+
+        with self._lock:
+            if endpoint in self._seen:
+                return endpoint
+            if len(self._seen) < self.max_label_sets:
+                self._seen.add(endpoint)
+                return endpoint
+
+            self.overflowed += 1
+            if self.overflowed == 1:
+                logger.warning(
+                    f"Request metric label budget of {self.max_label_sets} exhausted; "
+                    f"recording new endpoints as '{OVERFLOW_ROUTE}'"
+                )
+            self._seen.add(OVERFLOW_ROUTE)
+            return OVERFLOW_ROUTE
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class SlowRequestSampler:
+    """
+    Keeps the most recent slow requests per route template.
+
+    Each sample carries a trace id that is also attached to the duration
+    histogram as an exemplar, so a slow bucket can be traced back to the
+    concrete path that produced it.
+    """
+
+    def __init__(self, threshold_seconds: float = 1.0, samples_per_route: int = 5,
+                 max_routes: int = 200):
+        self.threshold_seconds = threshold_seconds
+        self.samples_per_route = samples_per_route
+        self.max_routes = max_routes
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def sample(self, route: str, method: str, path: str, status: int,
+               duration: float) -> Optional[Dict]:
+        """Record a request if it is slow; returns the exemplar labels when sampled"""
+        if duration < self.threshold_seconds:
+            return None
+
+        trace_id = uuid.uuid4().hex[:16]
+        entry = {
+            "trace_id": trace_id,
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_seconds": round(duration, 4),
+            "timestamp": time.time()
+        }
+
+        with self._lock:
+            samples = self._samples.get(route)
+            if samples is None:
+                if len(self._samples) >= self.max_routes:
+                    route = OVERFLOW_ROUTE
+                    samples = self._samples.setdefault(route, deque(maxlen=self.samples_per_route))
+                else:
+                    samples = self._samples[route] = deque(maxlen=self.samples_per_route)
+            samples.append(entry)
+
+        # OpenMetrics caps exemplar label sets at 128 characters
+        return {"trace_id": trace_id, "path": path[:96]}
+
+    def get_samples(self) -> Dict[str, List[Dict]]:
+        """Recent slow requests grouped by route template"""
+        with self._lock:
+            return {route: list(samples) for route, samples in self._samples.items()}
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tests for the authentication session cache and the revocation bloom filter
+Uses an in-memory stand-in for the shared Redis bitmaps
+"""
+
+import os
+import sys
+import uuid
+
+import pytest
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import auth_cache as auth_cache_module
+from services.auth_cache import REVOKED, AuthCache, RevocationBloomFilter
+
+USER = {"id": 7, "email": "barber@example.com", "shop_name": "Fade Lab", "is_active": True}
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class FakeRedis:
+    """SETBIT/EXPIRE/MGET over byte strings, as Redis stores bitmaps"""
+
+    def __init__(self):
+        self.values = {}
+
+    def pipeline(self):
+        return self
+
+    def setbit(self, key, offset, value):
+        data = bytearray(self.values.get(key, b""))
+        if len(data) <= offset >> 3:
+            data.extend(b"\x00" * ((offset >> 3) + 1 - len(data)))
+        data[offset >> 3] |= 0x80 >> (offset & 7)
+        self.values[key] = bytes(data)
+
+    def expire(self, key, seconds):
+        pass
+
+    def execute(self):
+        pass
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(auth_cache_module.time, "time", clock.time)
+    return clock
+
+
+class TestAuthCache:
+    """TTL and revocation behaviour of cached sessions"""
+
+    def test_cached_session_is_a_hit(self, clock):
+        cache = AuthCache(ttl_seconds=30)
+        cache.set("jti-1", USER)
+
+        assert cache.get("jti-1") == USER
+        assert cache.get("jti-2") is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_session_expires_after_ttl(self, clock):
+        cache = AuthCache(ttl_seconds=30)
+        cache.set("jti-1", USER)
+
+        clock.now += 29
+        assert cache.get("jti-1") == USER
+        clock.now += 2
+        assert cache.get("jti-1") is None
+
+    def test_session_never_outlives_its_token(self, clock):
+        cache = AuthCache(ttl_seconds=30)
+        cache.set("jti-1", USER, token_exp=clock.now + 5)
+
+        clock.now += 6
+        assert cache.get("jti-1") is None
+
+    def test_revocation_turns_a_hit_into_a_negative_entry(self, clock):
+        cache = AuthCache(bloom_filter=RevocationBloomFilter(size_bits=1 << 12))
+        cache.set("jti-1", USER)
+
+        cache.revoke("jti-1", USER["id"])
+
+        assert cache.get("jti-1") is REVOKED
+
+    def test_revocation_on_another_replica_causes_a_miss(self, clock):
+        redis = FakeRedis()
+        replica_a = AuthCache(bloom_filter=RevocationBloomFilter(size_bits=1 << 12, redis_client=redis, sync_interval=5))
+        replica_b = AuthCache(bloom_filter=RevocationBloomFilter(size_bits=1 << 12, redis_client=redis, sync_interval=5))
+        replica_b.set("jti-1", USER)
+
+        replica_a.revoke("jti-1", USER["id"])
+        clock.now += 5
+
+        assert replica_b.get("jti-1") is None
+        assert replica_b.get_stats()["entries"] == 0
+
+    def test_invalidate_user_drops_every_session(self, clock):
+        cache = AuthCache()
+        cache.set("jti-1", USER)
+        cache.set("jti-2", USER)
+        cache.set("jti-3", {**USER, "id": 8})
+
+        assert cache.invalidate_user(USER["id"]) == 2
+        assert cache.get("jti-3") is not None
+
+
+class TestRevocationBloomFilter:
+    """Revoked IDs must always be reported, including across rotation and sync"""
+
+    def test_no_false_negatives(self, clock):
+        bloom = RevocationBloomFilter(size_bits=1 << 14, num_hashes=5)
+        revoked = [str(uuid.uuid4()) for _ in range(2000)]
+        for jti in revoked:
+            bloom.add(jti)
+
+        assert all(bloom.might_contain(jti) for jti in revoked)
+
+    def test_revocations_survive_one_rotation(self, clock):
+        bloom = RevocationBloomFilter(size_bits=1 << 12, rotation_interval=3600)
+        bloom.add("jti-1")
+
+        clock.now += 3600
+        assert bloom.might_contain("jti-1")
+        clock.now += 3600
+        bloom.add("jti-2")
+        assert not bloom.might_contain("jti-1")
+
+    def test_no_false_negatives_through_redis_sync(self, clock):
+        redis = FakeRedis()
+        writer = RevocationBloomFilter(size_bits=1 << 14, redis_client=redis, sync_interval=5)
+        reader = RevocationBloomFilter(size_bits=1 << 14, redis_client=redis, sync_interval=5)
+        revoked = [str(uuid.uuid4()) for _ in range(500)]
+        for jti in revoked:
+            writer.add(jti)
+
+        clock.now += 5
+        assert all(reader.might_contain(jti) for jti in revoked)
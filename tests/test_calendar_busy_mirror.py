@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Tests for the calendar availability engine and the local busy-time mirror
+Uses FakeCalendarService in place of the Google Calendar API
+"""
+
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+import pytest
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calendar_availability import AvailabilityEngine, merge_intervals
+from calendar_busy_mirror import CalendarBusyMirror, FakeCalendarService
+
+
+class TestAvailabilityEngine:
+    """Slot computation from merged busy intervals"""
+
+    def test_merge_overlapping_and_touching_intervals(self):
+        merged = merge_intervals([
+            (datetime(2025, 1, 6, 12), datetime(2025, 1, 6, 13)),
+            (datetime(2025, 1, 6, 10), datetime(2025, 1, 6, 11)),
+            (datetime(2025, 1, 6, 10, 30), datetime(2025, 1, 6, 12)),
+        ])
+        assert merged == [(datetime(2025, 1, 6, 10), datetime(2025, 1, 6, 13))]
+
+    def test_slots_match_fifteen_minute_grid(self):
+        engine = AvailabilityEngine()
+        busy = {1: [(datetime(2025, 1, 6, 9, 20), datetime(2025, 1, 6, 17, 0))]}
+
+        slots = engine.compute_slots(busy, [date(2025, 1, 6)], [30, 60])[1][date(2025, 1, 6)]
+
+        assert slots[30] == [datetime(2025, 1, 6, 17, 0), datetime(2025, 1, 6, 17, 15),
+                             datetime(2025, 1, 6, 17, 30)]
+        assert slots[60] == [datetime(2025, 1, 6, 17, 0)]
+
+    def test_multi_day_query_without_busy_time(self):
+        engine = AvailabilityEngine()
+        days = [date(2025, 1, 6), date(2025, 1, 7)]
+
+        slots = engine.compute_slots({1: [], 2: []}, days, [45])
+
+        # 9:00 to 17:15 inclusive on a 15-minute grid
+        assert all(len(slots[barber][day][45]) == 34 for barber in (1, 2) for day in days)
+
+
+class TestCalendarBusyMirror:
+    """Incremental sync against the fake Calendar API"""
+
+    @pytest.fixture
+    def fake(self):
+        fake = FakeCalendarService(page_size=2)
+        fake.add_event('a', datetime(2025, 1, 6, 10), datetime(2025, 1, 6, 11))
+        fake.add_event('b', datetime(2025, 1, 6, 14), datetime(2025, 1, 6, 15))
+        fake.add_event('c', datetime(2025, 1, 7, 9), datetime(2025, 1, 7, 10))
+        return fake
+
+    @pytest.fixture
+    def mirror(self, fake, tmp_path):
+        return CalendarBusyMirror(lambda barber_id: (fake, 'primary'),
+                                  db_path=str(tmp_path / 'mirror.db'), staleness_seconds=3600,
+                                  history_days=None)
+
+    def test_full_sync_then_local_queries(self, fake, mirror):
+        busy = mirror.get_busy_periods(1, datetime(2025, 1, 6), datetime(2025, 1, 7))
+        calls_after_sync = fake.list_calls
+
+        assert busy == [(datetime(2025, 1, 6, 10), datetime(2025, 1, 6, 11)),
+                        (datetime(2025, 1, 6, 14), datetime(2025, 1, 6, 15))]
+        mirror.get_busy_periods(1, datetime(2025, 1, 7), datetime(2025, 1, 8))
+        assert fake.list_calls == calls_after_sync
+
+    def test_incremental_sync_applies_changes_and_deletes(self, fake, mirror):
+        mirror.sync_barber(1)
+        fake.delete_event('a')
+        fake.add_event('d', datetime(2025, 1, 6, 16), datetime(2025, 1, 6, 17))
+
+        assert mirror.sync_barber(1) == 2
+        assert mirror.get_busy_periods(1, datetime(2025, 1, 6), datetime(2025, 1, 7)) == [
+            (datetime(2025, 1, 6, 14), datetime(2025, 1, 6, 15)),
+            (datetime(2025, 1, 6, 16), datetime(2025, 1, 6, 17)),
+        ]
+
+    def test_expired_sync_token_triggers_full_resync(self, fake, mirror):
+        mirror.sync_barber(1)
+        fake.delete_event('b')
+        fake.expire_sync_tokens()
+
+        mirror.sync_barber(1)
+
+        assert mirror.get_busy_periods(1, datetime(2025, 1, 6), datetime(2025, 1, 7)) == [
+            (datetime(2025, 1, 6, 10), datetime(2025, 1, 6, 11))
+        ]
+
+    def test_all_day_event_blocks_whole_day(self, fake, mirror):
+        fake.add_all_day_event('off', date(2025, 1, 8), date(2025, 1, 8))
+
+        busy = mirror.get_busy_periods(1, datetime(2025, 1, 8, 10), datetime(2025, 1, 8, 11))
+
+        assert busy == [(datetime(2025, 1, 8), datetime(2025, 1, 9))]
+
+    def test_mirror_persists_across_instances(self, fake, mirror, tmp_path):
+        mirror.sync_barber(1)
+        reloaded = CalendarBusyMirror(lambda barber_id: (fake, 'primary'),
+                                      db_path=str(tmp_path / 'mirror.db'), staleness_seconds=3600,
+                                      history_days=None)
+        calls = fake.list_calls
+
+        busy = reloaded.get_busy_periods(1, datetime(2025, 1, 7), datetime(2025, 1, 8))
+
+        assert busy == [(datetime(2025, 1, 7, 9), datetime(2025, 1, 7, 10))]
+        assert fake.list_calls == calls
+
+    def test_push_notification_marks_barber_stale(self, fake, mirror):
+        mirror.sync_barber(1)
+        fake.add_event('e', datetime(2025, 1, 6, 12), datetime(2025, 1, 6, 13))
+
+        mirror.handle_push_notification(1, 'exists')
+        busy = mirror.get_busy_periods(1, datetime(2025, 1, 6, 12), datetime(2025, 1, 6, 13))
+
+        assert busy == [(datetime(2025, 1, 6, 12), datetime(2025, 1, 6, 13))]
+
+    def test_intervals_outside_history_window_are_pruned(self, tmp_path):
+        now = datetime.utcnow().replace(microsecond=0)
+        fake = FakeCalendarService()
+        fake.add_event('old', now - timedelta(days=10), now - timedelta(days=10, hours=-1))
+        fake.add_event('recent', now - timedelta(days=1), now - timedelta(days=1, hours=-1))
+        mirror = CalendarBusyMirror(lambda barber_id: (fake, 'primary'),
+                                    db_path=str(tmp_path / 'mirror.db'), history_days=7)
+
+        mirror.sync_barber(1)
+        assert set(mirror._events[1]) == {'recent'}
+
+        # An aged-out event changing later is not taken back in
+        fake.update_event('old', now - timedelta(days=9), now - timedelta(days=9, hours=-1))
+        mirror.sync_barber(1)
+        assert set(mirror._events[1]) == {'recent'}
+
+    def test_barber_without_calendar_access(self, tmp_path):
+        mirror = CalendarBusyMirror(lambda barber_id: (None, None), db_path=str(tmp_path / 'mirror.db'))
+
+        assert mirror.get_busy_periods(7, datetime(2025, 1, 6), datetime(2025, 1, 7)) is None
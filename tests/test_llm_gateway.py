@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared LLM gateway: response cache, single-flight coalescing
+and error fan-out
+Uses FakeLLMProvider in place of the OpenAI and Anthropic clients
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+# The gateway imports its sibling modules by bare name
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'services'))
+
+from llm_gateway import FakeLLMProvider, LLMGateway
+from llm_response_cache import LLMResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMResponseCache(str(tmp_path / 'llm_cache.db'))
+
+
+class TestResponseCache:
+    """Opt-in caching of provider responses"""
+
+    def test_cache_hit_skips_provider(self, cache):
+        fake = FakeLLMProvider({'rank': '{"score": 4}'})
+        gateway = LLMGateway({'fake': fake}, cache=cache)
+
+        async def run():
+            first = await gateway.complete('fake', 'rank this', model='m', parse=json.loads, use_cache=True)
+            second = await gateway.complete('fake', 'rank this', model='m', parse=json.loads, use_cache=True)
+            return first, second
+
+        assert asyncio.run(run()) == ({'score': 4}, {'score': 4})
+        assert len(fake.requests) == 1
+        assert gateway.get_metrics()['callers']['default']['cache_hits'] == 1
+
+    def test_cache_is_off_by_default(self, cache):
+        fake = FakeLLMProvider(default='fresh post')
+        gateway = LLMGateway({'fake': fake}, cache=cache)
+
+        async def run():
+            for _ in range(2):
+                await gateway.complete('fake', 'write a post', model='m')
+
+        asyncio.run(run())
+        assert len(fake.requests) == 2
+        assert cache.get_stats()['writes'] == 0
+
+    def test_unparseable_response_is_not_cached(self, cache):
+        fake = FakeLLMProvider(default='not json')
+        gateway = LLMGateway({'fake': fake}, cache=cache)
+
+        with pytest.raises(ValueError):
+            asyncio.run(gateway.complete('fake', 'rank this', model='m', parse=json.loads, use_cache=True))
+        assert cache.get_stats()['writes'] == 0
+
+
+class TestSingleFlight:
+    """Identical in-flight requests share one provider call"""
+
+    def test_identical_requests_are_coalesced(self):
+        fake = FakeLLMProvider(default='shared', latency=0.05)
+        gateway = LLMGateway({'fake': fake})
+
+        async def run():
+            return await asyncio.gather(*[gateway.complete('fake', 'same prompt', model='m') for _ in range(10)])
+
+        assert asyncio.run(run()) == ['shared'] * 10
+        assert len(fake.requests) == 1
+        assert gateway.get_metrics()['callers']['default']['coalesced'] == 9
+
+    def test_different_requests_are_not_coalesced(self):
+        fake = FakeLLMProvider(latency=0.01)
+        gateway = LLMGateway({'fake': fake})
+
+        async def run():
+            await asyncio.gather(gateway.complete('fake', 'a', model='m'),
+                                 gateway.complete('fake', 'a', model='m', temperature=0.7),
+                                 gateway.complete('fake', 'b', model='m'))
+
+        asyncio.run(run())
+        assert len(fake.requests) == 3
+
+    def test_provider_error_reaches_every_follower(self):
+        def fail(request):
+            raise RuntimeError('provider down')
+
+        gateway = LLMGateway({'fake': FakeLLMProvider(fail, latency=0.01)})
+
+        async def run():
+            return await asyncio.gather(*[gateway.complete('fake', 'p', model='m') for _ in range(5)],
+                                        return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert gateway.get_metrics()['in_flight'] == 0
+
+    def test_follower_takes_over_when_leader_is_cancelled(self):
+        fake = FakeLLMProvider(default='answer', latency=0.05)
+        gateway = LLMGateway({'fake': fake})
+
+        async def run():
+            leader = asyncio.create_task(gateway.complete('fake', 'p', model='m'))
+            await asyncio.sleep(0)
+            followers = [asyncio.create_task(gateway.complete('fake', 'p', model='m')) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await asyncio.gather(*followers)
+
+        assert asyncio.run(run()) == ['answer'] * 3
+        # The cancelled call plus one retry by the follower that took over
+        assert len(fake.requests) == 2